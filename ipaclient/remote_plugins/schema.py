@@ -400,7 +400,6 @@ class Schema:
 
         if fingerprint is None:
             fingerprint, ttl = self._fetch(client, ignore_cache=read_failed)
-            self._help = self._generate_help(self._dict)
             try:
                 self._write_schema(fingerprint)
             except Exception as e:
@@ -423,8 +422,20 @@ class Schema:
         kwargs = {u'version': u'2.170'}
         if fps:
             kwargs[u'known_fingerprints'] = fps
+
+        base_fp = self._get_delta_base(fps)
         try:
-            schema = client.forward(u'schema', **kwargs)['result']
+            schema = None
+            if base_fp is not None:
+                try:
+                    schema = client.forward(
+                        u'schema', base_fingerprint=base_fp, **kwargs
+                    )['result']
+                except errors.OptionError:
+                    # the server does not support delta updates
+                    pass
+            if schema is None:
+                schema = client.forward(u'schema', **kwargs)['result']
         except errors.CommandError:
             raise NotAvailable()
 
@@ -432,17 +443,65 @@ class Schema:
             fp = schema['fingerprint']
             ttl = schema.pop('ttl')
             schema.pop('version')
+            removed = schema.pop('removed', {})
 
-            for key, value in schema.items():
-                if key in self.namespaces:
-                    value = {m['full_name']: m for m in value}
-                self._dict[key] = value
+            if schema.pop('delta', False):
+                self._apply_delta(base_fp, schema, removed)
+            else:
+                for key, value in schema.items():
+                    if key in self.namespaces:
+                        value = {m['full_name']: m for m in value}
+                    self._dict[key] = value
+                self._help = self._generate_help()
         except KeyError as e:
             logger.warning("Failed to fetch schema: %s", e)
             raise NotAvailable()
 
         return (fp, ttl,)
 
+    def _get_delta_base(self, fingerprints):
+        """
+        Returns fingerprint of the most recent cached schema, the server is
+        asked for the changes from it
+        """
+        cached = []
+        for fingerprint in fingerprints:
+            try:
+                mtime = os.stat(os.path.join(self._DIR, fingerprint)).st_mtime
+            except EnvironmentError:
+                continue
+            cached.append((mtime, fingerprint))
+
+        if not cached:
+            return None
+        return max(cached)[1]
+
+    def _apply_delta(self, base_fp, delta, removed):
+        """
+        Update cached schema base_fp with items changed on the server
+
+        Help of the base schema is updated with the changed items only.
+        """
+        self._read_schema(base_fp)
+        halp = json.loads(self._help.decode('utf-8'))
+
+        for ns in self.namespaces:
+            for name in removed.get(ns, []):
+                self._dict[ns].pop(name, None)
+                if ns in halp:
+                    halp[ns].pop(name, None)
+
+        for key, value in delta.items():
+            if key in self.namespaces:
+                self._dict[key].update((m['full_name'], m) for m in value)
+                if key in halp:
+                    for member_schema in value:
+                        self._add_help(halp[key], member_schema)
+            else:
+                self._dict[key] = value
+
+        self._help = halp
+
     def _read_schema(self, fingerprint):
         # It's more efficient to read zip file members at once than to open
         # the zip file a couple of times, see #6690.
@@ -461,27 +520,30 @@ class Schema:
         except KeyError:
             return self._dict[key]
 
-    def _generate_help(self, schema):
+    def _generate_help(self):
         halp = {}
 
         for namespace in ('commands', 'topics'):
             halp[namespace] = {}
 
-            for member_schema in schema[namespace].values():
-                member_full_name = member_schema['full_name']
-
-                topic = halp[namespace].setdefault(member_full_name, {})
-                topic['name'] = member_schema['name']
-                if 'doc' in member_schema:
-                    topic['summary'] = (
-                        member_schema['doc'].split('\n\n', 1)[0].strip())
-                if 'topic_topic' in member_schema:
-                    topic['topic_topic'] = member_schema['topic_topic']
-                if 'exclude' in member_schema:
-                    topic['exclude'] = member_schema['exclude']
+            for member in self.iter_namespace(namespace):
+                member_schema = self.read_namespace_member(namespace, member)
+                self._add_help(halp[namespace], member_schema)
 
         return halp
 
+    @staticmethod
+    def _add_help(ns_help, member_schema):
+        topic = ns_help[member_schema['full_name']] = {}
+        topic['name'] = member_schema['name']
+        if 'doc' in member_schema:
+            topic['summary'] = (
+                member_schema['doc'].split('\n\n', 1)[0].strip())
+        if 'topic_topic' in member_schema:
+            topic['topic_topic'] = member_schema['topic_topic']
+        if 'exclude' in member_schema:
+            topic['exclude'] = member_schema['exclude']
+
     def _write_schema(self, fingerprint):
         try:
             os.makedirs(self._DIR)
@@ -508,6 +570,10 @@ class Schema:
                     ns = value
                     for member in ns:
                         path = '{}/{}'.format(key, member)
+                        if isinstance(ns[member], bytes):
+                            # unchanged member of a schema updated by delta
+                            schema.writestr(path, ns[member])
+                            continue
                         s = json.dumps(ns[member], default=json_default)
                         schema.writestr(path, s.encode('utf-8'))
                 else:
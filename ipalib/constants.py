@@ -173,6 +173,15 @@ DEFAULT_CONFIG = (
     ('startup_timeout', 120),
     # How long http connection should wait for reply [seconds].
     ('http_timeout', 30),
+    # Minimal size of RPC request and response bodies which are compressed
+    # [bytes], -1 disables compression:
+    ('rpc_compress_threshold', 4096),
+    # Per-process pool of keep-alive HTTPS connections of the RPC client,
+    # maximum number of idle connections (0 disables the pool) and how long
+    # an idle connection is reused [seconds], shorter than the keep-alive
+    # timeout of the server:
+    ('rpc_pool_size', 4),
+    ('rpc_pool_idle_timeout', 20),
     # How long to wait for an entry to appear on a replica
     ('replication_wait_timeout', 300),
     # How long to wait for a certmonger request to finish
@@ -187,6 +196,12 @@ DEFAULT_CONFIG = (
     # Session stuff:
     ('kinit_lifetime', None),
 
+    # Per-process pool of bound LDAP connections of the server, maximum
+    # number of idle connections (0 disables the pool) and their lifetime
+    # [seconds]:
+    ('ldap_pool_size', 8),
+    ('ldap_pool_ttl', 60),
+
     # Debugging:
     ('verbose', 0),
     ('debug', False),
@@ -204,6 +219,15 @@ DEFAULT_CONFIG = (
     ('ca_install_port', None),
     ('ca_agent_install_port', None),
     ('ca_ee_install_port', None),
+    # Per-process pool of keep-alive HTTPS connections and REST API sessions
+    # of the server to the CA, maximum number of idle connections (0
+    # disables the pool) and how long an idle connection is reused
+    # [seconds]:
+    ('ca_pool_size', 8),
+    ('ca_pool_idle_timeout', 15),
+    # Minimum time between updates of the index of certificates used by
+    # cert_find from the CA [seconds], 0 disables the index:
+    ('cert_index_refresh', 60),
 
     # Topology plugin
     ('recommended_max_agmts', 4),  # Recommended maximum number of replication
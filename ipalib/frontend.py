@@ -72,6 +72,70 @@ def entry_count(entry):
     return num_entries
 
 
+def _has_normalizer(param):
+    """
+    Return True if `Param.normalize()` may change values of ``param``.
+    """
+    cls = type(param)
+    return (
+        param.normalizer is not None
+        or cls.normalize is not Param.normalize
+        or cls._normalize_scalar is not Param._normalize_scalar
+    )
+
+
+class _CallPlan:
+    """
+    Parameter pipeline of a command, compiled when the command is finalized.
+
+    Instead of looking up each parameter by name and going through every
+    stage for every parameter on each call, `Command` uses the callables
+    collected here. Stages which are no-op for a parameter are left out,
+    e.g. parameters without a normalizer have no entry in ``normalizers``.
+    """
+    __slots__ = (
+        'param_names', 'autofill_names', 'default_deps', 'normalizers',
+        'converters', 'validators', 'output_names', 'api_version',
+        'normalize_convert',
+    )
+
+    def __init__(self, command):
+        params = tuple(command.params())
+        self.param_names = frozenset(command.params)
+        # parameters which get a default value if missing
+        self.autofill_names = tuple(
+            p.name for p in params if p.required or p.autofill
+        )
+        # names of parameters needed to create the dynamic default of
+        # a parameter, including indirect dependencies
+        self.default_deps = {}
+        for param in params:
+            if param.default_from is None:
+                continue
+            dep = set()
+            for p in reversed(command.params_by_default):
+                if p.default_from is None:
+                    continue
+                if p.name == param.name or p.name in dep:
+                    dep.update(p.default_from.keys)
+            self.default_deps[param.name] = frozenset(dep)
+        self.normalizers = {
+            p.name: p.normalize for p in params if _has_normalizer(p)
+        }
+        self.converters = {p.name: p.convert for p in params}
+        self.validators = tuple((p.name, p.validate, p.required)
+                                for p in params)
+        self.output_names = frozenset(command.output)
+        self.api_version = APIVersion(command.api_version)
+        # normalization and conversion are done in a single pass unless
+        # a subclass customizes either of them
+        cls = type(command)
+        self.normalize_convert = (
+            cls.normalize is Command.normalize
+            and cls.convert is Command.convert
+        )
+
+
 class HasParam(Plugin):
     """
     Base class for plugins that have `Param` `NameSpace` attributes.
@@ -410,6 +474,7 @@ class Command(HasParam):
     options = Plugin.finalize_attr('options')
     params = Plugin.finalize_attr('params')
     params_by_default = Plugin.finalize_attr('params_by_default')
+    _call_plan = Plugin.finalize_attr('_call_plan')
     obj = None
 
     use_output_validation = True
@@ -461,17 +526,23 @@ class Command(HasParam):
                 # add message only on server side
                 self.add_message(
                     messages.VersionMissing(server_version=self.api_version))
+        debug = logger.isEnabledFor(logging.DEBUG)
         params = self.args_options_2_params(*args, **options)
-        logger.debug(
-            'raw: %s(%s)', self.name, ', '.join(self._repr_iter(**params))
-        )
+        if debug:
+            logger.debug(
+                'raw: %s(%s)', self.name, ', '.join(self._repr_iter(**params))
+            )
         if self.api.env.in_server:
             params.update(self.get_default(**params))
-        params = self.normalize(**params)
-        params = self.convert(**params)
-        logger.debug(
-            '%s(%s)', self.name, ', '.join(self._repr_iter(**params))
-        )
+        if self._call_plan.normalize_convert:
+            params = self.__normalize_convert(params)
+        else:
+            params = self.normalize(**params)
+            params = self.convert(**params)
+        if debug:
+            logger.debug(
+                '%s(%s)', self.name, ', '.join(self._repr_iter(**params))
+            )
         if self.api.env.in_server:
             self.validate(**params)
         (args, options) = self.params_2_args_options(**params)
@@ -554,9 +625,9 @@ class Command(HasParam):
                 break
 
     def __options_2_params(self, options):
-        for name in self.params:
-            if name in options:
-                yield (name, options.pop(name))
+        param_names = self._call_plan.param_names
+        for name in [name for name in options if name in param_names]:
+            yield (name, options.pop(name))
         # If any options remain, they are either internal or unknown
         unused_keys = set(options).difference(self.internal_options)
         if unused_keys:
@@ -672,6 +743,24 @@ class Command(HasParam):
             (k, self.params[k].convert(v)) for (k, v) in kw.items()
         )
 
+    def __normalize_convert(self, kw):
+        """
+        Normalize and convert values in a single pass over ``kw``.
+
+        This is equivalent to calling `Command.normalize` and then
+        `Command.convert`.
+        """
+        plan = self._call_plan
+        normalizers = plan.normalizers
+        converters = plan.converters
+        params = {}
+        for name, value in kw.items():
+            normalize = normalizers.get(name)
+            if normalize is not None:
+                value = normalize(value)
+            params[name] = converters[name](value)
+        return params
+
     def __convert_iter(self, kw):
         for param in self.params():
             if kw.get(param.name, None) is None:
@@ -695,8 +784,10 @@ class Command(HasParam):
         {}
         """
         if _params is None:
-            _params = [p.name for p in self.params()
-                       if p.name not in kw and (p.required or p.autofill)]
+            _params = [name for name in self._call_plan.autofill_names
+                       if name not in kw]
+            if not _params:
+                return {}
         return dict(self.__get_default_iter(_params, kw))
 
     def get_default_of(self, _name, **kw):
@@ -713,12 +804,20 @@ class Command(HasParam):
         # Find out what additional parameters are needed to dynamically create
         # the default values with default_from.
         dep = set()
-        for param in reversed(self.params_by_default):
-            if param.name in params or param.name in dep:
-                if param.default_from is None:
+        default_deps = self._call_plan.default_deps
+        for name in params:
+            dep.update(default_deps.get(name, ()))
+
+        if not dep:
+            # No dynamic defaults depend on other parameters, so ``kw`` is
+            # not going to change and the order does not matter.
+            for name in params:
+                if name not in self.params:
                     continue
-                for name in param.default_from.keys:
-                    dep.add(name)
+                default = self.params[name].get_default(**kw)
+                if default is not None:
+                    yield (name, default)
+            return
 
         for param in self.params_by_default():
             default = None
@@ -758,9 +857,12 @@ class Command(HasParam):
         If any value fails the validation, `ipalib.errors.ValidationError`
         (or a subclass thereof) will be raised.
         """
-        for param in self.params():
-            value = kw.get(param.name, None)
-            param.validate(value, supplied=param.name in kw)
+        for name, validate, required in self._call_plan.validators:
+            value = kw.get(name, None)
+            if value is None and not required and name not in kw:
+                # nothing to validate
+                continue
+            validate(value, supplied=name in kw)
 
     def verify_client_version(self, client_version):
         """
@@ -771,7 +873,7 @@ class Command(HasParam):
         If the client minor version is less than or equal to the server
         then let the request proceed.
         """
-        server_apiver = APIVersion(self.api_version)
+        server_apiver = self._call_plan.api_version
         try:
             client_apiver = APIVersion(client_version)
         except ValueError:
@@ -878,6 +980,7 @@ class Command(HasParam):
         self.params_by_default = NameSpace(params, sort=False)
         self.output = NameSpace(self._iter_output(), sort=False)
         self._create_param_namespace('output_params')
+        self._call_plan = _CallPlan(self)
         super(Command, self)._on_finalize()
 
     def _iter_output(self):
@@ -976,8 +1079,9 @@ class Command(HasParam):
             raise TypeError('%s: need a %r; got a %r: %r' % (
                 nice, dict, type(output), output)
             )
-        expected_set = set(self.output)
-        actual_set = set(output) - set(['messages'])
+        expected_set = self._call_plan.output_names
+        actual_set = set(output)
+        actual_set.discard('messages')
         if expected_set != actual_set:
             missing = expected_set - actual_set
             if missing:
@@ -1274,7 +1378,9 @@ class Object(HasParam):
         namespace = self.api[name]
         assert type(namespace) is APINameSpace
         for plugin in namespace(): # Equivalent to dict.itervalues()
-            if plugin is not namespace[plugin.name]:
+            # compare plugin classes, a lookup would finalize the plugin
+            if (namespace.get_plugin(plugin.name) is not
+                    namespace.get_plugin(plugin.full_name)):
                 continue
             if plugin.obj_name == self.name:
                 yield plugin
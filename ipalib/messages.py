@@ -496,6 +496,16 @@ class LightweightCACertificateNotAvailable(PublicMessage):
     format = _("The certificate for %(ca)s is not available on this server.")
 
 
+class SearchResultPage(PublicMessage):
+    """
+    **13032** Search result is a page of a paged search
+    """
+    errno = 13032
+    type = "info"
+    format = _("More entries are available, use --cursor=%(cursor)s to get "
+               "the next page.")
+
+
 def iter_messages(variables, base):
     """Return a tuple with all subclasses
     """
@@ -288,11 +288,13 @@ class Plugin(ReadOnly):
 
 
 class APINameSpace(Mapping):
-    def __init__(self, api, base):
+    def __init__(self, api, base, finalize_on_lookup=False):
         self.__api = api
         self.__base = base
         self.__plugins = None
         self.__plugins_by_key = None
+        self.__finalize_on_lookup = finalize_on_lookup
+        self.__finalized = {}
 
     def __enumerate(self):
         if self.__plugins is not None and self.__plugins_by_key is not None:
@@ -332,10 +334,22 @@ class APINameSpace(Mapping):
 
     def __getitem__(self, key):
         plugin = self.get_plugin(key)
-        return self.__api._get(plugin)
+        if not self.__finalize_on_lookup:
+            return self.__api._get(plugin)
+
+        try:
+            return self.__finalized[plugin]
+        except KeyError:
+            pass
+        instance = self.__api._get(plugin)
+        instance.ensure_finalized()
+        self.__finalized[plugin] = instance
+        return instance
 
     def __call__(self):
-        return six.itervalues(self)
+        # plugins are not finalized when all of them are iterated, they are
+        # finalized on lookup or on first access to a finalize_attr
+        return (self.__api._get(plugin) for plugin in self)
 
     def __getattr__(self, key):
         try:
@@ -355,6 +369,7 @@ class API(ReadOnly):
         self.__plugins_by_key = {}
         self.__default_map = {}
         self.__instances = {}
+        self.__instances_lock = threading.RLock()
         self.__next = {}
         self.__done = set()
         self.env = Env()
@@ -767,6 +782,10 @@ class API(ReadOnly):
             self.__default_map[plugin.name] = plugin.version
 
         production_mode = self.is_production_mode()
+        # a server which loads plugins on demand finalizes them on first
+        # lookup rather than on first access to a finalize_attr
+        finalize_on_lookup = bool(
+            self.env.plugins_on_demand and self.env.in_server)
 
         for base in self.bases:
             for plugin in self.__plugins:
@@ -778,7 +797,8 @@ class API(ReadOnly):
             name = base.__name__
             if not production_mode:
                 assert not hasattr(self, name)
-            setattr(self, name, APINameSpace(self, base))
+            setattr(self, name, APINameSpace(
+                self, base, finalize_on_lookup=finalize_on_lookup))
 
         for instance in six.itervalues(self.__instances):
             if not production_mode:
@@ -800,9 +820,16 @@ class API(ReadOnly):
             raise KeyError(plugin)
 
         try:
-            instance = self.__instances[plugin]
+            return self.__instances[plugin]
         except KeyError:
-            instance = self.__instances[plugin] = plugin(self)
+            pass
+
+        # plugins may be instantiated on demand by concurrent threads
+        with self.__instances_lock:
+            try:
+                instance = self.__instances[plugin]
+            except KeyError:
+                instance = self.__instances[plugin] = plugin(self)
 
         return instance
 
@@ -41,6 +41,7 @@ import base64
 import json
 import re
 import socket
+import threading
 import gzip
 import urllib
 from ssl import SSLError
@@ -62,7 +63,7 @@ from ipapython import session_storage
 from ipapython.cookie import Cookie
 from ipapython.dnsutil import DNSName, query_srv
 from ipalib.text import _
-from ipalib.util import create_https_connection
+from ipalib.util import create_https_connection, HTTPSConnectionPool
 from ipalib.krb_utils import KRB5KDC_ERR_S_PRINCIPAL_UNKNOWN, KRB5KRB_AP_ERR_TKT_EXPIRED, \
                              KRB5_FCC_PERM, KRB5_FCC_NOFILE, KRB5_CC_FORMAT, \
                              KRB5_REALM_CANT_RESOLVE, KRB5_CC_NOTFOUND, get_principal
@@ -75,11 +76,11 @@ from ipalib import api
 # cannot handle that
 try:
     from xmlrpclib import (Binary, Fault, DateTime, dumps, loads, ServerProxy,
-            Transport, ProtocolError, MININT, MAXINT)
+            Transport, ProtocolError, MININT, MAXINT, gzip_encode)
 except ImportError:
     # pylint: disable=import-error
     from xmlrpc.client import (Binary, Fault, DateTime, dumps, loads, ServerProxy,
-            Transport, ProtocolError, MININT, MAXINT)
+            Transport, ProtocolError, MININT, MAXINT, gzip_encode)
 
 # pylint: disable=import-error
 if six.PY3:
@@ -97,6 +98,13 @@ logger = logging.getLogger(__name__)
 COOKIE_NAME = 'ipa_session'
 CCACHE_COOKIE_KEY = 'X-IPA-Session-Cookie'
 
+# lists with at least this many items are serialized item by item
+JSON_STREAM_MIN_ITEMS = 100
+# size of chunks of incrementally serialized JSON
+JSON_STREAM_CHUNK_SIZE = 64 * 1024
+# default number of connections used by RPCClient.forward_many
+FORWARD_MAX_WORKERS = 8
+
 errors_by_code = dict((e.errno, e) for e in public_errors)
 
 
@@ -317,6 +325,9 @@ class _JSONPrimer(dict):
         self.version = version
         self._cap_datetime = None
         self._cap_dnsname = None
+        # bind the container encoders only once, iterencode() recognizes
+        # containers by identity of their encoders
+        enc_list = self._enc_list
         self.update({
             unicode: _identity,
             bool: _identity,
@@ -329,8 +340,8 @@ class _JSONPrimer(dict):
             DNSName: self._enc_dnsname,
             datetime.datetime: self._enc_datetime,
             bytes: self._enc_bytes,
-            list: self._enc_list,
-            tuple: self._enc_list,
+            list: enc_list,
+            tuple: enc_list,
             dict: self._enc_dict,
             crypto_x509.Certificate: self._enc_certificate,
             crypto_x509.CertificateSigningRequest: self._enc_certificate,
@@ -400,6 +411,48 @@ class _JSONPrimer(dict):
     def _enc_certificate(self, val):
         return self._enc_bytes(val.public_bytes(x509_Encoding.DER))
 
+    def iterencode(self, obj, _identity=_identity, _dumps=json.dumps,
+                   _encode_str=json.encoder.encode_basestring_ascii,
+                   _iteritems=six.iteritems):
+        """Convert and serialize obj to JSON piece by piece
+
+        Dicts and lists with at least JSON_STREAM_MIN_ITEMS items are
+        serialized item by item, the items of such lists are converted and
+        serialized at once. Everything else is converted and serialized at
+        once. Joining the yielded pieces gives the same text as json.dumps()
+        of convert(obj).
+        """
+        func = self[obj.__class__]
+        if func is _identity:
+            if obj.__class__ is unicode:
+                yield _encode_str(obj)
+            else:
+                yield _dumps(obj)
+        elif func is self[dict]:
+            if not obj:
+                yield '{}'
+                return
+            sep = '{'
+            for k, v in _iteritems(obj):
+                if k.__class__ is unicode:
+                    yield sep + _encode_str(k) + ': '
+                else:
+                    # let json.dumps() stringify the key
+                    yield sep + _dumps({k: None})[1:-len(': null}')] + ': '
+                sep = ', '
+                for chunk in self.iterencode(v):
+                    yield chunk
+            yield '}'
+        elif func is self[list] and len(obj) >= JSON_STREAM_MIN_ITEMS:
+            sep = '['
+            for v in obj:
+                func = self[v.__class__]
+                yield sep + _dumps(v if func is _identity else func(v))
+                sep = ', '
+            yield ']'
+        else:
+            yield _dumps(func(obj))
+
 
 def json_encode_binary(val, version, pretty_print=False):
     """Serialize a Python object structure to JSON
@@ -418,6 +471,36 @@ def json_encode_binary(val, version, pretty_print=False):
         return json.dumps(result)
 
 
+def json_iterencode_binary(val, version, pretty_print=False,
+                           chunk_size=JSON_STREAM_CHUNK_SIZE):
+    """Serialize a Python object structure to JSON incrementally
+
+    Unlike json_encode_binary(), neither a converted copy of the whole
+    structure nor the whole JSON text is built. Large results are
+    converted and serialized entry by entry while they are being sent.
+
+    :param object val: Python object structure
+    :param str version: client version
+    :param bool pretty_print: indent and sort JSON (not incremental)
+    :param int chunk_size: minimal size of chunks (except the last one)
+    :return: iterator of UTF-8 encoded chunks
+    """
+    if pretty_print:
+        yield json_encode_binary(val, version, pretty_print).encode('utf-8')
+        return
+    buf = []
+    size = 0
+    for piece in _JSONPrimer(version).iterencode(val):
+        buf.append(piece)
+        size += len(piece)
+        if size >= chunk_size:
+            yield ''.join(buf).encode('utf-8')
+            buf = []
+            size = 0
+    if buf:
+        yield ''.join(buf).encode('utf-8')
+
+
 def _ipa_obj_hook(dct, _iteritems=six.iteritems, _list=list):
     """JSON object hook
 
@@ -519,12 +602,34 @@ class MultiProtocolTransport(Transport):
         else:
             connection.putheader("Content-Type", "text/xml")
 
-        # gzip compression would be set up here, but we have it turned off
-        # (encode_threshold is None)
+        # encode_threshold is None until the server announces it accepts
+        # gzip encoded requests
+        if (self.encode_threshold is not None and
+                len(request_body) >= self.encode_threshold):
+            connection.putheader("Content-Encoding", "gzip")
+            request_body = gzip_encode(request_body)
 
         connection.putheader("Content-Length", str(len(request_body)))
         connection.endheaders(request_body)
 
+    def release(self):
+        """
+        Done with the connection, it is closed unless it can be reused
+        """
+        self.close()
+
+    def parse_response(self, response):
+        # Servers list content codings they accept in requests in the
+        # Accept-Encoding header of responses (RFC 7694).
+        if self.encode_threshold is None and hasattr(response, 'getheader'):
+            codings = response.getheader('Accept-Encoding', '').split(',')
+            threshold = api.env.rpc_compress_threshold
+            if threshold >= 0 and any(
+                    c.split(';')[0].strip().lower() == 'gzip'
+                    for c in codings):
+                self.encode_threshold = threshold
+        return Transport.parse_response(self, response)
+
 
 class LanguageAwareTransport(MultiProtocolTransport):
     """Transport sending Accept-Language header"""
@@ -553,8 +658,43 @@ class LanguageAwareTransport(MultiProtocolTransport):
         return (host, extra_headers, x509)
 
 
+_connection_pool = None
+_connection_pool_lock = threading.Lock()
+
+
+def get_connection_pool():
+    """
+    Return the per-process HTTPS connection pool or None when disabled
+    """
+    global _connection_pool
+
+    if not api.env.rpc_pool_size:
+        return None
+    with _connection_pool_lock:
+        if _connection_pool is None:
+            _connection_pool = HTTPSConnectionPool(
+                api.env.rpc_pool_size, api.env.rpc_pool_idle_timeout)
+    return _connection_pool
+
+
+def _forget_connection_pool():
+    if _connection_pool is not None:
+        _connection_pool.forget()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_forget_connection_pool)
+
+
 class SSLTransport(LanguageAwareTransport):
     """Handles an HTTPS transaction to an XML-RPC server."""
+    _pool_key = None
+
+    def _get_pool_key(self, host):
+        return (host, getattr(context, 'ca_certfile', None),
+                api.env.tls_version_min, api.env.tls_version_max,
+                getattr(context, 'principal', None))
+
     def make_connection(self, host):
         host, self._extra_headers, _x509 = self.get_host_info(host)
 
@@ -562,18 +702,42 @@ class SSLTransport(LanguageAwareTransport):
             logger.debug("HTTP connection keep-alive (%s)", host)
             return self._connection[1]
 
-        conn = create_https_connection(
-            host, 443,
-            getattr(context, 'ca_certfile', None),
-            tls_version_min=api.env.tls_version_min,
-            tls_version_max=api.env.tls_version_max)
+        self.release()
+        pool = get_connection_pool()
+        key = self._get_pool_key(host)
+        conn = pool.get(key) if pool is not None else None
+        if conn is not None:
+            logger.debug("HTTP connection reused from pool (%s)", host)
+        else:
+            conn = create_https_connection(
+                host, 443,
+                getattr(context, 'ca_certfile', None),
+                tls_version_min=api.env.tls_version_min,
+                tls_version_max=api.env.tls_version_max)
 
-        conn.connect()
-        logger.debug("New HTTP connection (%s)", host)
+            conn.connect()
+            logger.debug("New HTTP connection (%s)", host)
+            if pool is not None:
+                pool.add(conn)
 
         self._connection = host, conn
+        self._pool_key = key
         return self._connection[1]
 
+    def release(self):
+        """
+        Return the connection to the connection pool for reuse by other
+        transports, close it when the pool is disabled
+        """
+        pool = get_connection_pool()
+        _host, conn = self._connection or (None, None)
+        if pool is None or conn is None:
+            self.close()
+            return
+        self._connection = (None, None)
+        pool.put(self._pool_key, conn)
+        logger.debug("HTTP connection pool: %s", pool.stats())
+
 
 class KerbTransport(SSLTransport):
     """
@@ -735,6 +899,10 @@ class KerbTransport(SSLTransport):
                 return self.parse_response(response)
         except gssapi.exceptions.GSSError as e:
             self._handle_exception(e)
+        except ProtocolError:
+            # the error response was read completely, the connection can
+            # be used for further requests
+            raise
         except RemoteDisconnected:
             # keep-alive connection was terminated by remote peer, close
             # connection and let transport handle reconnect for us.
@@ -1082,6 +1250,7 @@ class RPCClient(Connectible):
                     raise
                 # pylint: enable=try-except-raise
                 except ProtocolError as e:
+                    proxy_kw['transport'].release()
                     if hasattr(context, 'session_cookie') and e.errcode == 401:
                         # Unauthorized. Remove the session and try again.
                         delattr(context, 'session_cookie')
@@ -1116,7 +1285,7 @@ class RPCClient(Connectible):
         conn = getattr(context, self.id, None)
         if conn is not None:
             conn = conn.conn._ServerProxy__transport
-            conn.close()
+            conn.release()
 
     def _call_command(self, command, params):
         """Call the command with given params"""
@@ -1176,13 +1345,16 @@ class RPCClient(Connectible):
                         logger.debug("Error trying to remove persisent "
                                      "session data: %s", e)
 
-                    # Create a new serverproxy with the non-session URI
+                    # Create a new serverproxy with the non-session URI,
+                    # the pooled connection is reused by its transport
+                    self.destroy_connection()
                     serverproxy = self.create_connection(
                         os.environ.get('KRB5CCNAME'), self.env.verbose,
                         self.env.fallback, self.env.delegate)
 
                     setattr(context, self.id,
                             Connection(serverproxy, self.disconnect))
+                    command = getattr(serverproxy, name)
                     # try to connect again with the new session cookie
                     continue
                 raise NetworkError(uri=server, error=e.errmsg)
@@ -1194,6 +1366,83 @@ class RPCClient(Connectible):
             uri=server,
             error=_("Exceeded number of tries to forward a request."))
 
+    def _get_worker_connect_kw(self):
+        """
+        Return arguments of connect() for worker threads of forward_many(),
+        which authenticate the same way as the connection of this thread
+        """
+        kw = dict(ca_certfile=getattr(context, 'ca_certfile', None))
+        if self.isconnected():
+            transport = self.conn._ServerProxy__transport
+            kw['ccache'] = getattr(transport, 'ccache', None)
+            kw['delegate'] = isinstance(transport, DelegatedKerbTransport)
+        return kw
+
+    def forward_many(self, calls, max_workers=FORWARD_MAX_WORKERS,
+                     return_exceptions=False):
+        """
+        Forward many calls concurrently.
+
+        The calls are distributed among at most ``max_workers`` threads, each
+        of them forwards calls over its own authenticated connection one
+        after another. Connections are returned to the connection pool when
+        all calls are done.
+
+        :param calls: Iterable of ``(name, args, kw)`` tuples, arguments of
+            `forward`.
+        :param max_workers: Maximum number of concurrent connections.
+        :param return_exceptions: Return an exception raised by a call in
+            place of its result rather than raising it. Otherwise the
+            exception of the first failed call is raised and the remaining
+            calls are not forwarded.
+        :returns: List of results of `forward` in the order of ``calls``.
+        """
+        calls = list(calls)
+        results = [None] * len(calls)
+        failed = []
+        pending = iter(enumerate(calls))
+        lock = threading.Lock()
+        connect_kw = self._get_worker_connect_kw()
+
+        def worker():
+            connected = False
+            try:
+                while True:
+                    with lock:
+                        if failed and not return_exceptions:
+                            return
+                        try:
+                            i, (name, args, kw) = next(pending)
+                        except StopIteration:
+                            return
+                    try:
+                        if not connected:
+                            self.connect(**connect_kw)
+                            connected = True
+                        results[i] = self.forward(name, *args, **kw)
+                    except Exception as e:
+                        results[i] = e
+                        with lock:
+                            failed.append(i)
+            finally:
+                if connected:
+                    self.disconnect()
+
+        threads = [
+            threading.Thread(target=worker,
+                             name='%s-%d' % (self.name, i))
+            for i in range(min(max(max_workers, 1), len(calls)))
+        ]
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        if failed and not return_exceptions:
+            raise results[min(failed)]
+        return results
+
 
 class xmlclient(RPCClient):
     session_path = '/ipa/session/xml'
@@ -31,6 +31,7 @@ import os
 import socket
 import re
 import decimal
+import select
 import dns
 import encodings
 import sys
@@ -40,6 +41,8 @@ import fcntl
 import shutil
 import struct
 import subprocess
+import threading
+import time
 
 import netaddr
 from dns import resolver, rdatatype
@@ -381,6 +384,106 @@ def create_https_connection(
     return HTTPSConnection(host, port, context=ctx, **kwargs)
 
 
+class HTTPSConnectionPool:
+    """
+    Per-process pool of idle keep-alive HTTPS connections.
+
+    Connections are keyed by the server, the TLS settings and the identity
+    they were used for, so a connection is only ever handed out to a caller
+    which could have created it. Idle connections are not reused
+    after ``idle_timeout`` seconds, which should be shorter than the
+    keep-alive timeout of the server, or when the server has closed them.
+    """
+
+    def __init__(self, max_size, idle_timeout):
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.created = 0
+        self.reused = 0
+        self.evictions = 0
+        self._idle = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """
+        Return an idle connection for key or None
+        """
+        now = time.time()
+        stale = []
+        found = None
+        with self._lock:
+            conns = self._idle.get(key, [])
+            while conns:
+                conn, released = conns.pop()
+                if (now - released < self.idle_timeout and
+                        not self._is_dropped(conn)):
+                    found = conn
+                    break
+                stale.append(conn)
+                self.evictions += 1
+            if not conns:
+                self._idle.pop(key, None)
+            if found is not None:
+                self.reused += 1
+        for conn in stale:
+            conn.close()
+        return found
+
+    def add(self, conn):
+        """
+        Account a new connection which will be put to the pool later
+        """
+        with self._lock:
+            self.created += 1
+
+    def put(self, key, conn):
+        """
+        Return a connection to the pool, close it if the pool is full or
+        the connection cannot be reused
+        """
+        if conn.sock is not None:
+            with self._lock:
+                if sum(len(c) for c in self._idle.values()) < self.max_size:
+                    self._idle.setdefault(key, []).append((conn, time.time()))
+                    return
+                self.evictions += 1
+        conn.close()
+
+    def clear(self):
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for conns in idle.values():
+            for conn, _released in conns:
+                conn.close()
+
+    def forget(self):
+        """
+        Drop all idle connections without closing them, used in a forked
+        child process which must not use connections of its parent
+        """
+        self._lock = threading.Lock()
+        self._idle = {}
+
+    def stats(self):
+        with self._lock:
+            return dict(
+                created=self.created,
+                reused=self.reused,
+                evictions=self.evictions,
+                idle=sum(len(c) for c in self._idle.values()),
+            )
+
+    @staticmethod
+    def _is_dropped(conn):
+        # an idle connection becomes readable only when the server has
+        # closed it (or sent garbage), either way it cannot be reused
+        try:
+            readable, _w, _x = select.select([conn.sock], [], [], 0)
+        except (ValueError, OSError, select.error):
+            return True
+        return bool(readable)
+
+
 def validate_dns_label(dns_label, allow_underscore=False, allow_slash=False):
     base_chars = 'a-z0-9'
     extra_chars = ''
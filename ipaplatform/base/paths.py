@@ -289,6 +289,8 @@ class BasePathNamespace:
     IPA_BACKUP_DIR = "/var/lib/ipa/backup"
     IPA_DNSSEC_DIR = "/var/lib/ipa/dnssec"
     IPA_KASP_DB_BACKUP = "/var/lib/ipa/ipa-kasp.db.backup"
+    IPA_LDAP_UPDATE_LEDGER = "/var/lib/ipa/ldap-update-ledger.json"
+    IPA_MIGRATION_CHECKPOINT_DIR = "/var/lib/ipa/migration"
     DNSSEC_TOKENS_DIR = "/var/lib/ipa/dnssec/tokens"
     DNSSEC_SOFTHSM_PIN = "/var/lib/ipa/dnssec/softhsm_pin"
     IPA_CA_CSR = "/var/lib/ipa/ca.csr"
@@ -352,6 +354,9 @@ class BasePathNamespace:
     IPA_ODS_EXPORTER_CCACHE = "/var/opendnssec/tmp/ipa-ods-exporter.ccache"
     VAR_RUN_DIRSRV_DIR = "/var/run/dirsrv"
     IPA_CCACHES = "/run/ipa/ccaches"
+    IPA_LDAP_SCHEMA_CACHE_DIR = "/run/ipa/ldap_schema"
+    IPA_CERT_INDEX_DIR = "/run/ipa/cert_index"
+    IPA_API_SCHEMA_DIR = "/run/ipa/api_schema"
     HTTP_CCACHE = "/var/lib/ipa/gssproxy/http.ccache"
     CA_BUNDLE_PEM = "/var/lib/ipa-client/pki/ca-bundle.pem"
     KDC_CA_BUNDLE_PEM = "/var/lib/ipa-client/pki/kdc-ca-bundle.pem"
@@ -519,6 +519,21 @@ def get_ava(*args):
     return ava
 
 
+@functools.lru_cache(maxsize=4096)
+def _str2dn_sorted(value):
+    '''
+    Parse a DN string to RDN's with sorted AVA's.
+
+    DN's are created from the same strings over and over again (entry
+    DN's, containers, configuration), so parsed values are cached. The
+    result is immutable, callers must copy it before modifying.
+    '''
+    rdns = str2dn(value)
+    for rdn in rdns:
+        sort_avas(rdn)
+    return tuple(tuple(tuple(ava) for ava in rdn) for rdn in rdns)
+
+
 def sort_avas(rdn):
     if len(rdn) <= 1:
         return
@@ -1109,6 +1124,10 @@ class DN:
     AVA_type = AVA
     RDN_type = RDN
 
+    # normalized key and hash, computed on first use
+    _key = None
+    _hash = None
+
     def __init__(self, *args, **kwds):
         self.rdns = self._rdns_from_sequence(args)
 
@@ -1122,11 +1141,10 @@ class DN:
             try:
                 if isinstance(value, str):
                     value = val_encode(value)
-                rdns = str2dn(value)
+                rdns = [[list(a) for a in rdn]
+                        for rdn in _str2dn_sorted(value)]
             except DECODING_ERROR:
                 raise ValueError("malformed RDN string = \"%s\"" % value)
-            for rdn in rdns:
-                sort_avas(rdn)
         elif isinstance(value, DN):
             rdns = value._copy_rdns()
         elif isinstance(value, (tuple, list, AVA)):
@@ -1192,6 +1210,8 @@ class DN:
             cls = self.__class__
             new_dn = cls.__new__(cls)
             new_dn.rdns = self.rdns[key]
+            if self._key is not None:
+                new_dn._key = self._key[key]
             return new_dn
         elif isinstance(key, str):
             for rdn in self.rdns:
@@ -1210,13 +1230,9 @@ class DN:
         # hash value between two objects which compare as equal but
         # differ in case must yield the same hash value.
 
-        str_dn = ';,'.join([
-            '++'.join([
-                '=='.join((atype, avalue or ''))
-                for atype, avalue, _dummy in rdn
-            ]) for rdn in self.rdns
-        ])
-        return hash(str_dn.lower())
+        if self._hash is None:
+            self._hash = hash(self._get_key())
+        return self._hash
 
     def __eq__(self, other):
         # Try coercing to DN, if successful compare to coerced object
@@ -1231,11 +1247,8 @@ class DN:
         if not isinstance(other, DN):
             return False
 
-        if len(self) != len(other):
-            return False
-
         # Perform comparison between objects of same type
-        return self._cmp_sequence(other, 0, len(self)) == 0
+        return self._get_key() == other._get_key()
 
     def __ne__(self, other):
         return not self.__eq__(other)
@@ -1249,16 +1262,25 @@ class DN:
 
         return self._cmp_sequence(other, 0, len(self)) < 0
 
+    def _get_key(self):
+        '''
+        Return the normalized key of the DN, a tuple of the keys of its
+        RDN's. The key is case insensitive (see AVA for explanation) and
+        computed only once, DN objects are immutable.
+        '''
+        if self._key is None:
+            self._key = tuple(rdn_key(rdn) for rdn in self.rdns)
+        return self._key
+
     def _cmp_sequence(self, pattern, self_start, pat_len):
-        self_idx = self_start
-        pat_idx = 0
-        while pat_idx < pat_len:
-            r = cmp_rdns(self.rdns[self_idx], pattern.rdns[pat_idx])
-            if r != 0:
-                return r
-            self_idx += 1
-            pat_idx += 1
-        return 0
+        self_key = self._get_key()[self_start:self_start + pat_len]
+        pat_key = pattern._get_key()[:pat_len]
+        if self_key == pat_key:
+            return 0
+        elif self_key < pat_key:
+            return -1
+        else:
+            return 1
 
     def __add__(self, other):
         return self.__class__(self, other)
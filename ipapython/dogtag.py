@@ -21,6 +21,9 @@ import collections
 import gzip
 import io
 import logging
+import os
+import threading
+import time
 from urllib.parse import urlencode
 import xml.dom.minidom
 import zlib
@@ -29,7 +32,7 @@ import six
 
 # pylint: disable=ipa-forbidden-import
 from ipalib import api, errors
-from ipalib.util import create_https_connection
+from ipalib.util import create_https_connection, HTTPSConnectionPool
 from ipalib.errors import NetworkError
 from ipalib.text import _
 # pylint: enable=ipa-forbidden-import
@@ -61,6 +64,10 @@ INCLUDED_PROFILES = {
 DEFAULT_PROFILE = u'caIPAserviceCert'
 KDC_PROFILE = u'KDCs_PKINIT_Certs'
 
+# requests which are sent again when a reused connection fails after
+# sending them
+IDEMPOTENT_METHODS = frozenset(('GET', 'HEAD'))
+
 
 if six.PY3:
     gzip_decompress = gzip.decompress  # pylint: disable=no-member
@@ -71,6 +78,68 @@ else:
             return f.read()
 
 
+class RequestStats:
+    """
+    Per-process latency statistics of requests to Dogtag, by request
+    method and path
+    """
+
+    def __init__(self):
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def record(self, method, path, duration, reused):
+        key = '%s %s' % (method, path.split('?', 1)[0])
+        with self._lock:
+            stats = self._stats.get(key)
+            if stats is None:
+                stats = self._stats[key] = dict(
+                    count=0, reused=0, total=0.0, max=0.0)
+            stats['count'] += 1
+            stats['reused'] += int(reused)
+            stats['total'] += duration
+            stats['max'] = max(stats['max'], duration)
+
+    def clear(self):
+        with self._lock:
+            self._stats.clear()
+
+    def stats(self):
+        with self._lock:
+            return {key: dict(stats) for key, stats in self._stats.items()}
+
+
+request_stats = RequestStats()
+
+_connection_pool = None
+_connection_pool_lock = threading.Lock()
+
+
+def get_connection_pool():
+    """
+    Return the per-process pool of HTTPS connections to Dogtag or None when
+    disabled
+    """
+    global _connection_pool
+
+    if api.env.context != 'server' or not api.env.ca_pool_size:
+        return None
+    with _connection_pool_lock:
+        if _connection_pool is None:
+            _connection_pool = HTTPSConnectionPool(
+                api.env.ca_pool_size, api.env.ca_pool_idle_timeout)
+    return _connection_pool
+
+
+def _forget_connection_pool():
+    if _connection_pool is not None:
+        _connection_pool.forget()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_forget_connection_pool)
+
+
 def error_from_xml(doc, message_template):
     try:
         item_node = doc.getElementsByTagName("Error")
@@ -172,9 +241,13 @@ def https_request(
 
     if body is None:
         body = urlencode(kw)
+    pool = get_connection_pool()
+    pool_key = (host, port, cafile, client_certfile, client_keyfile,
+                api.env.tls_version_min, api.env.tls_version_max)
     return _httplib_request(
         'https', host, port, url, connection_factory, body,
-        method=method, headers=headers)
+        method=method, headers=headers, connection_pool=pool,
+        pool_key=pool_key)
 
 
 def http_request(host, port, url, timeout=None, **kw):
@@ -200,7 +273,8 @@ def http_request(host, port, url, timeout=None, **kw):
 
 def _httplib_request(
         protocol, host, port, path, connection_factory, request_body,
-        method='POST', headers=None, connection_options=None):
+        method='POST', headers=None, connection_options=None,
+        connection_pool=None, pool_key=None):
     """
     :param request_body: Request body
     :param connection_factory: Connection class to use. Will be called
@@ -208,6 +282,9 @@ def _httplib_request(
     :param method: HTTP request method (default: 'POST')
     :param connection_options: a dictionary that will be passed to
         connection_factory as keyword arguments.
+    :param connection_pool: a pool of keep-alive connections to reuse, the
+        connection is returned to the pool after the request
+    :param pool_key: key of connections in connection_pool
 
     Perform a HTTP(s) request.
     """
@@ -225,19 +302,55 @@ def _httplib_request(
     ):
         headers['content-type'] = 'application/x-www-form-urlencoded'
 
+    start = time.time()
+    conn = None
+    reused = False
     try:
-        conn = connection_factory(host, port, **connection_options)
-        conn.request(method, path, body=request_body, headers=headers)
-        res = conn.getresponse()
+        if connection_pool is not None:
+            conn = connection_pool.get(pool_key)
+            reused = conn is not None
+        while True:
+            sent = False
+            if conn is None:
+                conn = connection_factory(host, port, **connection_options)
+                if connection_pool is not None:
+                    connection_pool.add(conn)
+            try:
+                conn.request(method, path, body=request_body, headers=headers)
+                sent = True
+                res = conn.getresponse()
+            except ConnectionError:
+                # the server has closed the idle connection in the meantime,
+                # send the request again unless the server might have
+                # processed it already
+                if not reused or (sent and method not in IDEMPOTENT_METHODS):
+                    raise
+                logger.debug("pooled connection closed by server, "
+                             "reconnecting")
+                conn.close()
+                conn = None
+                reused = False
+                continue
+            break
 
         http_status = res.status
         http_headers = res.msg
         http_body = res.read()
-        conn.close()
+        if connection_pool is not None and not res.will_close:
+            connection_pool.put(pool_key, conn)
+        else:
+            conn.close()
     except Exception as e:
+        if conn is not None:
+            conn.close()
         logger.debug("httplib request failed:", exc_info=True)
         raise NetworkError(uri=uri, error=str(e))
 
+    duration = time.time() - start
+    request_stats.record(method, path, duration, reused)
+    logger.debug('request %s %s took %.3f seconds (%s connection)',
+                 method, uri, duration, 'reused' if reused else 'new')
+
     encoding = res.getheader('Content-Encoding')
     if encoding == 'gzip':
         http_body = gzip_decompress(http_body)
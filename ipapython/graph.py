@@ -10,16 +10,32 @@ class Graph:
 
     G = (V, E) where G is graph, V set of vertices and E list of edges.
     E = (tail, head) where tail and head are vertices
+
+    Edges are indexed by both tail and head, so that heads and tails of a
+    vertex are found and the vertex is removed in time proportional to its
+    degree.
     """
 
     def __init__(self):
         self.vertices = set()
-        self.edges = []
+        # {tail: {head: number of edges}}
         self._adj = dict()
+        # {head: {tail: number of edges}}
+        self._radj = dict()
+
+    @property
+    def edges(self):
+        return [
+            (tail, head)
+            for tail, heads in self._adj.items()
+            for head, count in heads.items()
+            for _i in range(count)
+        ]
 
     def add_vertex(self, vertex):
         self.vertices.add(vertex)
-        self._adj[vertex] = []
+        self._adj[vertex] = {}
+        self._radj[vertex] = {}
 
     def add_edge(self, tail, head):
         if tail not in self.vertices:
@@ -28,17 +44,24 @@ class Graph:
         if head not in self.vertices:
             raise ValueError("head is not a vertex")
 
-        self.edges.append((tail, head))
-        self._adj[tail].append(head)
+        heads = self._adj[tail]
+        heads[head] = heads.get(head, 0) + 1
+        tails = self._radj[head]
+        tails[tail] = tails.get(tail, 0) + 1
 
     def remove_edge(self, tail, head):
-        try:
-            self.edges.remove((tail, head))
-        except KeyError:
+        heads = self._adj.get(tail, {})
+        if head not in heads:
             raise ValueError(
                 "graph does not contain edge: ({0}, {1})".format(tail, head)
             )
-        self._adj[tail].remove(head)
+        tails = self._radj[head]
+        if heads[head] == 1:
+            del heads[head]
+            del tails[tail]
+        else:
+            heads[head] -= 1
+            tails[tail] -= 1
 
     def remove_vertex(self, vertex):
         try:
@@ -48,27 +71,31 @@ class Graph:
                 "graph does not contain vertex: {0}".format(vertex)
             )
 
-        # delete _adjacencies
-        del self._adj[vertex]
-        for adj in self._adj.values():
-            adj[:] = [v for v in adj if v != vertex]
-
-        # delete edges
-        self.edges = [
-            e for e in self.edges if vertex not in (e[0], e[1])
-        ]
+        # delete edges from and to the vertex
+        for head in self._adj.pop(vertex):
+            self._radj[head].pop(vertex, None)
+        for tail in self._radj.pop(vertex):
+            self._adj[tail].pop(vertex, None)
 
     def get_tails(self, head):
         """
         Get list of vertices where a vertex is on the right side of an edge
         """
-        return [e[0] for e in self.edges if e[1] == head]
+        return [
+            tail
+            for tail, count in self._radj.get(head, {}).items()
+            for _i in range(count)
+        ]
 
     def get_heads(self, tail):
         """
         Get list of vertices where a vertex is on the left side of an edge
         """
-        return [e[1] for e in self.edges if e[0] == tail]
+        return [
+            head
+            for head, count in self._adj.get(tail, {}).items()
+            for _i in range(count)
+        ]
 
     def bfs(self, start=None):
         """
@@ -86,3 +113,131 @@ class Graph:
                 visited.add(vertex)
                 queue.extend(set(self._adj.get(vertex, [])) - visited)
         return visited
+
+    def is_symmetric(self):
+        """
+        Return True if for every edge the graph contains the opposite edge
+        """
+        return all(
+            self._radj[tail].keys() == heads.keys()
+            for tail, heads in self._adj.items()
+        )
+
+    def get_strong_components(self, exclude=None):
+        """
+        Find strongly connected components of the graph without the `exclude`
+        vertex, using Tarjan's algorithm.
+
+        Return a list of components (sets of vertices) in reverse
+        topological order, i.e. every component is listed after all the
+        components reachable from it.
+        """
+        index = {}
+        lowlink = {}
+        stack = []
+        on_stack = set()
+        components = []
+
+        for root in self.vertices:
+            if root in index or root == exclude:
+                continue
+            index[root] = lowlink[root] = len(index)
+            stack.append(root)
+            on_stack.add(root)
+            work = [(root, iter(self._adj[root]))]
+            while work:
+                vertex, heads = work[-1]
+                for head in heads:
+                    if head == exclude:
+                        continue
+                    if head not in index:
+                        index[head] = lowlink[head] = len(index)
+                        stack.append(head)
+                        on_stack.add(head)
+                        work.append((head, iter(self._adj[head])))
+                        break
+                    elif head in on_stack:
+                        lowlink[vertex] = min(lowlink[vertex], index[head])
+                else:
+                    work.pop()
+                    if work:
+                        parent = work[-1][0]
+                        lowlink[parent] = min(lowlink[parent],
+                                              lowlink[vertex])
+                    if lowlink[vertex] == index[vertex]:
+                        component = set()
+                        while True:
+                            member = stack.pop()
+                            on_stack.remove(member)
+                            component.add(member)
+                            if member == vertex:
+                                break
+                        components.append(component)
+
+        return components
+
+    def get_reachable(self, exclude=None):
+        """
+        Find vertices reachable from every vertex of the graph without the
+        `exclude` vertex in a single pass over the strongly connected
+        components.
+
+        Return a dict mapping each vertex to a frozenset of vertices
+        reachable from it, including the vertex itself
+        """
+        reachable = {}
+        for component in self.get_strong_components(exclude):
+            vertices = set(component)
+            for vertex in component:
+                for head in self._adj[vertex]:
+                    if head != exclude and head not in component:
+                        vertices |= reachable[head]
+            vertices = frozenset(vertices)
+            for vertex in component:
+                reachable[vertex] = vertices
+        return reachable
+
+    def get_articulation_points(self):
+        """
+        Find articulation points of the graph with edge directions ignored,
+        i.e. vertices whose removal increases the number of connected
+        components of the graph.
+        """
+        neighbors = {
+            vertex: set(self._adj[vertex]) | set(self._radj[vertex])
+            for vertex in self.vertices
+        }
+        index = {}
+        lowlink = {}
+        points = set()
+
+        for root in self.vertices:
+            if root in index:
+                continue
+            index[root] = lowlink[root] = len(index)
+            root_children = 0
+            work = [(root, None, iter(neighbors[root]))]
+            while work:
+                vertex, parent, adjacent = work[-1]
+                for neighbor in adjacent:
+                    if neighbor not in index:
+                        index[neighbor] = lowlink[neighbor] = len(index)
+                        work.append(
+                            (neighbor, vertex, iter(neighbors[neighbor])))
+                        break
+                    elif neighbor != parent:
+                        lowlink[vertex] = min(lowlink[vertex],
+                                              index[neighbor])
+                else:
+                    work.pop()
+                    if parent is None:
+                        continue
+                    lowlink[parent] = min(lowlink[parent], lowlink[vertex])
+                    if parent == root:
+                        root_children += 1
+                    elif lowlink[vertex] >= index[parent]:
+                        points.add(parent)
+            if root_children > 1:
+                points.add(root)
+
+        return points
@@ -21,14 +21,18 @@
 
 import binascii
 import errno
+import hashlib
 import logging
+import tempfile
 import time
 import datetime
 from decimal import Decimal
 from copy import deepcopy
 import contextlib
 import os
+import pickle
 import pwd
+import sys
 import warnings
 
 from cryptography import x509 as crypto_x509
@@ -38,6 +42,8 @@ import ldap
 import ldap.sasl
 import ldap.filter
 from ldap.controls import SimplePagedResultsControl, GetEffectiveRightsControl
+from ldap.controls.libldap import MatchedValuesControl
+from ldap.controls.sss import SSSRequestControl
 import ldapurl
 import six
 
@@ -53,9 +59,9 @@ from ipapython.kerberos import Principal
 
 # pylint: disable=no-name-in-module, import-error
 if six.PY3:
-    from collections.abc import MutableMapping
+    from collections.abc import Mapping, MutableMapping
 else:
-    from collections import MutableMapping
+    from collections import Mapping, MutableMapping
 # pylint: enable=no-name-in-module, import-error
 
 if six.PY3:
@@ -151,10 +157,24 @@ class _ServerSchema:
 class SchemaCache:
     '''
     Cache the schema's from individual LDAP servers.
+
+    If snapshot_dir is set, the parsed schema retrieved from a server is
+    also stored in a snapshot file in that directory, versioned by the
+    modifyTimestamp and nsSchemaCSN of the schema entry. Other processes
+    load the snapshot instead of downloading and parsing the schema as long
+    as the version on the server has not changed. The pickled schema
+    depends on the python-ldap classes, so snapshots are also keyed on the
+    python-ldap and Python versions. Only snapshots owned by the user of the
+    process are loaded, any snapshot which does not match exactly is
+    ignored and the schema is retrieved from the server.
     '''
 
+    schema_attrs = ['attributetypes', 'objectclasses']
+    version_attrs = ['modifytimestamp', 'nsschemacsn']
+
     def __init__(self):
         self.servers = {}
+        self.snapshot_dir = None
 
     def get_schema(self, url, conn, force_update=False):
         '''
@@ -171,7 +191,7 @@ class SchemaCache:
 
         server_schema = self.servers.get(url)
         if server_schema is None:
-            schema = self._retrieve_schema_from_server(url, conn)
+            schema = self._retrieve_schema(url, conn, force_update)
             server_schema = _ServerSchema(url, schema)
             self.servers[url] = server_schema
         return server_schema.schema
@@ -183,6 +203,94 @@ class SchemaCache:
         except KeyError:
             pass
 
+    def _retrieve_schema(self, url, conn, force_update=False):
+        if self.snapshot_dir is None:
+            return self._retrieve_schema_from_server(url, conn)
+
+        key = self._get_snapshot_key(url)
+        path = os.path.join(
+            self.snapshot_dir,
+            hashlib.sha256(repr(key).encode('utf-8')).hexdigest() + '.pickle')
+        if not force_update:
+            snapshot = self._load_snapshot(path, key)
+            if (snapshot is not None and snapshot['version'] ==
+                    self._retrieve_schema_version(url, conn)):
+                logger.debug('using schema snapshot %s for url=%s',
+                             path, url)
+                return snapshot['schema']
+
+        # the version is retrieved along with the schema, so a process
+        # which finds no snapshot needs a single search
+        schema_entry = self._retrieve_schema_entry(
+            url, conn, self.schema_attrs + self.version_attrs)
+        schema = ldap.schema.SubSchema(schema_entry)
+        version = self._get_schema_version(schema_entry)
+        if version is not None:
+            self._store_snapshot(path, key, version, schema)
+        return schema
+
+    def _get_snapshot_key(self, url):
+        return (url, ldap.__version__, sys.version_info[:2])
+
+    def _retrieve_schema_version(self, url, conn):
+        """
+        Return the version of the schema of the server, or None if the
+        server does not publish it
+        """
+        try:
+            entry = conn.search_s('cn=schema', ldap.SCOPE_BASE,
+                                  attrlist=self.version_attrs)[0]
+        except (ldap.LDAPError, IndexError) as e:
+            logger.debug('failed to retrieve schema version of url=%s: %s',
+                         url, e)
+            return None
+        return self._get_schema_version(entry[1])
+
+    def _get_schema_version(self, schema_entry):
+        attrs = dict((k.lower(), v) for k, v in schema_entry.items())
+        version = [
+            b';'.join(sorted(attrs.get(name, []))).decode('utf-8')
+            for name in self.version_attrs
+        ]
+        if not any(version):
+            return None
+        return version
+
+    def _load_snapshot(self, path, key):
+        try:
+            with open(path, 'rb') as f:
+                if os.fstat(f.fileno()).st_uid != os.geteuid():
+                    logger.debug('ignoring schema snapshot %s of another '
+                                 'user', path)
+                    return None
+                snapshot = pickle.load(f)
+        except (IOError, OSError):
+            return None
+        except Exception as e:
+            logger.debug('failed to load schema snapshot %s: %s', path, e)
+            return None
+        if (not isinstance(snapshot, dict) or
+                snapshot.get('key') != key or
+                not isinstance(snapshot.get('schema'), ldap.schema.SubSchema)):
+            logger.debug('ignoring schema snapshot %s of another version',
+                         path)
+            return None
+        return snapshot
+
+    def _store_snapshot(self, path, key, version, schema):
+        snapshot = dict(key=key, version=version, schema=schema)
+        try:
+            fd, tmpname = tempfile.mkstemp(dir=self.snapshot_dir)
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    pickle.dump(snapshot, f, pickle.HIGHEST_PROTOCOL)
+                os.rename(tmpname, path)
+            except BaseException:
+                os.unlink(tmpname)
+                raise
+        except (IOError, OSError) as e:
+            logger.debug('failed to store schema snapshot %s: %s', path, e)
+
     def _retrieve_schema_from_server(self, url, conn):
         """
         Retrieve the LDAP schema from the provided url and determine if
@@ -196,6 +304,15 @@ class SchemaCache:
         If a connection is provided then it the credentials bound to it are
         used. The connection is not closed when the request is done.
         """
+        return ldap.schema.SubSchema(self._retrieve_schema_entry(url, conn))
+
+    def _retrieve_schema_entry(self, url, conn, attrlist=None):
+        """
+        Retrieve the raw attributes of the subschema entry from the
+        provided url, by default attributeTypes and objectClasses
+        """
+        if attrlist is None:
+            attrlist = self.schema_attrs
         assert conn is not None
 
         logger.debug(
@@ -204,13 +321,13 @@ class SchemaCache:
         try:
             try:
                 schema_entry = conn.search_s('cn=schema', ldap.SCOPE_BASE,
-                    attrlist=['attributetypes', 'objectclasses'])[0]
+                    attrlist=attrlist)[0]
             except ldap.NO_SUCH_OBJECT:
                 # try different location for schema
                 # openldap has schema located in cn=subschema
                 logger.debug('cn=schema not found, fallback to cn=subschema')
                 schema_entry = conn.search_s('cn=subschema', ldap.SCOPE_BASE,
-                    attrlist=['attributetypes', 'objectclasses'])[0]
+                    attrlist=attrlist)[0]
         except ldap.SERVER_DOWN:
             raise errors.NetworkError(uri=url,
                                error=u'LDAP Server Down, unable to retrieve LDAP schema')
@@ -224,7 +341,7 @@ class SchemaCache:
         # TODO: DS uses 'cn=schema', support for other server?
         #       raise a more appropriate exception
 
-        return ldap.schema.SubSchema(schema_entry[1])
+        return schema_entry[1]
 
 schema_cache = SchemaCache()
 
@@ -600,7 +717,7 @@ class LDAPEntryView(MutableMapping):
     __slots__ = ('_entry',)
 
     def __init__(self, entry):
-        assert isinstance(entry, LDAPEntry)
+        assert isinstance(entry, (LDAPEntry, ReadOnlyLDAPEntry))
         self._entry = entry
 
     def __delitem__(self, name):
@@ -649,6 +766,158 @@ class SingleValueLDAPEntryView(LDAPEntryView):
             self._entry[name] = [value]
 
 
+class ReadOnlyLDAPEntry(Mapping):
+    """
+    Read-only LDAP entry for large search results.
+
+    Unlike LDAPEntry, the entry keeps only the raw attributes as returned
+    by python-ldap, with interned attribute names. Values are decoded on
+    first access and the entry does not track modifications. Use copy() to
+    get a modifiable LDAPEntry.
+    """
+    __slots__ = ('_conn', '_dn', '_raw', '_nice')
+
+    __hash__ = None
+
+    # lower-cased attribute name -> lower-cased names of the attribute type,
+    # shared by all entries
+    _aliases = {}
+
+    def __init__(self, _conn, _dn, _raw):
+        assert isinstance(_conn, LDAPClient)
+        assert isinstance(_dn, DN)
+
+        self._conn = _conn
+        self._dn = _dn
+        self._raw = {sys.intern(name): values for name, values in _raw.items()}
+        self._nice = None
+
+    @property
+    def conn(self):
+        return self._conn
+
+    @property
+    def dn(self):
+        return self._dn
+
+    @property
+    def raw(self):
+        return _ReadOnlyRawLDAPEntryView(self)
+
+    @property
+    def single_value(self):
+        return SingleValueLDAPEntryView(self)
+
+    def __repr__(self):
+        return '%s(%r, %r)' % (type(self).__name__, self._dn, self._raw)
+
+    def copy(self):
+        entry = LDAPEntry(self._conn, self._dn)
+        for name, values in self._raw.items():
+            entry.raw[name] = list(values)
+        entry.reset_modlist()
+        return entry
+
+    def _get_attr_aliases(self, name):
+        aliases = self._aliases.get(name)
+        if aliases is not None:
+            return aliases
+
+        schema = self._conn.schema
+        if schema is None:
+            return (name,)
+
+        attrtype = schema.get_obj(ldap.schema.AttributeType, name)
+        if attrtype is None:
+            aliases = frozenset((name,))
+        else:
+            aliases = frozenset(n.lower() for n in attrtype.names)
+        self._aliases[name] = aliases
+        return aliases
+
+    def _get_attr_name(self, name):
+        if name in self._raw:
+            return name
+
+        if not isinstance(name, str):
+            raise TypeError(
+                "attribute name must be unicode or str, got %s object %r" % (
+                    name.__class__.__name__, name))
+
+        aliases = self._get_attr_aliases(name.lower())
+        for key in self._raw:
+            if key.lower() in aliases:
+                return key
+
+        raise KeyError(name)
+
+    def _get_raw(self, name):
+        return self._raw[self._get_attr_name(name)]
+
+    def __getitem__(self, name):
+        name = self._get_attr_name(name)
+
+        if self._nice is None:
+            self._nice = {}
+        try:
+            return self._nice[name]
+        except KeyError:
+            pass
+
+        try:
+            value = self._conn.decode(self._raw[name], name)
+        except ValueError as e:
+            raise ValueError("{error} in LDAP entry '{dn}'".format(
+                error=e, dn=self._dn))
+        self._nice[name] = value
+        return value
+
+    def __len__(self):
+        return len(self._raw)
+
+    def __contains__(self, name):
+        try:
+            self._get_attr_name(name)
+        except KeyError:
+            return False
+        return True
+
+    def has_key(self, name):
+        return name in self
+
+    def __eq__(self, other):
+        if not isinstance(other, ReadOnlyLDAPEntry):
+            return NotImplemented
+        return other is self
+
+    def __ne__(self, other):
+        if not isinstance(other, ReadOnlyLDAPEntry):
+            return NotImplemented
+        return other is not self
+
+    def __iter__(self):
+        return iter(self._raw)
+
+
+class _ReadOnlyRawLDAPEntryView(Mapping):
+    __slots__ = ('_entry',)
+
+    def __init__(self, entry):
+        self._entry = entry
+
+    def __getitem__(self, name):
+        return self._entry._get_raw(name)
+
+    def __iter__(self):
+        return iter(self._entry)
+
+    def __len__(self):
+        return len(self._entry)
+
+    def __contains__(self, name):
+        return name in self._entry
+
+
 class LDAPClient:
     """LDAP backend class
 
@@ -955,6 +1224,28 @@ class LDAPClient:
 
         return None
 
+    def get_attribute_ordering(self, name_or_oid):
+        """
+        Check the schema for the ordering matching rule of the attribute.
+
+        Returns the name or OID of the rule, which may be inherited from the
+        superior attribute type.
+
+        If the attribute has no ordering rule, there is a problem loading
+        the schema or the attribute is not in the schema returns None
+        """
+        if six.PY2 and isinstance(name_or_oid, unicode):
+            name_or_oid = name_or_oid.encode('utf-8')
+
+        schema = self._get_schema()
+        if schema is not None:
+            obj = schema.get_obj(ldap.schema.AttributeType, name_or_oid)
+            if obj is not None:
+                return schema.get_inheritedattr(
+                    ldap.schema.AttributeType, name_or_oid, 'ordering')
+
+        return None
+
     def encode(self, val):
         """
         Encode attribute value to LDAP representation (str/bytes).
@@ -1030,7 +1321,7 @@ class LDAPClient:
         else:
             raise TypeError("attempt to pass unsupported type from ldap, value=%s type=%s" %(val, type(val)))
 
-    def _convert_result(self, result):
+    def _convert_result(self, result, read_only=False):
         '''
         result is a python-ldap result tuple of the form (dn, attrs),
         where dn is a string containing the dn (distinguished name) of
@@ -1038,7 +1329,8 @@ class LDAPClient:
         associated with the entry. The keys of attrs are strings, and
         the associated values are lists of strings.
 
-        We convert the tuple to an LDAPEntry object.
+        We convert the tuple to an LDAPEntry object, or to a
+        ReadOnlyLDAPEntry object if read_only is True.
         '''
 
         ipa_result = []
@@ -1055,11 +1347,15 @@ class LDAPClient:
 
                 continue
 
-            ipa_entry = LDAPEntry(self, DN(original_dn))
+            if read_only:
+                ipa_entry = ReadOnlyLDAPEntry(
+                    self, DN(original_dn), original_attrs)
+            else:
+                ipa_entry = LDAPEntry(self, DN(original_dn))
 
-            for attr, original_values in original_attrs.items():
-                ipa_entry.raw[attr] = original_values
-            ipa_entry.reset_modlist()
+                for attr, original_values in original_attrs.items():
+                    ipa_entry.raw[attr] = original_values
+                ipa_entry.reset_modlist()
 
             ipa_result.append(ipa_entry)
 
@@ -1376,6 +1672,17 @@ class LDAPClient:
             return '(%s=%s)' % (attr, value)
         return ''
 
+    @classmethod
+    def make_ordering_filter(cls, attr, value, greater=True):
+        """
+        Make filter matching entries whose attribute value sorts after
+        (greater=True) or before (greater=False) value, value excluded.
+        """
+        value = ldap.filter.escape_filter_chars(str(value))
+        if greater:
+            return '(!(%s<=%s))' % (attr, value)
+        return '(!(%s>=%s))' % (attr, value)
+
     @classmethod
     def make_filter(
             cls, entry_attrs, attrs_list=None, rules='|', exact=True,
@@ -1457,7 +1764,8 @@ class LDAPClient:
     def find_entries(
             self, filter=None, attrs_list=None, base_dn=None,
             scope=ldap.SCOPE_SUBTREE, time_limit=None, size_limit=None,
-            paged_search=False, get_effective_rights=False):
+            paged_search=False, get_effective_rights=False, sort_keys=None,
+            read_only=False, matched_values=None):
         """
         Return a list of entries and indication of whether the results were
         truncated ([(dn, entry_attrs)], truncated) matching specified search
@@ -1475,6 +1783,16 @@ class LDAPClient:
                            (default unlimited)
         :param paged_search: search using paged results control
         :param get_effective_rights: use GetEffectiveRights control
+        :param sort_keys: list of attributes the server sorts the result by
+                          using the server side sorting control. Combined
+                          with size_limit it returns the first entries of
+                          the sorted result.
+        :param read_only: return ReadOnlyLDAPEntry objects, which take less
+                          memory but cannot be modified
+        :param matched_values: values return filter of the matched values
+                               control, e.g. ``((member=...)(member=...))``.
+                               Only attribute values matching it are
+                               returned.
 
         :raises: errors.NotFound if result set is empty
                                  or base_dn doesn't exist
@@ -1506,6 +1824,13 @@ class LDAPClient:
         base_sctrls = []
         if get_effective_rights:
             base_sctrls.append(self.__get_effective_rights_control())
+        if sort_keys:
+            base_sctrls.append(
+                SSSRequestControl(criticality=True, ordering_rules=sort_keys))
+        if matched_values:
+            base_sctrls.append(
+                MatchedValuesControl(criticality=True,
+                                     filterstr=matched_values))
 
         cookie = ''
         page_size = (size_limit if size_limit > 0 else 2000) - 1
@@ -1537,7 +1862,8 @@ class LDAPClient:
                         objtype, res_list, _res_id, res_ctrls = result
                         if objtype == ldap.RES_SEARCH_RESULT:
                             break
-                        res_list = self._convert_result(res_list)
+                        res_list = self._convert_result(
+                            res_list, read_only=read_only)
                         if res_list:
                             res.append(res_list[0])
 
@@ -1587,6 +1913,90 @@ class LDAPClient:
 
         return (res, truncated)
 
+    def iter_entries(
+            self, filter=None, attrs_list=None, base_dn=None,
+            scope=ldap.SCOPE_SUBTREE, time_limit=None, page_size=1000,
+            read_only=False):
+        """
+        Iterate over entries matching specified search parameters.
+
+        Unlike find_entries(), the entries are retrieved in pages of
+        page_size entries using the paged results control and only one page
+        is kept in memory at a time. If the iteration is stopped before the
+        last entry, the paged search is cancelled.
+
+        Keyword arguments are the same as for find_entries().
+
+        :raises: errors.LimitsExceeded after the last entry if the search
+                 hit a server limit
+        """
+        if base_dn is None:
+            base_dn = DN()
+        assert isinstance(base_dn, DN)
+        if not filter:
+            filter = '(objectClass=*)'
+
+        if time_limit is None:
+            time_limit = self.time_limit
+        if time_limit == 0:
+            time_limit = -1.0
+        if not isinstance(time_limit, float):
+            time_limit = float(time_limit)
+
+        if attrs_list:
+            attrs_list = [a.lower() for a in set(attrs_list)]
+
+        cookie = ''
+        try:
+            while True:
+                page = []
+                truncated = False
+                res_ctrls = []
+                sctrls = [SimplePagedResultsControl(0, page_size, cookie)]
+                with self.error_handler():
+                    try:
+                        msgid = self.conn.search_ext(
+                            str(base_dn), scope, filter, attrs_list,
+                            serverctrls=sctrls, timeout=time_limit)
+                        while True:
+                            result = self.conn.result3(msgid, 0)
+                            objtype, res_list, _res_id, res_ctrls = result
+                            if objtype == ldap.RES_SEARCH_RESULT:
+                                break
+                            page.extend(self._convert_result(
+                                res_list, read_only=read_only))
+                    except ldap.ADMINLIMIT_EXCEEDED:
+                        truncated = TRUNCATED_ADMIN_LIMIT
+                    except ldap.SIZELIMIT_EXCEEDED:
+                        truncated = TRUNCATED_SIZE_LIMIT
+                    except ldap.TIMELIMIT_EXCEEDED:
+                        truncated = TRUNCATED_TIME_LIMIT
+
+                cookie = ''
+                if not truncated:
+                    for ctrl in res_ctrls:
+                        if isinstance(ctrl, SimplePagedResultsControl):
+                            cookie = ctrl.cookie
+                            break
+
+                for entry in page:
+                    yield entry
+
+                if truncated:
+                    self.handle_truncated_result(truncated)
+                if not cookie:
+                    break
+        finally:
+            if cookie:
+                # the iteration was stopped, cancel the paged search
+                sctrls = [SimplePagedResultsControl(0, 0, cookie)]
+                try:
+                    self.conn.search_ext_s(
+                        str(base_dn), scope, filter, attrs_list,
+                        serverctrls=sctrls, timeout=time_limit)
+                except ldap.LDAPError as e:
+                    logger.warning("Error cancelling paged search: %s", e)
+
     def __get_effective_rights_control(self):
         """Construct a GetEffectiveRights control for current user."""
         bind_dn = self.conn.whoami_s()[4:]
@@ -0,0 +1,539 @@
+#
+# Copyright (C) 2026  FreeIPA Contributors see COPYING for license
+#
+
+"""
+Index of metadata of certificates issued by the CA
+
+The index answers certificate searches of cert_find without searching the
+whole CA and maps certificates to their owners in LDAP.
+"""
+
+from __future__ import absolute_import
+
+import datetime
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from ipapython.dn import DN
+from ipaplatform.paths import paths
+
+logger = logging.getLogger(__name__)
+
+# search options of ra.find() the index can answer
+INDEXED_OPTIONS = frozenset((
+    'issuer', 'subject', 'exactly',
+    'min_serial_number', 'max_serial_number',
+    'validnotbefore_from', 'validnotbefore_to',
+    'validnotafter_from', 'validnotafter_to',
+))
+
+# date search options of ra.find() and the indexed columns they compare
+DATE_OPTIONS = (
+    ('validnotbefore_from', 'not_before >= ?'),
+    ('validnotbefore_to', 'not_before <= ?'),
+    ('validnotafter_from', 'not_after >= ?'),
+    ('validnotafter_to', 'not_after <= ?'),
+)
+
+# search of ra.find() for all revoked certificates
+REVOKED_OPTIONS = {'revokedon_from': '1970-01-02'}
+
+# how long writes wait for other processes [seconds]
+BUSY_TIMEOUT = 30
+
+TABLES = ('certs', 'cns', 'owners', 'owner_certs', 'meta')
+
+SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS certs ('
+    ' serial TEXT NOT NULL,'
+    ' issuer TEXT NOT NULL,'
+    ' issuer_key TEXT NOT NULL,'
+    ' subject TEXT,'
+    ' not_before INTEGER,'
+    ' not_after INTEGER,'
+    ' PRIMARY KEY (issuer_key, serial))',
+    'CREATE INDEX IF NOT EXISTS certs_serial ON certs (serial)',
+    'CREATE INDEX IF NOT EXISTS certs_not_after ON certs (not_after)',
+    # lowercase subject CNs
+    'CREATE TABLE IF NOT EXISTS cns ('
+    ' cn TEXT NOT NULL,'
+    ' issuer_key TEXT NOT NULL,'
+    ' serial TEXT NOT NULL,'
+    ' PRIMARY KEY (cn, issuer_key, serial))',
+    'CREATE INDEX IF NOT EXISTS cns_cert ON cns (issuer_key, serial)',
+    # LDAP entries with certificates and their entryUSN when indexed
+    'CREATE TABLE IF NOT EXISTS owners ('
+    ' dn TEXT PRIMARY KEY,'
+    ' usn INTEGER NOT NULL)',
+    'CREATE TABLE IF NOT EXISTS owner_certs ('
+    ' dn TEXT NOT NULL,'
+    ' issuer TEXT NOT NULL,'
+    ' serial TEXT NOT NULL,'
+    ' PRIMARY KEY (dn, issuer, serial))',
+    'CREATE TABLE IF NOT EXISTS meta ('
+    ' name TEXT PRIMARY KEY,'
+    ' value REAL NOT NULL)',
+)
+
+
+def _serial_key(serial_number):
+    # zero padded hex compares like the number, serial numbers have at
+    # most 160 bits
+    return '%040x' % int(serial_number)
+
+
+def _issuer_key(issuer):
+    # DNs compare case insensitively
+    return str(DN(issuer)).lower()
+
+
+def _dn_key(dn):
+    return str(DN(dn)).lower()
+
+
+def _convert_date(value):
+    """
+    Convert a search date to milliseconds the same way ra.find() does
+    """
+    ts = time.strptime(value, '%Y-%m-%d')
+    return int(time.mktime(ts) * 1000)
+
+
+def _to_millis(value):
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=datetime.timezone.utc)
+    return int(value.timestamp() * 1000)
+
+
+def _get_status(revoked_status, not_before, not_after):
+    """
+    Return the status of a certificate like the CA does
+
+    :param revoked_status: status reported by the CA for a revoked
+                           certificate, None if the certificate is not
+                           revoked
+    """
+    now = time.time() * 1000
+    expired = not_after < now
+    if revoked_status is not None:
+        return u'REVOKED_EXPIRED' if expired else u'REVOKED'
+    elif expired:
+        return u'EXPIRED'
+    elif not_before > now:
+        return u'INVALID'
+    return u'VALID'
+
+
+class CertIndex:
+    """
+    Index of metadata of certificates issued by the CA, shared by all server
+    processes in a SQLite database.
+
+    The index holds only the metadata which does not change once a
+    certificate is issued: serial number, issuer, subject and validity. It
+    is filled from the certificate search of the CA. Certificates issued
+    since the last refresh are retrieved on a search which comes more than
+    ``refresh_interval`` seconds after the previous refresh. The whole index
+    is rebuilt every ``rebuild_interval`` seconds. Certificates requested by
+    the RA backend are added immediately.
+
+    The revocation status changes, also outside of IPA, so it is not
+    indexed. Every search retrieves the currently revoked certificates from
+    the CA instead.
+
+    Refreshes run in a background thread of the process which claimed them,
+    searches are answered from the current index meanwhile and never wait
+    for a refresh. A search is not answered before the index is built.
+
+    The index also maps LDAP entries to their certificates. An entry is
+    indexed with its entryUSN, which changes on every modification, so
+    changed entries are found without retrieving their certificates.
+    """
+    schema_version = 2
+    rebuild_interval = 3600
+    # a refresh claimed longer ago is considered failed and claimed again
+    claim_timeout = 600
+
+    def __init__(self, path, refresh_interval):
+        self.path = path
+        self.refresh_interval = refresh_interval
+        self._conn = None
+        self._pid = None
+        self._lock = threading.RLock()
+        self._refresh_thread = None
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT,
+                               isolation_level=None,
+                               check_same_thread=False)
+        conn.execute('PRAGMA journal_mode=WAL')
+        version = conn.execute('PRAGMA user_version').fetchone()[0]
+        if version != self.schema_version:
+            for table in TABLES:
+                conn.execute('DROP TABLE IF EXISTS %s' % table)
+        for statement in SCHEMA:
+            conn.execute(statement)
+        conn.execute('PRAGMA user_version = %d' % self.schema_version)
+        return conn
+
+    @property
+    def conn(self):
+        # a SQLite connection must not be used in a forked process
+        if self._conn is None or self._pid != os.getpid():
+            self._conn = self._connect()
+            self._pid = os.getpid()
+        return self._conn
+
+    @staticmethod
+    def can_search(options):
+        """
+        Return True if the index can answer a search with ra.find() options
+        """
+        return set(options) <= INDEXED_OPTIONS
+
+    def search(self, ra, options, sizelimit=0):
+        """
+        Search for certificates like ra.find(), start a refresh of the index
+        from the CA if needed
+
+        :param ra: the RA backend
+        :param options: dictionary of search options
+        :param sizelimit: maximum number of results, 0 is unlimited
+        :return: list of results of ra.find(), None when the index cannot
+                 answer the search and the CA must be searched instead
+        """
+        try:
+            with self._lock:
+                self.refresh(ra)
+                if not _get_meta(self.conn, 'rebuilt'):
+                    return None
+                rows = self._query(options, sizelimit)
+        except sqlite3.Error as e:
+            logger.warning('Failed to search certificate index: %s', e)
+            return None
+
+        revoked = {
+            (_issuer_key(record['issuer']),
+             _serial_key(record['serial_number'])): record['status']
+            for record in ra.iter_find(REVOKED_OPTIONS)
+        }
+
+        results = []
+        for serial, issuer, issuer_key, subject, not_before, not_after in rows:
+            serial_number = int(serial, 16)
+            results.append({
+                'serial_number': serial_number,
+                'serial_number_hex': u'0x%X' % serial_number,
+                'subject': subject,
+                'issuer': issuer,
+                'valid_not_before': u'%d' % not_before,
+                'valid_not_after': u'%d' % not_after,
+                'status': _get_status(revoked.get((issuer_key, serial)),
+                                      not_before, not_after),
+            })
+        return results
+
+    def _query(self, options, sizelimit):
+        where = []
+        args = []
+        if 'issuer' in options:
+            where.append('issuer_key = ?')
+            args.append(_issuer_key(options['issuer']))
+        if 'subject' in options:
+            if options.get('exactly'):
+                match = 'cn = ?'
+            else:
+                match = 'instr(cn, ?) > 0'
+            where.append('(issuer_key, serial) IN (SELECT issuer_key, '
+                         'serial FROM cns WHERE %s)' % match)
+            args.append(options['subject'].lower())
+        if 'min_serial_number' in options:
+            where.append('serial >= ?')
+            args.append(_serial_key(options['min_serial_number']))
+        if 'max_serial_number' in options:
+            where.append('serial <= ?')
+            args.append(_serial_key(options['max_serial_number']))
+        for name, condition in DATE_OPTIONS:
+            if name in options:
+                where.append(condition)
+                args.append(_convert_date(options[name]))
+
+        query = ('SELECT serial, issuer, issuer_key, subject, not_before, '
+                 'not_after FROM certs')
+        if where:
+            query += ' WHERE ' + ' AND '.join(where)
+        query += ' ORDER BY serial'
+        if sizelimit:
+            query += ' LIMIT %d' % sizelimit
+        return self.conn.execute(query, args).fetchall()
+
+    def refresh(self, ra, wait=False):
+        """
+        Update the index from the CA if the last update is too old and no
+        other process is updating it
+
+        :param wait: update the index in the calling thread instead of a
+                     background thread
+        """
+        with self._lock:
+            claim = self._claim_refresh()
+            if claim is None:
+                return
+            # select the CA host now, the thread has no LDAP connection
+            args = (ra, ra.ca_host) + claim
+            if wait:
+                self._refresh(*args)
+                return
+            self._refresh_thread = threading.Thread(
+                target=self._refresh, args=args)
+            self._refresh_thread.daemon = True
+            self._refresh_thread.start()
+
+    def _claim_refresh(self):
+        """
+        Claim an update of the index for this process
+
+        :return: (start time, True for a full rebuild, time of the last
+                 update) or None if no update is needed or another process
+                 is updating the index
+        """
+        now = time.time()
+        conn = self.conn
+        if now - _get_meta(conn, 'refreshed') < self.refresh_interval:
+            return None
+
+        # do not wait for another process writing the index
+        conn.execute('PRAGMA busy_timeout = 0')
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+        except sqlite3.OperationalError:
+            return None
+        finally:
+            conn.execute('PRAGMA busy_timeout = %d' % (BUSY_TIMEOUT * 1000))
+        try:
+            refreshed = _get_meta(conn, 'refreshed')
+            rebuilt = _get_meta(conn, 'rebuilt')
+            claimed = _get_meta(conn, 'claimed')
+            if (now - refreshed < self.refresh_interval or
+                    now - claimed < self.claim_timeout):
+                conn.execute('COMMIT')
+                return None
+            _set_meta(conn, 'claimed', now)
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        return now, now - rebuilt >= self.rebuild_interval, refreshed
+
+    def _refresh(self, ra, ca_host, now, full, refreshed):
+        start = time.time()
+        try:
+            # retrieve the certificates before the transaction, searches of
+            # other processes are not blocked meanwhile
+            if full:
+                records = list(ra.iter_find({}, ca_host=ca_host))
+            else:
+                # dates are compared at day granularity, go one day back so
+                # that no change is missed in any time zone
+                since = datetime.date.fromtimestamp(
+                    refreshed - 86400).strftime('%Y-%m-%d')
+                records = list(ra.iter_find({'issuedon_from': since},
+                                            ca_host=ca_host))
+
+            conn = self._connect()
+            try:
+                conn.execute('BEGIN IMMEDIATE')
+                try:
+                    if full:
+                        conn.execute('DELETE FROM certs')
+                        conn.execute('DELETE FROM cns')
+                        _set_meta(conn, 'rebuilt', now)
+                    _store(conn, records)
+                    _set_meta(conn, 'refreshed', now)
+                    conn.execute("DELETE FROM meta WHERE name = 'claimed'")
+                    conn.execute('COMMIT')
+                except BaseException:
+                    conn.execute('ROLLBACK')
+                    raise
+            finally:
+                conn.close()
+        except Exception as e:
+            # the claim expires and the update is retried later
+            logger.error('Failed to update certificate index: %s', e)
+            return
+        logger.debug('certificate index updated with %d certificates in '
+                     '%.3f seconds', len(records), time.time() - start)
+
+    def invalidate(self):
+        """
+        Rebuild the whole index on the next search, the CA is searched until
+        the index is rebuilt
+        """
+        with self._lock:
+            self.conn.execute('DELETE FROM meta')
+
+    def update(self, records):
+        """
+        Add or replace certificates in the index
+
+        :param records: results of ra.find()
+        """
+        try:
+            with self._lock:
+                _store(self.conn, records)
+        except sqlite3.Error as e:
+            # the next refresh picks the certificates up
+            logger.warning('Failed to update certificate index: %s', e)
+
+    def add_certificate(self, cert):
+        """
+        Add a newly issued certificate to the index
+
+        :param cert: ``ipalib.x509.IPACertificate`` object
+        """
+        self.update([{
+            'serial_number': cert.serial_number,
+            'subject': str(DN(cert.subject)),
+            'issuer': str(DN(cert.issuer)),
+            'valid_not_before': _to_millis(cert.not_valid_before),
+            'valid_not_after': _to_millis(cert.not_valid_after),
+        }])
+
+    def get_owned_certificates(self, owners):
+        """
+        Get certificates of LDAP entries from the index
+
+        :param owners: dictionary of DNs of entries and their entryUSN
+        :return: tuple of a dictionary of DNs of indexed entries and lists
+                 of (issuer DN, serial number) of their certificates, and a
+                 list of DNs of entries which are not indexed or were
+                 modified since
+        """
+        owned = {}
+        stale = []
+        try:
+            with self._lock:
+                conn = self.conn
+                for dn, usn in owners.items():
+                    key = _dn_key(dn)
+                    row = conn.execute(
+                        'SELECT usn FROM owners WHERE dn = ?',
+                        (key,)).fetchone()
+                    if row is None or usn is None or row[0] != int(usn):
+                        stale.append(dn)
+                        continue
+                    owned[dn] = [
+                        (DN(issuer), int(serial, 16))
+                        for issuer, serial in conn.execute(
+                            'SELECT issuer, serial FROM owner_certs '
+                            'WHERE dn = ? ORDER BY serial', (key,))
+                    ]
+        except sqlite3.Error as e:
+            logger.warning('Failed to search certificate index: %s', e)
+            return {}, list(owners)
+        return owned, stale
+
+    def update_owners(self, owners):
+        """
+        Add or replace LDAP entries and their certificates in the index
+
+        :param owners: dictionary of DNs of entries and tuples of their
+                       entryUSN and list of (issuer DN, serial number) of
+                       their certificates
+        """
+        try:
+            with self._lock:
+                conn = self.conn
+                conn.execute('BEGIN IMMEDIATE')
+                try:
+                    for dn, (usn, certs) in owners.items():
+                        key = _dn_key(dn)
+                        conn.execute(
+                            'INSERT OR REPLACE INTO owners (dn, usn) '
+                            'VALUES (?, ?)', (key, int(usn)))
+                        conn.execute(
+                            'DELETE FROM owner_certs WHERE dn = ?', (key,))
+                        conn.executemany(
+                            'INSERT OR IGNORE INTO owner_certs '
+                            '(dn, issuer, serial) VALUES (?, ?, ?)',
+                            [(key, str(DN(issuer)), _serial_key(serial))
+                             for issuer, serial in certs])
+                    conn.execute('COMMIT')
+                except BaseException:
+                    conn.execute('ROLLBACK')
+                    raise
+        except sqlite3.Error as e:
+            # the entries are retrieved from LDAP again by the next search
+            logger.warning('Failed to update certificate index: %s', e)
+
+
+def _store(conn, records):
+    rows = []
+    keys = []
+    cns = []
+    for record in records:
+        serial = _serial_key(record['serial_number'])
+        subject = record.get('subject')
+        issuer = record.get('issuer', u'')
+        issuer_key = _issuer_key(issuer)
+        rows.append((
+            serial,
+            issuer,
+            issuer_key,
+            subject,
+            int(record.get('valid_not_before', 0)),
+            int(record.get('valid_not_after', 0)),
+        ))
+        keys.append((issuer_key, serial))
+        cns.extend(
+            (ava.value.lower(), issuer_key, serial)
+            for rdn in DN(subject or '') for ava in rdn
+            if ava.attr.lower() == 'cn'
+        )
+    conn.executemany(
+        'INSERT OR REPLACE INTO certs (serial, issuer, issuer_key, '
+        'subject, not_before, not_after) '
+        'VALUES (?, ?, ?, ?, ?, ?)', rows)
+    conn.executemany(
+        'DELETE FROM cns WHERE issuer_key = ? AND serial = ?', keys)
+    conn.executemany(
+        'INSERT OR IGNORE INTO cns (cn, issuer_key, serial) '
+        'VALUES (?, ?, ?)', cns)
+    return len(rows)
+
+
+def _get_meta(conn, name):
+    row = conn.execute(
+        'SELECT value FROM meta WHERE name = ?', (name,)).fetchone()
+    return row[0] if row is not None else 0
+
+
+def _set_meta(conn, name, value):
+    conn.execute(
+        'INSERT OR REPLACE INTO meta (name, value) VALUES (?, ?)',
+        (name, value))
+
+
+_cert_index = None
+_cert_index_lock = threading.Lock()
+
+
+def get_cert_index(api):
+    """
+    Return the certificate index of the server or None when disabled
+    """
+    global _cert_index
+
+    if (api.env.context != 'server' or not api.env.cert_index_refresh or
+            not os.path.isdir(paths.IPA_CERT_INDEX_DIR)):
+        return None
+    with _cert_index_lock:
+        if _cert_index is None:
+            _cert_index = CertIndex(
+                os.path.join(paths.IPA_CERT_INDEX_DIR, 'certs.sqlite'),
+                api.env.cert_index_refresh)
+    return _cert_index
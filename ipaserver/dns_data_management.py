@@ -57,6 +57,8 @@ IPA_DEFAULT_NTP_SRV_REC = (
 
 CA_RECORDS_DNS_TIMEOUT = 30  # timeout in seconds
 
+CNAME_TEMPLATE_ATTR = 'idnsTemplateAttribute;cnamerecord'
+
 
 class IPADomainIsNotManagedByIPAError(Exception):
     pass
@@ -272,45 +274,130 @@ class IPASystemRecords:
                 update_dict[option_name].append(unicode(rdata.to_text()))
         return update_dict
 
+    def __get_cname_template(self, record_name):
+        return (
+            r'%s.\{substitutionvariable_ipalocation\}._locations' %
+            record_name.relativize(self.domain_abs)
+        )
+
+    def __get_current_records(self, zone_objs):
+        """
+        Read the current entries of all record names of the zones with a
+        single LDAP search
+        :return: dict of record name to LDAP entry, names without an entry
+        are missing
+        """
+        names = set()
+        attrs = {'idnsname', 'objectclass', CNAME_TEMPLATE_ATTR}
+        for zone_obj in zone_objs:
+            for record_name, node in zone_obj.items():
+                names.add(record_name.relativize(self.domain_abs).ToASCII())
+                attrs.update(
+                    record_name_format % rdatatype.to_text(
+                        rdataset.rdtype).lower()
+                    for rdataset in node
+                )
+        if not names:
+            return {}
+
+        ldap = self.api_instance.Backend.ldap2
+        try:
+            zone_dn = self.api_instance.Object.dnszone.get_dn(self.domain_abs)
+            entries = ldap.get_entries(
+                zone_dn, ldap.SCOPE_ONELEVEL,
+                ldap.make_filter_from_attr(
+                    'idnsname', sorted(names), ldap.MATCH_ANY),
+                list(attrs), size_limit=-1, paged_search=True)
+        except errors.NotFound:
+            return {}
+
+        current = {}
+        for entry in entries:
+            record_name = DNSName(entry.single_value['idnsname'])
+            current[record_name.derelativize(self.domain_abs)] = entry
+        return current
+
+    def __is_rdataset_current(self, rdataset, values):
+        if set(values) == {unicode(rd.to_text()) for rd in rdataset}:
+            return True
+        # values may differ in form only, e.g. in relative names
+        try:
+            current = {
+                rdata.from_text(rdataclass.IN, rdataset.rdtype, value,
+                                origin=self.domain_abs, relativize=False)
+                for value in values
+            }
+        except (DNSException, ValueError):
+            return False
+        return current == set(rdataset)
+
     def __update_dns_records(
-            self, record_name, nodes, set_cname_template=True
+            self, record_name, nodes, set_cname_template=True, entry=None
     ):
-        update_dict = self.__prepare_records_update_dict(nodes)
-        cname_template = {
-            'addattr': ['objectclass=idnsTemplateObject'],
-            'setattr': [
-                r'idnsTemplateAttribute;cnamerecord=%s'
-                r'.\{substitutionvariable_ipalocation\}._locations' %
-                record_name.relativize(self.domain_abs)
-            ]
-        }
+        """
+        Update records of a name which differ from its current LDAP entry
+        :param entry: current LDAP entry of the name, None when the name does
+        not exist
+        """
+        records = self.__prepare_records_update_dict(nodes)
+        cname_template = None
+        if set_cname_template:
+            # only srv records should have configured cname templates
+            cname_template = {
+                'addattr': ['objectclass=idnsTemplateObject'],
+                'setattr': [
+                    '%s=%s' % (CNAME_TEMPLATE_ATTR,
+                               self.__get_cname_template(record_name))
+                ]
+            }
+        if entry is None:
+            self.__add_dns_records(record_name, records, cname_template)
+            return
+
+        # only modify record types and attributes that differ
+        update_dict = {}
+        for rdataset in nodes:
+            option_name = (record_name_format % rdatatype.to_text(
+                rdataset.rdtype).lower())
+            if not self.__is_rdataset_current(
+                    rdataset, entry.get(option_name, [])):
+                update_dict[option_name] = records[option_name]
+        if cname_template:
+            objectclasses = {
+                oc.lower() for oc in entry.get('objectclass', [])}
+            if 'idnstemplateobject' not in objectclasses:
+                update_dict['addattr'] = cname_template['addattr']
+            if (entry.get(CNAME_TEMPLATE_ATTR, []) !=
+                    [self.__get_cname_template(record_name)]):
+                update_dict['setattr'] = cname_template['setattr']
+        if not update_dict:
+            return
+
         try:
-            if set_cname_template:
-                # only srv records should have configured cname templates
-                update_dict.update(cname_template)
             self.api_instance.Command.dnsrecord_mod(
                 self.domain_abs, record_name,
                 **update_dict
             )
         except errors.NotFound:
-            # because internal API magic, addattr and setattr doesn't work with
-            # dnsrecord-add well, use dnsrecord-mod instead later
-            update_dict.pop('addattr', None)
-            update_dict.pop('setattr', None)
-
-            self.api_instance.Command.dnsrecord_add(
-                self.domain_abs, record_name, **update_dict)
-
-            if set_cname_template:
-                try:
-                    self.api_instance.Command.dnsrecord_mod(
-                        self.domain_abs,
-                        record_name, **cname_template)
-                except errors.EmptyModlist:
-                    pass
+            # the record was removed after it was read
+            self.__add_dns_records(record_name, records, cname_template)
         except errors.EmptyModlist:
             pass
 
+    def __add_dns_records(self, record_name, records, cname_template):
+        # because internal API magic, addattr and setattr doesn't work with
+        # dnsrecord-add well, use dnsrecord-mod instead later
+        self.api_instance.Command.dnsrecord_add(
+            self.domain_abs, record_name, **records)
+
+        if cname_template:
+            try:
+                self.api_instance.Command.dnsrecord_mod(
+                    self.domain_abs,
+                    record_name, **cname_template)
+            except errors.EmptyModlist:
+                pass
+
     def get_base_records(
             self, servers=None, roles=None, include_master_role=True,
             include_kerberos_realm=True
@@ -363,35 +450,43 @@ class IPASystemRecords:
                 include_master_role=include_master_role)
         return zone_obj
 
-    def update_base_records(self):
-        """
-        Update base DNS records for IPA services
-        :return: [(record_name, node), ...], [(record_name, node, error), ...]
-        where the first list contains successfully updated records, and the
-        second list contains failed updates with particular exceptions
-        """
+    def __update_records(self, zone_obj, current,
+                         names_requiring_cname_templates=()):
         fail = []
         success = []
-        names_requiring_cname_templates = set(
-            rec[0].derelativize(self.domain_abs) for rec in (
-                IPA_DEFAULT_MASTER_SRV_REC +
-                IPA_DEFAULT_ADTRUST_SRV_REC +
-                IPA_DEFAULT_NTP_SRV_REC
-            )
-        )
-
-        base_zone = self.get_base_records()
-        for record_name, node in base_zone.items():
+        for record_name, node in zone_obj.items():
             set_cname_template = record_name in names_requiring_cname_templates
             try:
                 self.__update_dns_records(
-                    record_name, node, set_cname_template)
+                    record_name, node, set_cname_template,
+                    entry=current.get(record_name))
             except errors.PublicError as e:
                 fail.append((record_name, node, e))
             else:
                 success.append((record_name, node))
         return success, fail
 
+    def __get_names_requiring_cname_templates(self):
+        return set(
+            rec[0].derelativize(self.domain_abs) for rec in (
+                IPA_DEFAULT_MASTER_SRV_REC +
+                IPA_DEFAULT_ADTRUST_SRV_REC +
+                IPA_DEFAULT_NTP_SRV_REC
+            )
+        )
+
+    def update_base_records(self):
+        """
+        Update base DNS records for IPA services
+        :return: [(record_name, node), ...], [(record_name, node, error), ...]
+        where the first list contains successfully updated records, and the
+        second list contains failed updates with particular exceptions
+        """
+        base_zone = self.get_base_records()
+        return self.__update_records(
+            base_zone, self.__get_current_records([base_zone]),
+            self.__get_names_requiring_cname_templates())
+
     def update_locations_records(self):
         """
         Update locations DNS records for IPA services
@@ -399,24 +494,16 @@ class IPASystemRecords:
         where the first list contains successfully updated records, and the
         second list contains failed updates with particular exceptions
         """
-        fail = []
-        success = []
-
         location_zone = self.get_locations_records()
-        for record_name, nodes in location_zone.items():
-            try:
-                self.__update_dns_records(
-                    record_name, nodes,
-                    set_cname_template=False)
-            except errors.PublicError as e:
-                fail.append((record_name, nodes, e))
-            else:
-                success.append((record_name, nodes))
-        return success, fail
+        return self.__update_records(
+            location_zone, self.__get_current_records([location_zone]))
 
     def update_dns_records(self):
         """
         Update all IPA DNS records
+
+        Current records are read with a single search and only names whose
+        records differ are modified, each with its own dnsrecord_mod.
         :return: (sucessfully_updated_base_records, failed_base_records,
         sucessfully_updated_locations_records, failed_locations_records)
         For format see update_base_records or update_locations_method
@@ -428,9 +515,14 @@ class IPASystemRecords:
         except errors.NotFound:
             raise IPADomainIsNotManagedByIPAError()
 
+        base_zone = self.get_base_records()
+        location_zone = self.get_locations_records()
+        current = self.__get_current_records([base_zone, location_zone])
         return (
-            self.update_base_records(),
-            self.update_locations_records()
+            self.__update_records(
+                base_zone, current,
+                self.__get_names_requiring_cname_templates()),
+            self.__update_records(location_zone, current)
         )
 
     def remove_location_records(self, location):
@@ -1102,6 +1102,7 @@ class DsInstance(service.Service):
 
         ipautil.remove_keytab(paths.DS_KEYTAB)
         ipautil.remove_ccache(run_as=DS_USER)
+        ipautil.remove_file(paths.IPA_LDAP_UPDATE_LEDGER)
 
         if serverid is None:
             # Remove scripts dir
@@ -24,8 +24,12 @@
 from __future__ import absolute_import
 
 import base64
+import hashlib
+import json
 import logging
 import sys
+import tempfile
+import threading
 import uuid
 import time
 import os
@@ -34,6 +38,7 @@ import fnmatch
 
 import ldap
 import six
+from six.moves import queue
 
 from ipaserver.install import installutils
 from ipapython import ipautil, ipaldap
@@ -52,6 +57,7 @@ logger = logging.getLogger(__name__)
 
 UPDATES_DIR=paths.UPDATES_DIR
 UPDATE_SEARCH_TIME_LIMIT = 30  # seconds
+UPDATE_WORKERS = 4
 
 
 def connect(ldapi=False, realm=None, fqdn=None, dm_password=None):
@@ -85,6 +91,75 @@ def connect(ldapi=False, realm=None, fqdn=None, dm_password=None):
     return conn
 
 
+def _get_target_dns(all_updates):
+    """Get DNs of entries modified by the updates of an update file"""
+    return set(update['dn'] for update in all_updates if 'dn' in update)
+
+
+def _get_referenced_dns(all_updates, basedn):
+    """Get DN values under basedn used in the updates of an update file"""
+    suffix = str(basedn).lower().encode('utf-8')
+    dns = set()
+    for update in all_updates:
+        for item in update.get('default', []) + update.get('updates', []):
+            values = item['value']
+            if not isinstance(values, list):
+                values = [values]
+            for value in values:
+                if (not isinstance(value, bytes) or
+                        not value.lower().endswith(suffix)):
+                    continue
+                try:
+                    dns.add(DN(value.decode('utf-8')))
+                except (UnicodeDecodeError, ValueError):
+                    pass
+    return dns
+
+
+def schedule_update_files(update_files, basedn):
+    """
+    Split parsed update files into batches which can be applied
+    concurrently.
+
+    A file joins the batch of the preceding files if it runs no update
+    plugins, modifies only entries under basedn and none of the DNs it
+    modifies or refers to is equal to, a parent of or a child of a DN
+    touched by the other files in the batch. Other files are put into a
+    batch of their own, so the order of dependent files is preserved.
+
+    :param update_files: list of tuples starting with filename and
+                         all_updates, in the order in which they are applied
+    :returns: list of batches, lists of the update_files tuples
+    """
+    batches = []
+    batch = None
+    for update_file in update_files:
+        all_updates = update_file[1]
+        targets = _get_target_dns(all_updates)
+        if (any('plugin' in update for update in all_updates) or
+                not all(dn.endswith(basedn) for dn in targets)):
+            batches.append([update_file])
+            batch = None
+            continue
+
+        dns = targets | _get_referenced_dns(all_updates, basedn)
+        parents = set(dn[i:] for dn in dns for i in range(1, len(dn)))
+        if batch is not None and (
+                dns & batch_dns or dns & batch_parents or
+                parents & batch_dns):
+            batch = None
+        if batch is None:
+            batch = []
+            batch_dns = set()
+            batch_parents = set()
+            batches.append(batch)
+        batch.append(update_file)
+        batch_dns |= dns
+        batch_parents |= parents
+
+    return batches
+
+
 class BadSyntax(installutils.ScriptError):
     def __init__(self, value):
         self.value = value
@@ -150,7 +225,7 @@ class LDAPUpdate:
     )
 
     def __init__(self, dm_password=None, sub_dict={},
-                 online=True, ldapi=False):
+                 online=True, ldapi=False, ledger=None, workers=1):
         '''
         :parameters:
             dm_password
@@ -161,6 +236,13 @@ class LDAPUpdate:
                 Do an online LDAP update or use an experimental LDIF updater
             ldapi
                 Bind using ldapi. This assumes autobind is enabled.
+            ledger
+                Path of the update ledger. Update files recorded in the
+                ledger are skipped when neither the file nor the entries
+                it updates changed since it was applied.
+            workers
+                Number of LDAP connections used to apply independent update
+                files concurrently
 
         Data Structure Example:
         -----------------------
@@ -271,6 +353,11 @@ class LDAPUpdate:
         self.modified = False
         self.online = online
         self.ldapi = ldapi
+        self.ledger = ledger
+        self.workers = workers
+        self.timings = []
+        self._ledger_files = {}
+        self._failed_dns = set()
         self.pw_name = pwd.getpwuid(os.geteuid()).pw_name
         self.realm = None
         self.socket_name = (
@@ -840,11 +927,13 @@ class LDAPUpdate:
                         # this may not be an error (e.g. entries in NIS container)
                         logger.error("Parent DN of %s may not exist, cannot "
                                      "create the entry", entry.dn)
+                        self._failed_dns.add(entry.dn)
                         return entry, False
                 added = True
                 self.modified = True
             except Exception as e:
                 logger.error("Add failure %s", e)
+                self._failed_dns.add(entry.dn)
         else:
             # Update LDAP
             try:
@@ -864,12 +953,14 @@ class LDAPUpdate:
                 updated = False
             except errors.DatabaseError as e:
                 logger.error("Update failed: %s", e)
+                self._failed_dns.add(entry.dn)
                 updated = False
             except errors.DuplicateEntry as e:
                 logger.debug("Update already exists, skip it: %s", e)
                 updated = False
             except errors.ACIError as e:
                 logger.error("Update failed: %s", e)
+                self._failed_dns.add(entry.dn)
                 updated = False
 
             if updated:
@@ -892,6 +983,7 @@ class LDAPUpdate:
             self.modified = True
         except errors.DatabaseError as e:
             logger.error("Delete failed: %s", e)
+            self._failed_dns.add(dn)
 
     def get_all_files(self, root, recursive=False):
         """Get all update files"""
@@ -946,6 +1038,189 @@ class LDAPUpdate:
             task_dn = self.create_index_task(*sorted(index_attributes))
             self.monitor_index_task(task_dn)
 
+    def _get_instance_id(self):
+        """
+        Get the unique ID of the suffix entry, which identifies the directory
+        the ledger was recorded for
+        """
+        try:
+            entry = self.conn.get_entry(self.api.env.basedn, ['nsuniqueid'])
+        except (errors.NotFound, errors.DatabaseError):
+            return None
+        return entry.single_value.get('nsuniqueid')
+
+    def _load_ledger(self):
+        self._ledger_files = {}
+        if self.ledger is None:
+            return
+        try:
+            with open(self.ledger, 'r') as f:
+                ledger = json.load(f)
+        except (IOError, OSError, ValueError):
+            return
+        if ledger.get('instance') != self._get_instance_id():
+            logger.debug("Update ledger %s belongs to another directory, "
+                         "ignoring", self.ledger)
+            return
+        self._ledger_files = ledger.get('files', {})
+
+    def _store_ledger(self, update_files):
+        """
+        Record update files which were applied without errors together with
+        the current versions of the entries they update
+        """
+        if self.ledger is None:
+            return
+        versions = {}
+        for filename, all_updates, digest in update_files:
+            self._ledger_files.pop(filename, None)
+            if any('plugin' in update for update in all_updates):
+                # plugins may change anything, always run them
+                continue
+            dns = _get_target_dns(all_updates)
+            if dns & self._failed_dns:
+                continue
+            for dn in dns:
+                if dn not in versions:
+                    versions[dn] = self._get_entry_version(dn)
+            self._ledger_files[filename] = dict(
+                hash=digest,
+                entries=dict((str(dn), versions[dn]) for dn in dns),
+            )
+
+        try:
+            fd, tmpname = tempfile.mkstemp(
+                dir=os.path.dirname(self.ledger))
+            try:
+                with os.fdopen(fd, 'w') as f:
+                    json.dump(dict(instance=self._get_instance_id(),
+                                   files=self._ledger_files), f)
+                os.rename(tmpname, self.ledger)
+            except BaseException:
+                os.unlink(tmpname)
+                raise
+        except (IOError, OSError) as e:
+            logger.error("Failed to store update ledger %s: %s",
+                         self.ledger, e)
+
+    def _get_entry_version(self, dn):
+        """
+        Get a value which changes whenever the entry is modified, None if
+        the entry does not exist
+        """
+        try:
+            entry = self.conn.get_entry(dn, ['entryusn', 'modifytimestamp'])
+        except (errors.NotFound, errors.DatabaseError):
+            return None
+        for attr in ('entryusn', 'modifytimestamp'):
+            if entry.raw.get(attr):
+                return entry.raw[attr][0].decode('utf-8')
+        return ''
+
+    def _is_applied(self, filename, digest):
+        """
+        Check whether an update file was applied and neither the file nor
+        the entries it updates changed since then
+        """
+        record = self._ledger_files.get(filename)
+        if record is None or record['hash'] != digest:
+            return False
+        for dn, version in record['entries'].items():
+            if self._get_entry_version(DN(dn)) != version:
+                return False
+        return True
+
+    def _update_file(self, filename, all_updates, digest):
+        start = time.time()
+        if self._is_applied(filename, digest):
+            logger.debug("Update file '%s' is already applied, skipping",
+                         filename)
+            self.timings.append((filename, time.time() - start, False))
+            return
+
+        self._run_updates(all_updates)
+        dur = time.time() - start
+        self.timings.append((filename, dur, True))
+        logger.debug(
+            "LDAP update duration: %s %.03f sec", filename, dur,
+            extra={'timing': ('ldapupdate', filename, None, dur)}
+        )
+
+    def _update_worker(self, tasks, leftover, failures):
+        try:
+            self.api.Backend.ldap2.connect(
+                time_limit=UPDATE_SEARCH_TIME_LIMIT,
+                size_limit=0)
+        except Exception as e:
+            # leave the update files to the caller
+            logger.error("Failed to connect LDAP update worker: %s", e)
+            connected = False
+        else:
+            connected = True
+
+        try:
+            while True:
+                task = tasks.get()
+                if task is None:
+                    break
+                if not connected:
+                    leftover.append(task)
+                elif not failures:
+                    try:
+                        self._update_file(*task)
+                    except Exception as e:
+                        logger.debug("Update file '%s' failed",
+                                     task[0], exc_info=True)
+                        failures.append(e)
+        finally:
+            if connected:
+                self.api.Backend.ldap2.disconnect()
+
+    def _update_files(self, batch):
+        """
+        Apply a batch of independent update files, over a pool of worker
+        threads with their own LDAP connections if there are more of them
+        """
+        if self.workers <= 1 or len(batch) == 1:
+            for update_file in batch:
+                self._update_file(*update_file)
+            return
+
+        tasks = queue.Queue()
+        leftover = []
+        failures = []
+        threads = []
+        for update_file in batch:
+            tasks.put(update_file)
+        for _i in range(min(self.workers, len(batch))):
+            tasks.put(None)
+            thread = threading.Thread(
+                target=self._update_worker,
+                args=(tasks, leftover, failures))
+            thread.start()
+            threads.append(thread)
+        for thread in threads:
+            thread.join()
+
+        if failures:
+            raise failures[0]
+        # update files left over by workers which failed to connect
+        for update_file in sorted(leftover, key=batch.index):
+            self._update_file(*update_file)
+
+    def _log_summary(self, dur):
+        applied = [t for t in self.timings if t[2]]
+        logger.info(
+            "LDAP updates: %d file(s) applied, %d skipped as up-to-date, "
+            "%.03f sec",
+            len(applied), len(self.timings) - len(applied), dur)
+        slowest = sorted(applied, key=lambda t: t[1], reverse=True)
+        for filename, file_dur, _applied in slowest[:5]:
+            logger.info("  %.03f sec %s", file_dur, filename)
+        for filename, file_dur, file_applied in self.timings:
+            logger.debug("  %.03f sec %s%s", file_dur, filename,
+                         '' if file_applied else ' (skipped)')
+
     def update(self, files, ordered=True):
         """Execute the update. files is a list of the update files to use.
         :param ordered: Update files are executed in alphabetical order
@@ -953,6 +1228,9 @@ class LDAPUpdate:
         returns True if anything was changed, otherwise False
         """
         self.modified = False
+        self.timings = []
+        self._failed_dns = set()
+        start = time.time()
         try:
             self.create_connection()
 
@@ -960,8 +1238,8 @@ class LDAPUpdate:
             if ordered:
                 upgrade_files = sorted(files)
 
+            update_files = []
             for f in upgrade_files:
-                start = time.time()
                 try:
                     logger.debug("Parsing update file '%s'", f)
                     data = self.read_file(f)
@@ -971,15 +1249,19 @@ class LDAPUpdate:
 
                 all_updates = []
                 self.parse_update_file(f, data, all_updates)
-                self._run_updates(all_updates)
-                dur = time.time() - start
-                logger.debug(
-                    "LDAP update duration: %s %.03f sec", f, dur,
-                    extra={'timing': ('ldapupdate', f, None, dur)}
-                )
+                digest = hashlib.sha256(
+                    repr(all_updates).encode('utf-8')).hexdigest()
+                update_files.append((f, all_updates, digest))
+
+            self._load_ledger()
+            for batch in schedule_update_files(update_files,
+                                               self.api.env.basedn):
+                self._update_files(batch)
+            self._store_ledger(update_files)
         finally:
             self.close_connection()
 
+        self._log_summary(time.time() - start)
         return self.modified
 
     def close_connection(self):
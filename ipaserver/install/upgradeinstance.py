@@ -270,7 +270,10 @@ class IPAUpgrade(service.Service):
 
     def __upgrade(self):
         try:
-            ld = ldapupdate.LDAPUpdate(dm_password='', ldapi=True)
+            ld = ldapupdate.LDAPUpdate(
+                dm_password='', ldapi=True,
+                ledger=paths.IPA_LDAP_UPDATE_LEDGER,
+                workers=ldapupdate.UPDATE_WORKERS)
             if len(self.files) == 0:
                 self.files = ld.get_all_files(ldapupdate.UPDATES_DIR)
             self.modified = (ld.update(self.files) or self.modified)
@@ -22,8 +22,10 @@ Base classes for LDAP plugins.
 
 import re
 import time
+import weakref
 from copy import deepcopy
 import base64
+import json
 
 import six
 
@@ -35,8 +37,10 @@ from ipalib import output
 from ipalib.text import _
 from ipalib.util import json_serialize, validate_hostname
 from ipalib.capabilities import client_has_capability
-from ipalib.messages import add_message, SearchResultTruncated
+from ipalib.messages import (
+    add_message, SearchResultTruncated, SearchResultPage)
 from ipapython.dn import DN, RDN
+from ipapython.ipaldap import TRUNCATED_SIZE_LIMIT
 from ipapython.version import API_VERSION
 
 if six.PY3:
@@ -550,6 +554,9 @@ class LDAPObject(Object):
     rdn_attribute = ''
     uuid_attribute = ''
     attribute_members = {}
+    # number of entries resolved by a single search in
+    # get_indirect_members_bulk()
+    indirect_members_chunk_size = 100
     allow_rename = False
     password_attributes = []
     # Can bind as this entry (has userPassword or krbPrincipalKey)
@@ -649,7 +656,8 @@ class LDAPObject(Object):
         if options.get('raw', False):
             return
 
-        container_dns = {}
+        container_index = self.get_member_container_index()
+        suffix_lengths = sorted(set(len(dn) for dn in container_index))
         new_attrs = {}
 
         for attr in self.attribute_members:
@@ -659,26 +667,77 @@ class LDAPObject(Object):
                 continue
             del entry_attrs[attr]
 
+            # position of the object in attribute_members decides between
+            # objects whose containers match the same member
+            positions = dict(
+                (ldap_obj_name, i)
+                for i, ldap_obj_name in enumerate(self.attribute_members[attr])
+            )
+
             for member in value:
                 memberdn = DN(member.decode('utf-8'))
-                for ldap_obj_name in self.attribute_members[attr]:
-                    ldap_obj = self.api.Object[ldap_obj_name]
-                    try:
-                        container_dn = container_dns[ldap_obj_name]
-                    except KeyError:
-                        container_dn = DN(ldap_obj.container_dn, api.env.basedn)
-                        container_dns[ldap_obj_name] = container_dn
-
-                    if memberdn.endswith(container_dn):
-                        new_value = ldap_obj.get_primary_key_from_dn(memberdn)
-                        new_attr_name = '%s_%s' % (attr, ldap_obj.name)
-                        try:
-                            new_attr = new_attrs[new_attr_name]
-                        except KeyError:
-                            new_attr = entry_attrs.setdefault(new_attr_name, [])
-                            new_attrs[new_attr_name] = new_attr
-                        new_attr.append(new_value)
-                        break
+                ldap_obj_name = self._get_member_object_name(
+                    memberdn, positions, container_index, suffix_lengths)
+                if ldap_obj_name is None:
+                    continue
+
+                ldap_obj = self.api.Object[ldap_obj_name]
+                new_value = ldap_obj.get_primary_key_from_dn(memberdn)
+                new_attr_name = '%s_%s' % (attr, ldap_obj.name)
+                try:
+                    new_attr = new_attrs[new_attr_name]
+                except KeyError:
+                    new_attr = entry_attrs.setdefault(new_attr_name, [])
+                    new_attrs[new_attr_name] = new_attr
+                new_attr.append(new_value)
+
+    def get_member_container_index(self):
+        """
+        Return index of containers of the objects in attribute_members.
+
+        The index maps container DN to a tuple of names of LDAPObjects which
+        have their entries in the container. It is built on first use and
+        loads only the member objects.
+        """
+        indexes = _member_container_indexes.setdefault(self.api, {})
+        try:
+            return indexes[self.name]
+        except KeyError:
+            pass
+
+        names = set()
+        for ldap_obj_names in self.attribute_members.values():
+            names.update(ldap_obj_names)
+        index = {}
+        for ldap_obj_name in sorted(names):
+            ldap_obj = self.api.Object[ldap_obj_name]
+            container_dn = DN(ldap_obj.container_dn, self.api.env.basedn)
+            index[container_dn] = (
+                index.get(container_dn, ()) + (ldap_obj_name,))
+
+        indexes[self.name] = index
+        return index
+
+    def _get_member_object_name(self, memberdn, positions, container_index,
+                                suffix_lengths):
+        """
+        Return name of the object from positions whose container is a
+        suffix of memberdn, or None
+
+        Only suffixes as long as some container in the index are looked up.
+        """
+        found = None
+        found_pos = None
+        for length in suffix_lengths:
+            if length > len(memberdn):
+                break
+            suffix = memberdn[-length:]
+            for ldap_obj_name in container_index.get(suffix, ()):
+                pos = positions.get(ldap_obj_name)
+                if pos is not None and (found_pos is None or pos < found_pos):
+                    found = ldap_obj_name
+                    found_pos = pos
+        return found
 
     def get_indirect_members(self, entry_attrs, attrs_list):
         if 'memberindirect' in attrs_list:
@@ -686,6 +745,102 @@ class LDAPObject(Object):
         if 'memberofindirect' in attrs_list:
             self.get_memberofindirect(entry_attrs)
 
+    def get_indirect_members_bulk(self, entries, attrs_list):
+        """
+        Get indirect members for a list of entries at once
+
+        Equivalent to calling get_indirect_members() on every entry, but
+        issues one search per chunk of ``indirect_members_chunk_size``
+        entries instead of one search per entry.
+        """
+        if not entries:
+            return
+        size = self.indirect_members_chunk_size
+        for i in range(0, len(entries), size):
+            chunk = entries[i:i + size]
+            if 'memberindirect' in attrs_list:
+                self._get_memberindirect_chunk(chunk)
+            if 'memberofindirect' in attrs_list:
+                self._get_memberofindirect_chunk(chunk)
+
+    def _get_memberindirect_chunk(self, group_entries):
+        groups = {entry.dn: entry for entry in group_entries}
+        filters = [
+            self.backend.make_filter_from_attr('memberof', dn)
+            for dn in groups
+        ]
+        filter = self.backend.combine_filters(
+            filters, rules=self.backend.MATCH_ANY)
+        try:
+            # every direct or indirect member of a group of the chunk has
+            # the group in memberOf; only the values referring to groups of
+            # the chunk are returned, not the member lists of nested groups
+            result = self.backend.get_entries(
+                self.api.env.basedn,
+                filter=filter,
+                attrs_list=['memberof'],
+                size_limit=-1,  # paged search will get everything anyway
+                paged_search=True,
+                matched_values='(%s)' % ''.join(filters))
+        except errors.NotFound:
+            result = []
+
+        # members of each group of the chunk, by DN
+        members = {dn: {} for dn in groups}
+        for entry in result:
+            member_dn = str(entry.dn).encode('utf-8')
+            for value in entry.raw.get('memberof', []):
+                group_dn = DN(value.decode('utf-8'))
+                if group_dn in members:
+                    members[group_dn][entry.dn] = member_dn
+
+        for dn, group_entry in groups.items():
+            indirect = members[dn]
+            for value in group_entry.raw.get('member', []):
+                indirect.pop(DN(value.decode('utf-8')), None)
+            if indirect:
+                group_entry.raw['memberindirect'] = list(indirect.values())
+
+    def _get_memberofindirect_chunk(self, entries):
+        member_attrs = ('member', 'memberuser', 'memberhost')
+        dns = [entry.dn for entry in entries]
+        filters = [
+            self.backend.make_filter_from_attr(attr, dn)
+            for attr in member_attrs for dn in dns
+        ]
+        filter = self.backend.combine_filters(
+            filters, rules=self.backend.MATCH_ANY)
+        try:
+            # only the values referring to entries of the chunk are
+            # returned, not whole membership lists of large groups
+            result = self.backend.get_entries(
+                self.api.env.basedn,
+                filter=filter,
+                attrs_list=list(member_attrs),
+                size_limit=-1,  # paged search will get everything anyway
+                paged_search=True,
+                matched_values='(%s)' % ''.join(filters))
+        except errors.NotFound:
+            result = []
+
+        # group DNs in which each entry of the chunk is a direct member
+        direct = {dn: set() for dn in dns}
+        for group_entry in result:
+            group_dn = str(group_entry.dn).encode('utf-8')
+            for attr in member_attrs:
+                for value in group_entry.raw.get(attr, []):
+                    member_dn = DN(value.decode('utf-8'))
+                    if member_dn in direct:
+                        direct[member_dn].add(group_dn)
+
+        for entry in entries:
+            groups = direct[entry.dn]
+            indirect = set(entry.raw.get('memberof', []))
+            entry.raw['memberof'] = list(indirect & groups)
+            indirect.difference_update(groups)
+            if indirect:
+                entry.raw['memberofindirect'] = list(indirect)
+
     def get_memberindirect(self, group_entry):
         """
         Get indirect members
@@ -823,6 +978,10 @@ class LDAPObject(Object):
         return json_dict
 
 
+# indexes of containers of member objects, per API instance and LDAPObject
+_member_container_indexes = weakref.WeakKeyDictionary()
+
+
 # addattr can cause parameters to have more than one value even if not defined
 # as multivalue, make sure this isn't the case
 def _check_single_value_attrs(params, entry_attrs):
@@ -1701,20 +1860,22 @@ class LDAPAddMember(LDAPModMember):
         completed = 0
         for (attr, objs) in member_dns.items():
             for ldap_obj_name in objs:
-                for m_dn in member_dns[attr][ldap_obj_name]:
-                    assert isinstance(m_dn, DN)
-                    if not m_dn:
-                        continue
-                    try:
-                        ldap.add_entry_to_group(m_dn, dn, attr, allow_same=self.allow_same)
-                    except errors.PublicError as e:
-                        ldap_obj = self.api.Object[ldap_obj_name]
-                        failed[attr][ldap_obj_name].append((
-                            ldap_obj.get_primary_key_from_dn(m_dn),
-                            unicode(e),)
-                        )
-                    else:
-                        completed += 1
+                m_dns = [m_dn for m_dn in member_dns[attr][ldap_obj_name]
+                         if m_dn]
+                if not m_dns:
+                    continue
+                try:
+                    added, rejected = ldap.add_entries_to_group(
+                        m_dns, dn, attr, allow_same=self.allow_same)
+                except errors.NotFound:
+                    raise self.obj.handle_not_found(*keys)
+                ldap_obj = self.api.Object[ldap_obj_name]
+                for m_dn, e in rejected:
+                    failed[attr][ldap_obj_name].append((
+                        ldap_obj.get_primary_key_from_dn(m_dn),
+                        unicode(e),)
+                    )
+                completed += len(added)
 
         if options.get('all', False):
             attrs_list = ['*'] + self.obj.default_attributes
@@ -1799,20 +1960,21 @@ class LDAPRemoveMember(LDAPModMember):
         completed = 0
         for (attr, objs) in member_dns.items():
             for ldap_obj_name, m_dns in objs.items():
-                for m_dn in m_dns:
-                    assert isinstance(m_dn, DN)
-                    if not m_dn:
-                        continue
-                    try:
-                        ldap.remove_entry_from_group(m_dn, dn, attr)
-                    except errors.PublicError as e:
-                        ldap_obj = self.api.Object[ldap_obj_name]
-                        failed[attr][ldap_obj_name].append((
-                            ldap_obj.get_primary_key_from_dn(m_dn),
-                            unicode(e),)
-                        )
-                    else:
-                        completed += 1
+                m_dns = [m_dn for m_dn in m_dns if m_dn]
+                if not m_dns:
+                    continue
+                try:
+                    removed, rejected = ldap.remove_entries_from_group(
+                        m_dns, dn, attr)
+                except errors.NotFound:
+                    raise self.obj.handle_not_found(*keys)
+                ldap_obj = self.api.Object[ldap_obj_name]
+                for m_dn, e in rejected:
+                    failed[attr][ldap_obj_name].append((
+                        ldap_obj.get_primary_key_from_dn(m_dn),
+                        unicode(e),)
+                    )
+                completed += len(removed)
 
         if options.get('all', False):
             attrs_list = ['*'] + self.obj.default_attributes
@@ -1898,6 +2060,20 @@ class LDAPSearch(BaseLDAPCommand, crud.Search):
             minvalue=0,
             autofill=False,
         ),
+        Int('pagesize?',
+            label=_('Page Size'),
+            doc=_('Return the result in pages of at most this many entries'),
+            flags=['no_display'],
+            minvalue=1,
+            autofill=False,
+        ),
+        Str('cursor?',
+            label=_('Cursor'),
+            doc=_('Continue a paged search after the page this token was '
+                  'returned with'),
+            flags=['no_display'],
+            autofill=False,
+        ),
     )
 
     def get_args(self):
@@ -2015,11 +2191,55 @@ class LDAPSearch(BaseLDAPCommand, crud.Search):
                         )
         return filter
 
+    def encode_cursor(self, pkey):
+        """
+        Return an opaque continuation token for a paged search which ended
+        with the entry identified by pkey.
+        """
+        cursor = json.dumps({'after': unicode(pkey)}).encode('utf-8')
+        return base64.urlsafe_b64encode(cursor).decode('ascii')
+
+    def decode_cursor(self, cursor):
+        try:
+            return json.loads(
+                base64.urlsafe_b64decode(cursor.encode('ascii')))['after']
+        except (ValueError, TypeError, KeyError, UnicodeError):
+            raise errors.ValidationError(
+                name='cursor', error=_('invalid continuation token'))
+
+    def check_paged_search(self, ldap, **options):
+        """
+        Raise ValidationError if the result cannot be returned in pages
+
+        Pages are continued after the last primary key returned, which
+        requires an ordering matching rule of the primary key attribute.
+        """
+        if (not self.obj.primary_key or
+                ldap.get_attribute_ordering(
+                    self.obj.primary_key.name) is None):
+            raise errors.ValidationError(
+                name='pagesize' if options.get('pagesize') else 'cursor',
+                error=_('paged search is not supported for %s') %
+                self.obj.object_name_plural)
+
+    def get_page_filter(self, ldap, **options):
+        """
+        Returns a filter matching entries after the cursor of a paged search
+        """
+        if not options.get('cursor'):
+            return ''
+        return ldap.make_ordering_filter(
+            self.obj.primary_key.name, self.decode_cursor(options['cursor']))
+
     has_output_params = global_output_params
 
     def execute(self, *args, **options):
         ldap = self.obj.backend
 
+        paged = bool(options.get('pagesize') or options.get('cursor'))
+        if paged:
+            self.check_paged_search(ldap, **options)
+
         index = tuple(self.args).index('criteria')
         keys = args[:index]
         try:
@@ -2054,8 +2274,14 @@ class LDAPSearch(BaseLDAPCommand, crud.Search):
         term_filter = self.get_term_filter(ldap, term)
         member_filter = self.get_member_filter(ldap, **options)
 
+        if paged:
+            page_filter = self.get_page_filter(ldap, **options)
+        else:
+            page_filter = ''
+
         filter = ldap.combine_filters(
-            (term_filter, attr_filter, member_filter), rules=ldap.MATCH_ALL
+            (term_filter, attr_filter, member_filter, page_filter),
+            rules=ldap.MATCH_ALL
         )
 
         scope = ldap.SCOPE_ONELEVEL
@@ -2064,11 +2290,23 @@ class LDAPSearch(BaseLDAPCommand, crud.Search):
                 self, ldap, filter, attrs_list, base_dn, scope, *args, **options)
             assert isinstance(base_dn, DN)
 
+        size_limit = options.get('sizelimit', None)
+        sort_keys = None
+        if paged:
+            # the server returns the first page of the result sorted by the
+            # primary key; an exceeded size limit means more pages follow
+            size_limit = options.get('pagesize') or ldap.size_limit
+            sort_keys = [self.obj.primary_key.name]
+            if self.obj.primary_key.name not in attrs_list and \
+                    '*' not in attrs_list:
+                attrs_list.append(self.obj.primary_key.name)
+
         try:
             (entries, truncated) = self._exc_wrapper(args, options, ldap.find_entries)(
                 filter, attrs_list, base_dn, scope,
                 time_limit=options.get('timelimit', None),
-                size_limit=options.get('sizelimit', None)
+                size_limit=size_limit,
+                sort_keys=sort_keys,
             )
         except errors.EmptyResult:
             (entries, truncated) = ([], False)
@@ -2076,6 +2314,12 @@ class LDAPSearch(BaseLDAPCommand, crud.Search):
             return self.api.Object[self.obj.parent_object].handle_not_found(
                 *keys)
 
+        cursor = None
+        if paged and entries and truncated is TRUNCATED_SIZE_LIMIT:
+            cursor = self.encode_cursor(
+                entries[-1].single_value[self.obj.primary_key.name])
+            truncated = False
+
         for callback in self.get_callbacks('post'):
             truncated = callback(
                 self, ldap, entries, truncated, *args, **options
@@ -2089,8 +2333,8 @@ class LDAPSearch(BaseLDAPCommand, crud.Search):
                 entries.sort(key=sort_key)
 
         if not options.get('raw', False):
+            self.obj.get_indirect_members_bulk(entries, attrs_list)
             for entry in entries:
-                self.obj.get_indirect_members(entry, attrs_list)
                 self.obj.convert_attribute_members(entry, *args, **options)
 
         for (i, e) in enumerate(entries):
@@ -2109,6 +2353,10 @@ class LDAPSearch(BaseLDAPCommand, crud.Search):
             add_message(options['version'], result, SearchResultTruncated(
                 reason=exc))
 
+        if cursor is not None:
+            add_message(options['version'], result, SearchResultPage(
+                cursor=cursor))
+
         return result
 
     def pre_callback(self, ldap, filters, attrs_list, base_dn, scope, *args, **options):
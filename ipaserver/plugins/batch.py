@@ -19,16 +19,19 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 import logging
+import os
+import threading
 
 import six
+from six.moves import queue
 
 from ipalib import api, errors
 from ipalib import Command
 from ipalib.frontend import Local
-from ipalib.parameters import Str, Dict
+from ipalib.parameters import Str, Dict, Flag
 from ipalib.output import Output
 from ipalib.text import _
-from ipalib.request import context
+from ipalib.request import context, destroy_context
 from ipalib.plugable import Registry
 from ipapython.version import API_VERSION
 
@@ -47,6 +50,13 @@ where the contents of the file batch_request.json follow the below example
         {"method":"user_show","params":[["admin"],{"all":true}]}
         ],{}],"id":1}
 
+With the "parallel" option set to true, consecutive read-only commands
+(*_show and *_find of the objects listed in batch.parallel_commands) are
+executed concurrently, each worker using its own LDAP
+connection with the identity of the caller. Other commands are executed one at
+a time, after all previous commands have finished. Results are returned in the
+order of the request in either mode.
+
 The format of the response is nested the same way.  At the top you will see
   "error": null,
     "id": 1,
@@ -71,6 +81,24 @@ class batch(Command):
     __doc__ = _('Make multiple ipa calls via one remote procedure call')
     NO_CLI = True
 
+    # maximum number of concurrent workers of a parallel batch
+    parallel_max_workers = 4
+    # context attributes inherited by the workers of a parallel batch
+    parallel_context_attributes = (
+        'principal', 'ccache_name', 'client_ip', 'languages',
+    )
+    # commands which only read LDAP entries and can be executed concurrently
+    # in a parallel batch; commands with other side effects, such as
+    # cert_find which updates the certificate index, must not be listed
+    parallel_commands = frozenset(
+        '%s_%s' % (obj, method)
+        for obj in ('user', 'group', 'host', 'hostgroup', 'service',
+                    'netgroup', 'hbacrule', 'hbacsvc', 'hbacsvcgroup',
+                    'sudorule', 'sudocmd', 'sudocmdgroup', 'role',
+                    'privilege', 'selinuxusermap')
+        for method in ('show', 'find')
+    )
+
     takes_args = (
         Dict('methods*',
             doc=_('Nested Methods to execute'),
@@ -88,6 +116,12 @@ class batch(Command):
         ),
     )
 
+    takes_options = (
+        Flag('parallel?',
+            doc=_('Execute read-only commands concurrently'),
+        ),
+    )
+
     has_output = (
         Output('count', int, doc=''),
         Output('results', (list, tuple), doc='')
@@ -157,53 +191,153 @@ class batch(Command):
             logger.debug('batch: %s',
                          ', '.join(super(batch, self)._repr_iter(**params)))
 
-    def execute(self, methods=None, **options):
-        results = []
-        for arg in (methods or []):
-            params = dict()
-            name = None
-            try:
-                self._validate_request(arg)
-                name = arg['method']
-                a, kw = arg['params']
-                newkw = dict((str(k), v) for k, v in kw.items())
-                params = api.Command[name].args_options_2_params(
-                    *a, **newkw)
-                newkw.setdefault('version', options['version'])
-
-                result = api.Command[name](*a, **newkw)
+    def _execute_request(self, arg, version):
+        params = dict()
+        name = None
+        try:
+            self._validate_request(arg)
+            name = arg['method']
+            a, kw = arg['params']
+            newkw = dict((str(k), v) for k, v in kw.items())
+            params = api.Command[name].args_options_2_params(
+                *a, **newkw)
+            newkw.setdefault('version', version)
+
+            result = api.Command[name](*a, **newkw)
+            logger.info(
+                '%s: batch: %s(%s): SUCCESS',
+                getattr(context, 'principal', 'UNKNOWN'),
+                name,
+                ', '.join(api.Command[name]._repr_iter(**params))
+            )
+            result['error']=None
+        except Exception as e:
+            if (isinstance(e, errors.RequirementError) or
+                    isinstance(e, errors.CommandError) or
+                    isinstance(e, errors.ConversionError)):
                 logger.info(
-                    '%s: batch: %s(%s): SUCCESS',
-                    getattr(context, 'principal', 'UNKNOWN'),
-                    name,
-                    ', '.join(api.Command[name]._repr_iter(**params))
+                    '%s: batch: %s',
+                    context.principal,  # pylint: disable=no-member
+                    e.__class__.__name__
                 )
-                result['error']=None
-            except Exception as e:
-                if (isinstance(e, errors.RequirementError) or
-                        isinstance(e, errors.CommandError) or
-                        isinstance(e, errors.ConversionError)):
-                    logger.info(
-                        '%s: batch: %s',
-                        context.principal,  # pylint: disable=no-member
-                        e.__class__.__name__
-                    )
-                else:
-                    logger.info(
-                        '%s: batch: %s(%s): %s',
-                        context.principal, name,  # pylint: disable=no-member
-                        ', '.join(api.Command[name]._repr_iter(**params)),
-                        e.__class__.__name__
-                    )
-                if isinstance(e, errors.PublicError):
-                    reported_error = e
-                else:
-                    reported_error = errors.InternalError()
-                result = dict(
-                    error=reported_error.strerror,
-                    error_code=reported_error.errno,
-                    error_name=unicode(type(reported_error).__name__),
-                    error_kw=reported_error.kw,
+            else:
+                logger.info(
+                    '%s: batch: %s(%s): %s',
+                    context.principal, name,  # pylint: disable=no-member
+                    ', '.join(api.Command[name]._repr_iter(**params)),
+                    e.__class__.__name__
                 )
-            results.append(result)
+            if isinstance(e, errors.PublicError):
+                reported_error = e
+            else:
+                reported_error = errors.InternalError()
+            result = dict(
+                error=reported_error.strerror,
+                error_code=reported_error.errno,
+                error_name=unicode(type(reported_error).__name__),
+                error_kw=reported_error.kw,
+            )
+        return result
+
+    def _is_read_only(self, arg):
+        """
+        Check whether a request in a batch can be executed concurrently
+        with other requests.
+        """
+        try:
+            return arg['method'] in self.parallel_commands
+        except (KeyError, TypeError):
+            return False
+
+    def _parallel_worker(self, tasks, results, version, caller_context,
+                         failed):
+        for name, value in caller_context.items():
+            setattr(context, name, value)
+        try:
+            self.api.Backend.ldap2.connect(
+                ccache=caller_context.get('ccache_name'),
+                size_limit=None,
+                time_limit=None)
+        except Exception as e:
+            # leave the results empty, they are executed by the caller
+            logger.error('batch: failed to connect worker: %s', e)
+            failed.set()
+            connected = False
+        else:
+            connected = True
+
+        try:
+            while True:
+                task = tasks.get()
+                try:
+                    if task is None:
+                        break
+                    if connected:
+                        i, arg = task
+                        results[i] = self._execute_request(arg, version)
+                finally:
+                    tasks.task_done()
+        finally:
+            destroy_context()
+
+    def _execute_parallel(self, methods, version):
+        """
+        Execute consecutive read-only requests concurrently over a pool of
+        worker threads; other requests are executed by the caller once all
+        the previous requests are finished.
+
+        When a worker fails to connect, the requests it skipped are executed
+        by the caller before the next request which is not read-only, and the
+        remaining requests are executed serially.
+        """
+        results = [None] * len(methods)
+        tasks = queue.Queue()
+        failed = threading.Event()
+        caller_context = {
+            name: getattr(context, name)
+            for name in self.parallel_context_attributes
+            if hasattr(context, name)
+        }
+        caller_context.setdefault(
+            'ccache_name', os.environ.get('KRB5CCNAME'))
+        workers = []
+
+        def wait(end):
+            tasks.join()
+            # requests left over by workers which failed to connect
+            for j in range(end):
+                if results[j] is None:
+                    results[j] = self._execute_request(methods[j], version)
+
+        try:
+            for i, arg in enumerate(methods):
+                if self._is_read_only(arg) and not failed.is_set():
+                    if len(workers) < self.parallel_max_workers:
+                        worker = threading.Thread(
+                            target=self._parallel_worker,
+                            args=(tasks, results, version, caller_context,
+                                  failed))
+                        worker.start()
+                        workers.append(worker)
+                    tasks.put((i, arg))
+                else:
+                    wait(i)
+                    results[i] = self._execute_request(arg, version)
+            wait(len(methods))
+        finally:
+            for worker in workers:
+                tasks.put(None)
+            for worker in workers:
+                worker.join()
+
+        return results
+
+    def execute(self, methods=None, **options):
+        if options.get('parallel') and methods:
+            results = self._execute_parallel(methods, options['version'])
+        else:
+            results = [
+                self._execute_request(arg, options['version'])
+                for arg in (methods or [])
+            ]
         return dict(count=len(results) , results=results)
@@ -24,6 +24,7 @@ import collections
 import datetime
 import itertools
 import logging
+import threading
 from operator import attrgetter
 
 import cryptography.x509
@@ -52,6 +53,7 @@ from ipalib.request import context
 from ipalib import output
 from ipapython import dnsutil, kerberos
 from ipapython.dn import DN
+from ipaserver.cert_index import get_cert_index
 from ipaserver.plugins.service import normalize_principal, validate_realm
 from ipaserver.masters import (
     ENABLED_SERVICE, CONFIGURED_SERVICE, is_service_enabled
@@ -335,6 +337,61 @@ def bind_principal_can_manage_cert(cert):
         return hostname == cns[-1].value
 
 
+class ParsedCertCache:
+    """
+    Per-process cache of data extracted from certificates.
+
+    Entries are keyed by the base64 encoded certificate, so a cached entry
+    is never used for a different certificate with the same serial number.
+    The least recently used entries are evicted when the cache is full.
+    Cached data are shared and must not be modified.
+    """
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._data = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, parse):
+        """
+        Return cached data for key, call parse() to get them on a miss
+        """
+        with self._lock:
+            data = self._data.get(key)
+            if data is not None:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return data
+            self.misses += 1
+
+        data = parse()
+        with self._lock:
+            self._data[key] = data
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+        return data
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            return dict(
+                hits=self.hits,
+                misses=self.misses,
+                size=len(self._data),
+            )
+
+
+# maximum number of certificates whose parsed data are cached
+PARSED_CERT_CACHE_SIZE = 4096
+
+parsed_cert_cache = ParsedCertCache(PARSED_CERT_CACHE_SIZE)
+
+
 class BaseCertObject(Object):
     takes_params = (
         Str(
@@ -477,37 +534,51 @@ class BaseCertObject(Object):
 
         """
         if 'certificate' in obj:
-            cert = x509.load_der_x509_certificate(
-                base64.b64decode(obj['certificate']))
-            obj['subject'] = DN(cert.subject)
-            obj['issuer'] = DN(cert.issuer)
-            obj['serial_number'] = cert.serial_number
-            obj['valid_not_before'] = x509.format_datetime(
-                    cert.not_valid_before)
-            obj['valid_not_after'] = x509.format_datetime(
-                    cert.not_valid_after)
-            if full:
-                obj['sha1_fingerprint'] = x509.to_hex_with_colons(
-                    cert.fingerprint(hashes.SHA1()))
-                obj['sha256_fingerprint'] = x509.to_hex_with_colons(
-                    cert.fingerprint(hashes.SHA256()))
-
-            general_names = x509.process_othernames(
-                    cert.san_general_names)
-
-            for gn in general_names:
-                try:
-                    self._add_san_attribute(obj, full, gn)
-                except Exception:
-                    # Invalid GeneralName (i.e. not a valid X.509 cert);
-                    # don't fail but log something about it
-                    logger.warning(
-                        "Encountered bad GeneralName; skipping", exc_info=True)
+            certificate = obj['certificate']
+            data = parsed_cert_cache.get(
+                (self.name, full, certificate),
+                lambda: self._parse_certificate(certificate, full))
+            for name, value in data.items():
+                if isinstance(value, list):
+                    obj.setdefault(name, []).extend(value)
+                else:
+                    obj[name] = value
 
         serial_number = obj.get('serial_number')
         if serial_number is not None:
             obj['serial_number_hex'] = u'0x%X' % serial_number
 
+    def _parse_certificate(self, certificate, full):
+        """Extract data of a base64 encoded certificate for ``_parse``."""
+        cert = x509.load_der_x509_certificate(base64.b64decode(certificate))
+        data = {}
+        data['subject'] = DN(cert.subject)
+        data['issuer'] = DN(cert.issuer)
+        data['serial_number'] = cert.serial_number
+        data['valid_not_before'] = x509.format_datetime(
+                cert.not_valid_before)
+        data['valid_not_after'] = x509.format_datetime(
+                cert.not_valid_after)
+        if full:
+            data['sha1_fingerprint'] = x509.to_hex_with_colons(
+                cert.fingerprint(hashes.SHA1()))
+            data['sha256_fingerprint'] = x509.to_hex_with_colons(
+                cert.fingerprint(hashes.SHA256()))
+
+        general_names = x509.process_othernames(
+                cert.san_general_names)
+
+        for gn in general_names:
+            try:
+                self._add_san_attribute(data, full, gn)
+            except Exception:
+                # Invalid GeneralName (i.e. not a valid X.509 cert);
+                # don't fail but log something about it
+                logger.warning(
+                    "Encountered bad GeneralName; skipping", exc_info=True)
+
+        return data
+
     def _add_san_attribute(self, obj, full, gn):
         name_type_map = {
             cryptography.x509.RFC822Name:
@@ -1618,7 +1689,7 @@ class cert_find(Search, CertMethod):
 
         return result, False, True
 
-    def _ca_search(self, raw, pkey_only, exactly, **options):
+    def _ca_search(self, raw, pkey_only, exactly, sizelimit=0, **options):
         ra_options = {}
         for name in ('revocation_reason',
                      'issuer',
@@ -1678,7 +1749,19 @@ class cert_find(Search, CertMethod):
         ca_objs = {DN(ca['ipacasubjectdn'][0]): ca for ca in ca_objs}
 
         ra = self.api.Backend.ra
-        for ra_obj in ra.find(ra_options):
+        ra_objs = None
+        cert_index = get_cert_index(self.api)
+        if cert_index is not None and cert_index.can_search(ra_options):
+            ra_objs = cert_index.search(
+                ra, ra_options, sizelimit + 1 if sizelimit > 0 else 0)
+        if ra_objs is None:
+            ra_objs = ra.iter_find(ra_options)
+        for ra_obj in ra_objs:
+            if 0 < sizelimit < len(result):
+                # enough results to tell the search is truncated, stop
+                # retrieving further pages
+                break
+
             issuer = DN(ra_obj['issuer'])
             serial_number = ra_obj['serial_number']
 
@@ -1708,6 +1791,85 @@ class cert_find(Search, CertMethod):
 
         return result, False, complete
 
+    def _get_entry_certs(self, entry):
+        return [
+            (self._get_cert_key(cert), cert)
+            for attr in ('usercertificate', 'usercertificate;binary')
+            for cert in entry.get(attr, [])
+        ]
+
+    def _find_owners(self, ldap, filter):
+        """
+        Find entries matching filter with their certificates
+
+        :return: tuple of a list of (DN, list of (certificate key,
+                 certificate)) of the entries and the truncated flag
+        """
+        entries, truncated = ldap.find_entries(
+            base_dn=self.api.env.basedn,
+            filter=filter,
+            attrs_list=['usercertificate'],
+            time_limit=0,
+            size_limit=0,
+        )
+        return [(entry.dn, self._get_entry_certs(entry))
+                for entry in entries], truncated
+
+    def _find_indexed_owners(self, ldap, filter, cert_index):
+        """
+        Find entries matching filter with the keys of their certificates
+
+        The certificates are retrieved only for entries modified since they
+        were indexed, the keys of the others are taken from the index.
+
+        :return: tuple of a list of (DN, list of (certificate key, None)) of
+                 the entries and the truncated flag
+        """
+        entries, truncated = ldap.find_entries(
+            base_dn=self.api.env.basedn,
+            filter=filter,
+            attrs_list=['entryusn'],
+            time_limit=0,
+            size_limit=0,
+        )
+        usns = {entry.dn: entry.single_value.get('entryusn')
+                for entry in entries}
+        owned, stale = cert_index.get_owned_certificates(usns)
+
+        if stale:
+            stale_usns = [usns[dn] for dn in stale]
+            if None not in stale_usns:
+                # entryUSN grows with every modification, this retrieves
+                # the stale entries and few others
+                filter = ldap.combine_filters(
+                    [filter, '(entryusn>=%d)' % min(
+                        int(usn) for usn in stale_usns)],
+                    ldap.MATCH_ALL)
+            try:
+                changed, _truncated = ldap.find_entries(
+                    base_dn=self.api.env.basedn,
+                    filter=filter,
+                    attrs_list=['usercertificate', 'entryusn'],
+                    time_limit=0,
+                    size_limit=0,
+                )
+            except errors.EmptyResult:
+                changed = []
+
+            updates = {}
+            for entry in changed:
+                cert_keys = [cert_key for cert_key, _cert
+                             in self._get_entry_certs(entry)]
+                owned[entry.dn] = cert_keys
+                usn = entry.single_value.get('entryusn')
+                if usn is not None:
+                    updates[entry.dn] = (usn, cert_keys)
+            cert_index.update_owners(updates)
+
+        return [(entry.dn, [(cert_key, None)
+                            for cert_key in owned.get(entry.dn, [])])
+                for entry in entries], truncated
+
     def _ldap_search(self, all, pkey_only, no_members, **options):
         ldap = self.api.Backend.ldap2
 
@@ -1745,16 +1907,19 @@ class cert_find(Search, CertMethod):
         filters.append(filter)
 
         filter = ldap.combine_filters(filters, ldap.MATCH_ALL)
+        ca_enabled = getattr(context, 'ca_enabled')
+        cert_index = get_cert_index(self.api)
         try:
-            entries, truncated = ldap.find_entries(
-                base_dn=self.api.env.basedn,
-                filter=filter,
-                attrs_list=['usercertificate'],
-                time_limit=0,
-                size_limit=0,
-            )
+            if (cert_index is not None and cert is None and
+                    (pkey_only or (ca_enabled and not all))):
+                # only the serial numbers and issuers of the certificates
+                # are needed, get them from the index
+                owned, truncated = self._find_indexed_owners(
+                    ldap, filter, cert_index)
+            else:
+                owned, truncated = self._find_owners(ldap, filter)
         except errors.EmptyResult:
-            entries = []
+            owned = []
             truncated = False
         else:
             try:
@@ -1764,32 +1929,29 @@ class cert_find(Search, CertMethod):
 
             truncated = bool(truncated)
 
-        ca_enabled = getattr(context, 'ca_enabled')
-        for entry in entries:
-            for attr in ('usercertificate', 'usercertificate;binary'):
-                for cert in entry.get(attr, []):
-                    cert_key = self._get_cert_key(cert)
-                    try:
-                        obj = result[cert_key]
-                    except KeyError:
-                        obj = {'serial_number': cert.serial_number}
-                        if not pkey_only and (all or not ca_enabled):
-                            # Retrieving certificate details is now deferred
-                            # until after all certificates are collected.
-                            # For the case of CA-less we need to keep
-                            # the certificate because getting it again later
-                            # would require unnecessary LDAP searches.
-                            obj['certificate'] = (
-                                base64.b64encode(
-                                    cert.public_bytes(x509.Encoding.DER))
-                                .decode('ascii'))
-
-                        result[cert_key] = obj
-
-                    if not pkey_only and (all or not no_members):
-                        owners = obj.setdefault('owner', [])
-                        if entry.dn not in owners:
-                            owners.append(entry.dn)
+        for dn, certs in owned:
+            for cert_key, cert in certs:
+                try:
+                    obj = result[cert_key]
+                except KeyError:
+                    obj = {'serial_number': cert_key[1]}
+                    if not pkey_only and (all or not ca_enabled):
+                        # Retrieving certificate details is now deferred
+                        # until after all certificates are collected.
+                        # For the case of CA-less we need to keep
+                        # the certificate because getting it again later
+                        # would require unnecessary LDAP searches.
+                        obj['certificate'] = (
+                            base64.b64encode(
+                                cert.public_bytes(x509.Encoding.DER))
+                            .decode('ascii'))
+
+                    result[cert_key] = obj
+
+                if not pkey_only and (all or not no_members):
+                    owners = obj.setdefault('owner', [])
+                    if dn not in owners:
+                        owners.append(dn)
 
         return result, truncated, complete
 
@@ -1820,6 +1982,18 @@ class cert_find(Search, CertMethod):
         if sizelimit is None:
             sizelimit = self.api.Backend.ldap2.size_limit
 
+        # Results of the CA search come before results found only in LDAP,
+        # so the CA search can stop after sizelimit results, unless the LDAP
+        # search filters them by owner or a certificate is given. Searches
+        # following a complete one only add data to its results and must
+        # not stop early either.
+        search_sizelimit = sizelimit
+        if 'certificate' in options:
+            search_sizelimit = 0
+        for owner, _search_key in self.obj._owners():
+            if owner.name in options or 'no_' + owner.name in options:
+                search_sizelimit = 0
+
         result = collections.OrderedDict()
         truncated = False
         complete = False
@@ -1832,6 +2006,7 @@ class cert_find(Search, CertMethod):
                 raw=raw,
                 pkey_only=pkey_only,
                 no_members=no_members,
+                sizelimit=0 if complete else search_sizelimit,
                 **options)
 
             if sub_complete:
@@ -1854,8 +2029,18 @@ class cert_find(Search, CertMethod):
 
         if not pkey_only:
             ca_objs = {}
-            if ca_enabled:
-                ra = self.api.Backend.ra
+            certs = {}
+            if ca_enabled and all:
+                # retrieve the certificates concurrently, serial numbers
+                # are unique among certificates of all lightweight CAs
+                serial_numbers = [
+                    str(serial_number)
+                    for (_issuer, serial_number), obj in six.iteritems(result)
+                    if 'cacn' in obj
+                ]
+                certs = dict(zip(
+                    serial_numbers,
+                    self.api.Backend.ra.get_certificates(serial_numbers)))
 
             for key, obj in six.iteritems(result):
                 if all and 'cacn' in obj:
@@ -1868,7 +2053,7 @@ class cert_find(Search, CertMethod):
                         ca_obj = ca_objs[cacn] = (
                             self.api.Command.ca_show(cacn, all=True)['result'])
 
-                    obj.update(ra.get_certificate(str(serial_number)))
+                    obj.update(certs[str(serial_number)])
                     if not raw:
                         obj['certificate'] = (
                             obj['certificate'].replace('\r\n', ''))
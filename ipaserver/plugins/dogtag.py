@@ -241,9 +241,12 @@ digits and nothing else follows.
 
 from __future__ import absolute_import
 
+import base64
+import concurrent.futures
 import datetime
 import json
 import logging
+import threading
 
 from lxml import etree
 import time
@@ -251,10 +254,11 @@ import contextlib
 
 import six
 
-from ipalib import Backend, api
+from ipalib import Backend, api, x509
 from ipapython.dn import DN
 import ipapython.cookie
 from ipapython import dogtag, ipautil, certdb
+from ipaserver.cert_index import get_cert_index
 from ipaserver.masters import find_providing_server
 
 if api.env.in_server:
@@ -1243,6 +1247,14 @@ class RestClient(Backend):
     DEFAULT_PROFILE = dogtag.DEFAULT_PROFILE
     KDC_PROFILE = dogtag.KDC_PROFILE
     path = None
+    # how long a REST API session is reused by later requests [seconds],
+    # shorter than the session timeout of Dogtag
+    session_ttl = 300
+
+    # session cookies shared by all REST clients of the process
+    # {(host, port, client certificate): (cookie, expiration time)}
+    _sessions = {}
+    _sessions_lock = threading.Lock()
 
     @staticmethod
     def _parse_dogtag_error(body):
@@ -1294,14 +1306,16 @@ class RestClient(Backend):
         object.__setattr__(self, '_ca_host', ca_host)
         return ca_host
 
-    def __enter__(self):
-        """Log into the REST API"""
-        if self.cookie is not None:
-            return None
+    @property
+    def _session_key(self):
+        return (self.ca_host, self.override_port or self.env.ca_agent_port,
+                self.client_certfile)
 
-        # Refresh the ca_host property
-        object.__setattr__(self, '_ca_host', None)
+    @property
+    def _reuse_sessions(self):
+        return dogtag.get_connection_pool() is not None
 
+    def _login(self):
         status, resp_headers, _resp_body = dogtag.https_request(
             self.ca_host, self.override_port or self.env.ca_agent_port,
             url='/ca/rest/account/login',
@@ -1313,11 +1327,15 @@ class RestClient(Backend):
         cookies = ipapython.cookie.Cookie.parse(resp_headers.get('set-cookie', ''))
         if status != 200 or len(cookies) == 0:
             raise errors.RemoteRetrieveError(reason=_('Failed to authenticate to CA REST API'))
-        object.__setattr__(self, 'cookie', str(cookies[0]))
-        return self
+        cookie = str(cookies[0])
 
-    def __exit__(self, exc_type, exc_value, traceback):
-        """Log out of the REST API"""
+        if self._reuse_sessions:
+            with self._sessions_lock:
+                self._sessions[self._session_key] = (
+                    cookie, time.time() + self.session_ttl)
+        object.__setattr__(self, 'cookie', cookie)
+
+    def _logout(self):
         dogtag.https_request(
             self.ca_host, self.override_port or self.env.ca_agent_port,
             url='/ca/rest/account/logout',
@@ -1326,6 +1344,48 @@ class RestClient(Backend):
             client_keyfile=self.client_keyfile,
             method='GET'
         )
+
+    def _get_session(self):
+        """
+        Return the cookie of a live shared session or None
+        """
+        with self._sessions_lock:
+            try:
+                cookie, expires = self._sessions[self._session_key]
+            except KeyError:
+                return None
+            if expires <= time.time():
+                del self._sessions[self._session_key]
+                return None
+        return cookie
+
+    def _drop_session(self):
+        with self._sessions_lock:
+            session = self._sessions.get(self._session_key)
+            if session is not None and session[0] == self.cookie:
+                del self._sessions[self._session_key]
+
+    def __enter__(self):
+        """Log into the REST API"""
+        if self.cookie is not None:
+            return self
+
+        # Refresh the ca_host property
+        object.__setattr__(self, '_ca_host', None)
+
+        cookie = self._get_session() if self._reuse_sessions else None
+        if cookie is not None:
+            logger.debug("reusing CA REST API session")
+            object.__setattr__(self, 'cookie', cookie)
+        else:
+            self._login()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        """Log out of the REST API"""
+        if not self._reuse_sessions:
+            self._logout()
+        # a shared session is kept for later requests until it expires
         object.__setattr__(self, 'cookie', None)
 
     def _ssldo(self, method, path, headers=None, body=None, use_session=True):
@@ -1370,6 +1430,20 @@ class RestClient(Backend):
             client_keyfile=self.client_keyfile,
             method=method, headers=headers, body=body
         )
+        if status == 401 and use_session and self._reuse_sessions:
+            # the shared session has expired on the server, log in again
+            logger.debug("CA REST API session expired, logging in again")
+            self._drop_session()
+            self._login()
+            headers['Cookie'] = self.cookie
+            status, resp_headers, resp_body = dogtag.https_request(
+                self.ca_host, self.override_port or self.env.ca_agent_port,
+                url=resource,
+                cafile=self.ca_cert,
+                client_certfile=self.client_certfile,
+                client_keyfile=self.client_keyfile,
+                method=method, headers=headers, body=body
+            )
         if status < 200 or status >= 300:
             explanation = self._parse_dogtag_error(resp_body) or ''
             raise errors.HTTPRequestError(
@@ -1386,6 +1460,10 @@ class ra(rabase.rabase, RestClient):
     Request Authority backend plugin.
     """
     DEFAULT_PROFILE = dogtag.DEFAULT_PROFILE
+    # maximum number of concurrent requests of get_certificates()
+    certificate_workers = 8
+    # number of certificates retrieved by one search request of iter_find()
+    search_page_size = 1000
 
     def raise_certificate_operation_error(self, func_name, err_msg=None, detail=None):
         """
@@ -1617,6 +1695,29 @@ class ra(rabase.rabase, RestClient):
         return cmd_result
 
 
+    def get_certificates(self, serial_numbers):
+        """
+        Retrieve many existing certificates concurrently.
+
+        At most ``certificate_workers`` certificates are retrieved at the
+        same time.
+
+        :param serial_numbers: Certificate serial numbers, see
+                               ``get_certificate``.
+        :return: list of results of ``get_certificate`` in the order of
+                 ``serial_numbers``
+        """
+        serial_numbers = list(serial_numbers)
+        if len(serial_numbers) < 2:
+            return [self.get_certificate(s) for s in serial_numbers]
+
+        # select the CA host now, worker threads have no LDAP connection
+        self.ca_host  # pylint: disable=pointless-statement
+
+        workers = min(self.certificate_workers, len(serial_numbers))
+        with concurrent.futures.ThreadPoolExecutor(workers) as executor:
+            return list(executor.map(self.get_certificate, serial_numbers))
+
     def request_certificate(
             self, csr, profile_id, ca_id, request_type='pkcs10'):
         """
@@ -1700,6 +1801,11 @@ class ra(rabase.rabase, RestClient):
             cert = ''.join(cmd_result['certificate'].splitlines())
             cmd_result['certificate'] = cert
 
+            cert_index = get_cert_index(self.api)
+            if cert_index is not None:
+                cert_index.add_certificate(
+                    x509.load_der_x509_certificate(base64.b64decode(cert)))
+
         if 'requestURL' in certinfo:
             cmd_result['request_id'] = certinfo['requestURL'].split('/')[-1]
 
@@ -1835,6 +1941,22 @@ class ra(rabase.rabase, RestClient):
 
         :param options: dictionary of search options
         """
+        return list(self.iter_find(options))
+
+    def iter_find(self, options, ca_host=None):
+        """
+        Search for certificates, return a generator over the results
+
+        The results are retrieved in pages of ``search_page_size``
+        certificates as they are consumed.
+
+        :param options: dictionary of search options
+        :param ca_host: CA host to search, selected with an LDAP connection
+                        if not specified
+        """
+        if ca_host is None:
+            ca_host = self.ca_host
+
 
         def convert_time(value):
             """
@@ -1922,11 +2044,25 @@ class ra(rabase.rabase, RestClient):
                                  xml_declaration=True, encoding='UTF-8')
         logger.debug('%s.find(): request: %s', type(self).__name__, payload)
 
+        sizelimit = options.get('sizelimit') or 0x7fffffff
+        start = 0
+        while start < sizelimit:
+            size = min(self.search_page_size, sizelimit - start)
+            certs = self._find_page(ca_host, payload, start, size)
+            for cert in certs:
+                yield self._parse_cert_data_info(cert)
+            if len(certs) < size:
+                break
+            start += len(certs)
+
+    def _find_page(self, ca_host, payload, start, size):
+        """
+        Return a list of CertDataInfo elements of a page of search results
+        """
         # pylint: disable=unused-variable
         status, _, data = dogtag.https_request(
-            self.ca_host, 443,
-            url='/ca/rest/certs/search?size=%d' % (
-                 options.get('sizelimit', 0x7fffffff)),
+            ca_host, 443,
+            url='/ca/rest/certs/search?start=%d&size=%d' % (start, size),
             client_certfile=None,
             client_keyfile=None,
             cafile=self.ca_cert,
@@ -1950,39 +2086,40 @@ class ra(rabase.rabase, RestClient):
                                                    detail=e.msg)
 
         # Grab all the certificates
-        certs = doc.xpath('//CertDataInfo')
-
-        results = []
+        return doc.xpath('//CertDataInfo')
 
-        for cert in certs:
-            response_request = {}
-            response_request['serial_number'] = int(cert.get('id'), 16) # parse as hex
-            response_request['serial_number_hex'] = u'0x%X' % response_request['serial_number']
+    @staticmethod
+    def _parse_cert_data_info(cert):
+        """
+        Convert a CertDataInfo element of search results to a dict
+        """
+        response_request = {}
+        response_request['serial_number'] = int(cert.get('id'), 16) # parse as hex
+        response_request['serial_number_hex'] = u'0x%X' % response_request['serial_number']
 
-            dn = cert.xpath('SubjectDN')
-            if len(dn) == 1:
-                response_request['subject'] = unicode(dn[0].text)
+        dn = cert.xpath('SubjectDN')
+        if len(dn) == 1:
+            response_request['subject'] = unicode(dn[0].text)
 
-            issuer_dn = cert.xpath('IssuerDN')
-            if len(issuer_dn) == 1:
-                response_request['issuer'] = unicode(issuer_dn[0].text)
+        issuer_dn = cert.xpath('IssuerDN')
+        if len(issuer_dn) == 1:
+            response_request['issuer'] = unicode(issuer_dn[0].text)
 
-            not_valid_before = cert.xpath('NotValidBefore')
-            if len(not_valid_before) == 1:
-                response_request['valid_not_before'] = (
-                    unicode(not_valid_before[0].text))
+        not_valid_before = cert.xpath('NotValidBefore')
+        if len(not_valid_before) == 1:
+            response_request['valid_not_before'] = (
+                unicode(not_valid_before[0].text))
 
-            not_valid_after = cert.xpath('NotValidAfter')
-            if len(not_valid_after) == 1:
-                response_request['valid_not_after'] = (
-                    unicode(not_valid_after[0].text))
+        not_valid_after = cert.xpath('NotValidAfter')
+        if len(not_valid_after) == 1:
+            response_request['valid_not_after'] = (
+                unicode(not_valid_after[0].text))
 
-            status = cert.xpath('Status')
-            if len(status) == 1:
-                response_request['status'] = unicode(status[0].text)
-            results.append(response_request)
+        status = cert.xpath('Status')
+        if len(status) == 1:
+            response_request['status'] = unicode(status[0].text)
 
-        return results
+        return response_request
 
     def updateCRL(self, wait='false'):
         """
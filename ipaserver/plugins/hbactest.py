@@ -18,12 +18,14 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 import logging
+import threading
 
 from ipalib import api, errors, output, util
 from ipalib import Command, Str, Flag, Int
 from ipalib import _
 from ipapython.dn import DN
 from ipalib.plugable import Registry
+from ipalib.request import context
 if api.env.in_server and api.env.context in ['lite', 'server']:
     try:
         import ipaserver.dcerpc
@@ -145,6 +147,12 @@ EXAMPLES:
       Not matched rules: new-rule
       Matched rules: allow_all
 
+    8. Test several requests at once, in USER:HOST:SERVICE format:
+    $ ipa hbactest-bulk --request=a1a:bar:sshd --request=b2b:bar:ftp
+    ----------------------------------
+    Access granted for 1 of 2 requests
+    ----------------------------------
+
 
 HBACTEST AND TRUSTED DOMAINS
 
@@ -219,6 +227,13 @@ logger = logging.getLogger(__name__)
 
 register = Registry()
 
+# maximum number of cached HBAC rule snapshots (one per principal and
+# sizelimit) in a process
+RULE_SNAPSHOTS_MAX = 64
+
+_rule_snapshots = {}
+_rule_snapshots_lock = threading.Lock()
+
 def _convert_to_ipa_rule(rule):
     # convert a dict with a rule to an pyhbac rule
     ipa_rule = pyhbac.HbacRule(rule['cn'][0])
@@ -317,11 +332,70 @@ class hbactest(Command):
             return u'%s.%s' % (host, self.env.domain)
         return host
 
-    def execute(self, *args, **options):
+    def _get_rules_marker(self):
+        """
+        Return a marker which changes whenever any HBAC rule changes, or
+        None if the rules cannot be tracked
+        """
+        ldap = self.api.Backend.ldap2
+        try:
+            entries, truncated = ldap.find_entries(
+                filter='(objectclass=ipahbacrule)',
+                attrs_list=['entryusn', 'modifytimestamp'],
+                base_dn=DN(self.api.env.container_hbac, self.api.env.basedn),
+                scope=ldap.SCOPE_ONELEVEL,
+                time_limit=-1,
+                size_limit=-1,  # paged search will get everything anyway
+                paged_search=True,
+                read_only=True)
+        except errors.NotFound:
+            return ()
+        if truncated:
+            return None
+
+        marker = []
+        for entry in entries:
+            usn = tuple(entry.raw.get('entryusn', []))
+            timestamp = tuple(entry.raw.get('modifytimestamp', []))
+            if not usn and not timestamp:
+                return None
+            marker.append((str(entry.dn), usn, timestamp))
+        return tuple(sorted(marker))
+
+    def _get_rule_snapshot(self, sizelimit):
+        """
+        Return all HBAC rules as a tuple of (rule, pyhbac rule) pairs
+
+        The converted rules are cached per process until any rule changes.
+        The pyhbac rules are shared and must not be modified.
+        """
+        marker = self._get_rules_marker()
+        key = (getattr(context, 'principal', None), sizelimit)
+        if marker is not None:
+            with _rule_snapshots_lock:
+                snapshot = _rule_snapshots.get(key)
+            if snapshot is not None and snapshot[0] == marker:
+                return snapshot[1]
+
+        hbacset = self.api.Command.hbacrule_find(
+            sizelimit=sizelimit, no_members=False)['result']
+        rules = tuple((rule, _convert_to_ipa_rule(rule)) for rule in hbacset)
+
+        if marker is not None:
+            with _rule_snapshots_lock:
+                if len(_rule_snapshots) >= RULE_SNAPSHOTS_MAX:
+                    _rule_snapshots.clear()
+                _rule_snapshots[key] = (marker, rules)
+        return rules
+
+    def _get_rules(self, options):
+        """
+        Return pyhbac rules selected by options and names of rules from
+        --rules which do not exist
+        """
         # First receive all needed information:
         # 1. HBAC rules (whether enabled or disabled)
-        # 2. Required options are (user, target host, service)
-        # 3. Options: rules to test (--rules, --enabled, --disabled), request for detail output
+        # 2. Options: rules to test (--rules, --enabled, --disabled)
         rules = []
 
         # Use all enabled IPA rules by default
@@ -349,23 +423,23 @@ class hbactest(Command):
         if options['enabled']:
             all_enabled = True
 
-        hbacset = []
         if len(testrules) == 0:
-            hbacset = self.api.Command.hbacrule_find(
-                sizelimit=sizelimit, no_members=False)['result']
+            hbacset = self._get_rule_snapshot(sizelimit)
         else:
+            hbacset = []
             for rule in testrules:
                 try:
-                    hbacset.append(self.api.Command.hbacrule_show(rule)['result'])
+                    rule = self.api.Command.hbacrule_show(rule)['result']
                 except Exception:
                     pass
+                else:
+                    hbacset.append((rule, _convert_to_ipa_rule(rule)))
 
         # We have some rules, import them
         # --enabled will import all enabled rules (default)
         # --disabled will import all disabled rules
         # --rules will implicitly add the rules from a rule list
-        for rule in hbacset:
-            ipa_rule = _convert_to_ipa_rule(rule)
+        for rule, ipa_rule in hbacset:
             if ipa_rule.name in testrules:
                 ipa_rule.enabled = True
                 rules.append(ipa_rule)
@@ -375,102 +449,132 @@ class hbactest(Command):
                 rules.append(ipa_rule)
             elif all_disabled and not ipa_rule.enabled:
                 # Option --disabled forces to include all disabled IPA rules into test
+                # (the rule may be shared, enable a new copy)
+                ipa_rule = _convert_to_ipa_rule(rule)
                 ipa_rule.enabled = True
                 rules.append(ipa_rule)
 
-        # Check if there are unresolved rules left
-        if len(testrules) > 0:
-            # Error, unresolved rules are left in --rules
-            return {'summary' : unicode(_(u'Unresolved rules in --rules')),
-                    'error': testrules, 'matched': None, 'notmatched': None,
-                    'warning' : None, 'value' : False}
+        return rules, testrules
 
-        # Rules are converted to pyhbac format, build request and then test it
-        request = pyhbac.HbacRequest()
-
-        if options['user'] != u'all':
-            # check first if this is not a trusted domain user
-            if _dcerpc_bindings_installed:
-                is_valid_sid = ipaserver.dcerpc.is_sid_valid(options['user'])
-            else:
-                is_valid_sid = False
-            components = util.normalize_name(options['user'])
-            if is_valid_sid or 'domain' in components or 'flatname' in components:
-                # this is a trusted domain user
-                if not _dcerpc_bindings_installed:
-                    raise errors.NotFound(reason=_(
-                        'Cannot perform external member validation without '
-                        'Samba 4 support installed. Make sure you have installed '
-                        'server-trust-ad sub-package of IPA on the server'))
-                domain_validator = ipaserver.dcerpc.DomainValidator(self.api)
-                if not domain_validator.is_configured():
-                    raise errors.NotFound(reason=_(
-                        'Cannot search in trusted domains without own domain configured. '
-                        'Make sure you have run ipa-adtrust-install on the IPA server first'))
-                user_sid, group_sids = domain_validator.get_trusted_domain_user_and_groups(options['user'])
-                request.user.name = user_sid
-
-                # Now search for all external groups that have this user or
-                # any of its groups in its external members. Found entires
-                # memberOf links will be then used to gather all groups where
-                # this group is assigned, including the nested ones
-                filter_sids = "(&(objectclass=ipaexternalgroup)(|(ipaExternalMember=%s)))" \
-                        % ")(ipaExternalMember=".join(group_sids + [user_sid])
-
-                ldap = self.api.Backend.ldap2
-                group_container = DN(api.env.container_group, api.env.basedn)
-                try:
-                    entries, _truncated = ldap.find_entries(
-                        filter_sids, ['memberof'], group_container)
-                except errors.NotFound:
-                    request.user.groups = []
-                else:
-                    groups = []
-                    for entry in entries:
-                        memberof_dns = entry.get('memberof', [])
-                        for memberof_dn in memberof_dns:
-                            if memberof_dn.endswith(group_container):
-                                groups.append(memberof_dn[0][0].value)
-                    request.user.groups = sorted(set(groups))
+    def _get_user(self, user):
+        """
+        Return name and groups of user for an HBAC request
+        """
+        # check first if this is not a trusted domain user
+        if _dcerpc_bindings_installed:
+            is_valid_sid = ipaserver.dcerpc.is_sid_valid(user)
+        else:
+            is_valid_sid = False
+        components = util.normalize_name(user)
+        if is_valid_sid or 'domain' in components or 'flatname' in components:
+            # this is a trusted domain user
+            if not _dcerpc_bindings_installed:
+                raise errors.NotFound(reason=_(
+                    'Cannot perform external member validation without '
+                    'Samba 4 support installed. Make sure you have installed '
+                    'server-trust-ad sub-package of IPA on the server'))
+            domain_validator = ipaserver.dcerpc.DomainValidator(self.api)
+            if not domain_validator.is_configured():
+                raise errors.NotFound(reason=_(
+                    'Cannot search in trusted domains without own domain configured. '
+                    'Make sure you have run ipa-adtrust-install on the IPA server first'))
+            user_sid, group_sids = domain_validator.get_trusted_domain_user_and_groups(user)
+
+            # Now search for all external groups that have this user or
+            # any of its groups in its external members. Found entires
+            # memberOf links will be then used to gather all groups where
+            # this group is assigned, including the nested ones
+            filter_sids = "(&(objectclass=ipaexternalgroup)(|(ipaExternalMember=%s)))" \
+                    % ")(ipaExternalMember=".join(group_sids + [user_sid])
+
+            ldap = self.api.Backend.ldap2
+            group_container = DN(api.env.container_group, api.env.basedn)
+            try:
+                entries, _truncated = ldap.find_entries(
+                    filter_sids, ['memberof'], group_container)
+            except errors.NotFound:
+                return user_sid, []
             else:
-                # try searching for a local user
-                try:
-                    request.user.name = options['user']
-                    search_result = self.api.Command.user_show(request.user.name)['result']
-                    groups = search_result['memberof_group']
-                    if 'memberofindirect_group' in search_result:
-                        groups += search_result['memberofindirect_group']
-                    request.user.groups = sorted(set(groups))
-                except Exception:
-                    pass
+                groups = []
+                for entry in entries:
+                    memberof_dns = entry.get('memberof', [])
+                    for memberof_dn in memberof_dns:
+                        if memberof_dn.endswith(group_container):
+                            groups.append(memberof_dn[0][0].value)
+                return user_sid, sorted(set(groups))
+
+        # try searching for a local user
+        try:
+            search_result = self.api.Command.user_show(user)['result']
+            groups = search_result['memberof_group']
+            if 'memberofindirect_group' in search_result:
+                groups += search_result['memberofindirect_group']
+            return user, sorted(set(groups))
+        except Exception:
+            return user, None
+
+    def _get_service(self, service):
+        """
+        Return name and groups of service for an HBAC request
+        """
+        try:
+            service_result = self.api.Command.hbacsvc_show(service)['result']
+            return service, service_result.get('memberof_hbacsvcgroup')
+        except Exception:
+            return service, None
 
-        if options['service'] != u'all':
-            try:
-                request.service.name = options['service']
-                service_result = self.api.Command.hbacsvc_show(request.service.name)['result']
-                if 'memberof_hbacsvcgroup' in service_result:
-                    request.service.groups = service_result['memberof_hbacsvcgroup']
-            except Exception:
-                pass
-
-        if options['targethost'] != u'all':
+    def _get_targethost(self, targethost):
+        """
+        Return name and groups of target host for an HBAC request
+        """
+        targethost = self.canonicalize(targethost)
+        try:
+            tgthost_result = self.api.Command.host_show(targethost)['result']
+            groups = tgthost_result['memberof_hostgroup']
+            if 'memberofindirect_hostgroup' in tgthost_result:
+                groups += tgthost_result['memberofindirect_hostgroup']
+            return targethost, sorted(set(groups))
+        except Exception:
+            return targethost, None
+
+    def _make_request(self, user, targethost, service, cache=None):
+        """
+        Build pyhbac request for user accessing service on targethost
+
+        cache is an optional dict used to resolve each user, host and
+        service only once when building many requests.
+        """
+        if cache is None:
+            cache = {}
+
+        request = pyhbac.HbacRequest()
+        for value, element, get in (
+                (user, request.user, self._get_user),
+                (service, request.service, self._get_service),
+                (targethost, request.targethost, self._get_targethost)):
+            if value == u'all':
+                continue
             try:
-                request.targethost.name = self.canonicalize(options['targethost'])
-                tgthost_result = self.api.Command.host_show(request.targethost.name)['result']
-                groups = tgthost_result['memberof_hostgroup']
-                if 'memberofindirect_hostgroup' in tgthost_result:
-                    groups += tgthost_result['memberofindirect_hostgroup']
-                request.targethost.groups = sorted(set(groups))
-            except Exception:
-                pass
+                name, groups = cache[get.__name__, value]
+            except KeyError:
+                name, groups = cache[get.__name__, value] = get(value)
+            element.name = name
+            if groups is not None:
+                element.groups = groups
+
+        return request
 
+    def _evaluate(self, request, rules, nodetail):
+        """
+        Evaluate request against rules
+        """
         matched_rules = []
         notmatched_rules = []
         error_rules = []
         warning_rules = []
 
         result = {'warning':None, 'matched':None, 'notmatched':None, 'error':None}
-        if not options['nodetail']:
+        if not nodetail:
             # Validate runs rules one-by-one and reports failed ones
             for ipa_rule in rules:
                 try:
@@ -508,3 +612,81 @@ class hbactest(Command):
 
         result['value'] = access_granted
         return result
+
+    def execute(self, *args, **options):
+        rules, testrules = self._get_rules(options)
+
+        # Check if there are unresolved rules left
+        if len(testrules) > 0:
+            # Error, unresolved rules are left in --rules
+            return {'summary' : unicode(_(u'Unresolved rules in --rules')),
+                    'error': testrules, 'matched': None, 'notmatched': None,
+                    'warning' : None, 'value' : False}
+
+        # Rules are converted to pyhbac format, build request and then test it
+        request = self._make_request(
+            options['user'], options['targethost'], options['service'])
+
+        return self._evaluate(request, rules, options['nodetail'])
+
+
+@register()
+class hbactest_bulk(hbactest):
+    __doc__ = _('Simulate use of Host-based access controls for many requests')
+
+    has_output = (
+        output.summary,
+        output.ListOfEntries('result'),
+        output.Output('count', int, _('Number of requests evaluated')),
+        output.Output('error', (list, tuple, type(None)), _('Non-existent or invalid rules')),
+    )
+
+    takes_options = (
+        Str('request+',
+            cli_name='request',
+            label=_('Requests'),
+            doc=_('Requests to test, in USER:HOST:SERVICE format'),
+        ),
+    ) + tuple(
+        option for option in hbactest.takes_options
+        if option.name in ('rules', 'nodetail', 'enabled', 'disabled',
+                           'sizelimit')
+    )
+
+    def _parse_request(self, request):
+        # user names may contain a colon, host and service names do not
+        fields = request.rsplit(u':', 2)
+        if len(fields) != 3 or not all(fields):
+            raise errors.ValidationError(
+                name='request',
+                error=_('must be in USER:HOST:SERVICE format'))
+        return fields
+
+    def execute(self, *args, **options):
+        triples = [self._parse_request(r) for r in options['request']]
+        rules, testrules = self._get_rules(options)
+
+        if len(testrules) > 0:
+            return dict(summary=unicode(_(u'Unresolved rules in --rules')),
+                        result=[], count=0, error=testrules)
+
+        results = []
+        granted = 0
+        cache = {}
+        for user, targethost, service in triples:
+            request = self._make_request(user, targethost, service, cache)
+            result = self._evaluate(request, rules, options['nodetail'])
+            del result['summary']
+            result.update(user=user, targethost=targethost, service=service)
+            results.append(result)
+            if result['value']:
+                granted += 1
+
+        return dict(
+            summary=unicode(_('Access granted for %(granted)d of %(count)d '
+                              'requests') % dict(granted=granted,
+                                                 count=len(results))),
+            result=results,
+            count=len(results),
+            error=None,
+        )
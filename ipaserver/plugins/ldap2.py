@@ -31,6 +31,8 @@ from __future__ import absolute_import
 
 import logging
 import os
+import threading
+import time
 
 import ldap as _ldap
 
@@ -38,7 +40,7 @@ from ipalib import krb_utils
 from ipaplatform.paths import paths
 from ipapython.dn import DN
 from ipapython.ipaldap import (LDAPClient, AUTOBIND_AUTO, AUTOBIND_ENABLED,
-                               AUTOBIND_DISABLED)
+                               AUTOBIND_DISABLED, schema_cache)
 
 from ipalib import Registry, errors, _
 from ipalib.crud import CrudBackend
@@ -51,11 +53,125 @@ register = Registry()
 _missing = object()
 
 
+class LDAPConnectionPool:
+    """
+    Per-process pool of idle bound LDAP connections.
+
+    Connections are keyed by the LDAP URI and the bind identity, so a
+    connection is only ever handed out to a request authenticated as the
+    same principal. Every connection carries an expiration time, which is
+    never later than the expiration of the credentials it was bound with.
+    """
+
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._idle = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """
+        Return a tuple (conn, expires) of an idle connection for key or None
+        """
+        now = time.time()
+        expired = []
+        found = None
+        with self._lock:
+            conns = self._idle.get(key, [])
+            while conns:
+                conn, expires = conns.pop()
+                if expires > now:
+                    found = (conn, expires)
+                    break
+                expired.append(conn)
+                self.evictions += 1
+            if not conns:
+                self._idle.pop(key, None)
+            if found is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        for conn in expired:
+            self._unbind(conn)
+        return found
+
+    def put(self, key, conn, expires):
+        """
+        Return a connection to the pool, unbind it if the pool is full or
+        the connection is expired
+        """
+        if expires > time.time():
+            with self._lock:
+                if sum(len(c) for c in self._idle.values()) < self.max_size:
+                    self._idle.setdefault(key, []).append((conn, expires))
+                    return
+                self.evictions += 1
+        self._unbind(conn)
+
+    def discard(self, conn):
+        """
+        Drop a connection returned by get() which turned out to be unusable,
+        the lookup is accounted as a miss
+        """
+        with self._lock:
+            self.hits -= 1
+            self.misses += 1
+            self.evictions += 1
+        self._unbind(conn)
+
+    def clear(self):
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for conns in idle.values():
+            for conn, _expires in conns:
+                self._unbind(conn)
+
+    def stats(self):
+        with self._lock:
+            return dict(
+                hits=self.hits,
+                misses=self.misses,
+                evictions=self.evictions,
+                idle=sum(len(c) for c in self._idle.values()),
+            )
+
+    @staticmethod
+    def _unbind(conn):
+        try:
+            conn.unbind_s()
+        except _ldap.LDAPError:
+            pass
+
+
+_connection_pool = None
+_connection_pool_lock = threading.Lock()
+
+
+def get_connection_pool(api):
+    """
+    Return the per-process LDAP connection pool or None when disabled
+    """
+    global _connection_pool
+
+    if api.env.context != 'server' or not api.env.ldap_pool_size:
+        return None
+    with _connection_pool_lock:
+        if _connection_pool is None:
+            _connection_pool = LDAPConnectionPool(
+                api.env.ldap_pool_size, api.env.ldap_pool_ttl)
+    return _connection_pool
+
+
 @register()
 class ldap2(CrudBackend, LDAPClient):
     """
     LDAP Backend Take 2.
     """
+    # maximum number of values in one bulk member modify or search filter
+    group_member_chunk_size = 1000
 
     def __init__(self, api):
         force_schema_updates = api.env.context in ('installer', 'updates')
@@ -64,46 +180,104 @@ class ldap2(CrudBackend, LDAPClient):
         LDAPClient.__init__(self, None,
                             force_schema_updates=force_schema_updates)
 
-        self._time_limit = float(LDAPClient.time_limit)
-        self._size_limit = int(LDAPClient.size_limit)
+        # share the LDAP schema between the server processes
+        if (api.env.context == 'server' and
+                os.path.isdir(paths.IPA_LDAP_SCHEMA_CACHE_DIR)):
+            schema_cache.snapshot_dir = paths.IPA_LDAP_SCHEMA_CACHE_DIR
 
     @property
     def ldap_uri(self):
         return self.api.env.ldap_uri
 
+    @property
+    def connection_pool(self):
+        return get_connection_pool(self.api)
+
+    def _get_pool_key(self, ccache, bind_pw, autobind, serverctrls,
+                      clientctrls):
+        """
+        Return a tuple (key, expires) identifying the bind of a new
+        connection in the connection pool, or None if the connection must
+        not be pooled.
+        """
+        if bind_pw or serverctrls or clientctrls:
+            return None
+        ldapi = self.ldap_uri.startswith('ldapi://')
+        expires = time.time() + self.connection_pool.ttl
+        if autobind != AUTOBIND_DISABLED and os.getegid() == 0 and ldapi:
+            return (self.ldap_uri, 'EXTERNAL', os.geteuid()), expires
+        creds = krb_utils.get_credentials_if_valid(ccache_name=ccache)
+        if creds is None:
+            return None
+        expires = min(expires, time.time() + creds.lifetime)
+        return (self.ldap_uri, 'GSSAPI', str(creds.name)), expires
+
+    def _get_pooled_connection(self, ccache, pool_key):
+        key, _expires = pool_key
+        found = self.connection_pool.get(key)
+        if found is None:
+            return None
+        conn, expires = found
+        try:
+            # make sure the server did not drop the connection meanwhile
+            conn.whoami_s()
+        except _ldap.LDAPError:
+            self.connection_pool.discard(conn)
+            return None
+
+        logger.debug('Reusing pooled LDAP connection (%s)',
+                     self.connection_pool.stats())
+        setattr(context, '%s_pool_key' % self.id, (key, expires))
+        if key[1] == 'GSSAPI':
+            if ccache is None:
+                os.environ.pop('KRB5CCNAME', None)
+            else:
+                os.environ['KRB5CCNAME'] = ccache
+            setattr(context, 'principal', key[2])
+        return conn
+
+    # time and size limits are thread-local like the connection, so that
+    # threads sharing the plugin can connect with their own limits
+
     @property
     def time_limit(self):
-        if self._time_limit is None:
+        time_limit = getattr(context, '%s_time_limit' % self.id,
+                             float(LDAPClient.time_limit))
+        if time_limit is None:
             return float(self.get_ipa_config().single_value.get(
                 'ipasearchtimelimit', 2))
-        return self._time_limit
+        return time_limit
 
     @time_limit.setter
     def time_limit(self, val):
         if val is not None:
             val = float(val)
-        object.__setattr__(self, '_time_limit', val)
+        setattr(context, '%s_time_limit' % self.id, val)
 
     @time_limit.deleter
     def time_limit(self):
-        object.__setattr__(self, '_time_limit', int(LDAPClient.size_limit))
+        if hasattr(context, '%s_time_limit' % self.id):
+            delattr(context, '%s_time_limit' % self.id)
 
     @property
     def size_limit(self):
-        if self._size_limit is None:
+        size_limit = getattr(context, '%s_size_limit' % self.id,
+                             int(LDAPClient.size_limit))
+        if size_limit is None:
             return int(self.get_ipa_config().single_value.get(
                 'ipasearchrecordslimit', 0))
-        return self._size_limit
+        return size_limit
 
     @size_limit.setter
     def size_limit(self, val):
         if val is not None:
             val = int(val)
-        object.__setattr__(self, '_size_limit', val)
+        setattr(context, '%s_size_limit' % self.id, val)
 
     @size_limit.deleter
     def size_limit(self):
-        object.__setattr__(self, '_size_limit', float(LDAPClient.time_limit))
+        if hasattr(context, '%s_size_limit' % self.id):
+            delattr(context, '%s_size_limit' % self.id)
 
     def _connect(self):
         # Connectible.conn is a proxy to thread-local storage;
@@ -137,7 +311,7 @@ class ldap2(CrudBackend, LDAPClient):
                 - value - sets the given value
                 - None - reads value from ipaconfig
                 - _missing - keeps previously configured settings
-                             (unlimited set by default in constructor)
+                             of the thread (unlimited by default)
 
         Extends backend.Connectible.create_connection.
         """
@@ -153,6 +327,15 @@ class ldap2(CrudBackend, LDAPClient):
         if size_limit is not _missing:
             object.__setattr__(self, 'size_limit', size_limit)
 
+        pool_key = None
+        if self.connection_pool is not None:
+            pool_key = self._get_pool_key(
+                ccache, bind_pw, autobind, serverctrls, clientctrls)
+        if pool_key is not None:
+            conn = self._get_pooled_connection(ccache, pool_key)
+            if conn is not None:
+                return conn
+
         client = LDAPClient(self.ldap_uri,
                             force_schema_updates=self._force_schema_updates,
                             cacert=cacert)
@@ -199,13 +382,25 @@ class ldap2(CrudBackend, LDAPClient):
                                client_controls=clientctrls)
             setattr(context, 'principal', principal)
 
+        if pool_key is not None:
+            setattr(context, '%s_pool_key' % self.id, pool_key)
+
         return conn
 
     def destroy_connection(self):
         """Disconnect from LDAP server."""
+        pool_key = getattr(context, '%s_pool_key' % self.id, None)
+        if pool_key is not None:
+            delattr(context, '%s_pool_key' % self.id)
+
         try:
             if self.conn is not None:
-                self.unbind()
+                if pool_key is not None:
+                    # return the bound connection to the pool
+                    key, expires = pool_key
+                    self.connection_pool.put(key, self.conn, expires)
+                else:
+                    self.unbind()
         except errors.PublicError:
             # ignore when trying to unbind multiple times
             pass
@@ -452,6 +647,163 @@ class ldap2(CrudBackend, LDAPClient):
         except errors.MidairCollision:
             raise errors.NotGroupMember()
 
+    def _get_existing_entries(self, dns):
+        """
+        Return a dict mapping each of dns which exists to its entry DN as
+        stored on the server.
+
+        Entries are looked up with one search per parent entry and RDN
+        attribute instead of one base search per DN.
+        """
+        existing = {}
+        by_parent = {}
+        for dn in dns:
+            if len(dn) > 1 and len(dn[0]) == 1:
+                key = (DN(*dn[1:]), dn[0].attr.lower())
+                by_parent.setdefault(key, []).append(dn[0].value)
+            else:
+                try:
+                    existing[dn] = self.get_entry(dn, ['']).dn
+                except errors.NotFound:
+                    pass
+
+        size = self.group_member_chunk_size
+        for (parent_dn, attr), values in by_parent.items():
+            for i in range(0, len(values), size):
+                filter = self.make_filter_from_attr(
+                    attr, values[i:i + size], self.MATCH_ANY)
+                try:
+                    entries = self.get_entries(
+                        parent_dn, self.SCOPE_ONELEVEL, filter, [''],
+                        size_limit=-1, paged_search=True)
+                except errors.NotFound:
+                    continue
+                for entry in entries:
+                    existing[entry.dn] = entry.dn
+        return existing
+
+    def _modify_group_members(self, mod_op, dns, group_dn, member_attr):
+        """
+        Apply mod_op for dns on group_dn in chunks of group_member_chunk_size
+        values. Return the list of DNs from chunks which were rejected.
+        """
+        rejected = []
+        size = self.group_member_chunk_size
+        for i in range(0, len(dns), size):
+            chunk = dns[i:i + size]
+            modlist = [(mod_op, member_attr, self.encode(chunk))]
+            try:
+                with self.error_handler():
+                    self.conn.modify_s(str(group_dn), modlist)
+            except errors.PublicError as e:
+                logger.debug(
+                    "modify of %d values of %s in %s failed: %s",
+                    len(chunk), member_attr, group_dn, e)
+                rejected.extend(chunk)
+        return rejected
+
+    def add_entries_to_group(self, dns, group_dn, member_attr='member',
+                             allow_same=False):
+        """
+        Add entries designated by dns to group group_dn in the member
+        attribute member_attr.
+
+        This is the bulk version of add_entry_to_group(). Existence of the
+        entries is checked with as few searches as possible and the values
+        are added with a single modify operation per chunk. Values of a
+        chunk rejected by the server are retried one by one with
+        add_entry_to_group() to get per member errors.
+
+        Returns a tuple (completed, failed), where completed is a list of
+        added DNs and failed a list of (dn, exception) tuples in the order
+        of dns, like adding the entries one by one reports them.
+        """
+        assert isinstance(group_dn, DN)
+
+        logger.debug(
+            "add_entries_to_group: %d dns group_dn=%s member_attr=%s",
+            len(dns), group_dn, member_attr)
+
+        group = self.get_entry(group_dn, [member_attr])
+        current = set(DN(v) for v in group.get(member_attr, []))
+        existing = self._get_existing_entries(dns)
+
+        failed = []
+        to_add = []
+        for i, dn in enumerate(dns):
+            assert isinstance(dn, DN)
+            entry_dn = existing.get(dn)
+            if entry_dn is None:
+                failed.append(
+                    (i, dn, errors.NotFound(reason='no such entry')))
+            elif entry_dn == group_dn and not allow_same:
+                failed.append((i, dn, errors.SameGroupError()))
+            elif entry_dn in current:
+                failed.append((i, dn, errors.AlreadyGroupMember()))
+            else:
+                current.add(entry_dn)
+                to_add.append((i, dn, entry_dn))
+
+        rejected = set(self._modify_group_members(
+            _ldap.MOD_ADD, [entry_dn for _i, _dn, entry_dn in to_add],
+            group_dn, member_attr))
+        completed = []
+        for i, dn, entry_dn in to_add:
+            if entry_dn in rejected:
+                try:
+                    self.add_entry_to_group(
+                        entry_dn, group_dn, member_attr,
+                        allow_same=allow_same)
+                except errors.PublicError as e:
+                    failed.append((i, dn, e))
+                    continue
+            completed.append(entry_dn)
+
+        failed.sort(key=lambda f: f[0])
+        return completed, [(dn, e) for _i, dn, e in failed]
+
+    def remove_entries_from_group(self, dns, group_dn, member_attr='member'):
+        """
+        Remove entries designated by dns from group group_dn.
+
+        This is the bulk version of remove_entry_from_group(), see
+        add_entries_to_group() for details and the return value.
+        """
+        assert isinstance(group_dn, DN)
+
+        logger.debug(
+            "remove_entries_from_group: %d dns group_dn=%s member_attr=%s",
+            len(dns), group_dn, member_attr)
+
+        group = self.get_entry(group_dn, [member_attr])
+        current = set(DN(v) for v in group.get(member_attr, []))
+
+        failed = []
+        to_remove = []
+        for i, dn in enumerate(dns):
+            assert isinstance(dn, DN)
+            if dn in current:
+                current.remove(dn)
+                to_remove.append((i, dn))
+            else:
+                failed.append((i, dn, errors.NotGroupMember()))
+
+        rejected = set(self._modify_group_members(
+            _ldap.MOD_DELETE, [dn for _i, dn in to_remove], group_dn,
+            member_attr))
+        completed = []
+        for i, dn in to_remove:
+            if dn in rejected:
+                try:
+                    self.remove_entry_from_group(dn, group_dn, member_attr)
+                except errors.PublicError as e:
+                    failed.append((i, dn, e))
+                    continue
+            completed.append(dn)
+
+        failed.sort(key=lambda f: f[0])
+        return completed, [(dn, e) for _i, dn, e in failed]
+
     def set_entry_active(self, dn, active):
         """Mark entry active/inactive."""
 
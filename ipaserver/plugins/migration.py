@@ -19,17 +19,24 @@
 
 from __future__ import absolute_import
 
+import contextlib
+import hashlib
+import json
 import logging
+import os
 import re
+import threading
 from ldap import MOD_ADD
 from ldap import SCOPE_BASE, SCOPE_ONELEVEL, SCOPE_SUBTREE
 
 import six
+from six.moves import queue
 
 from ipalib import api, errors, output
-from ipalib import Command, Password, Str, Flag, StrEnum, DNParam, Bool
+from ipalib import Command, Password, Str, Flag, StrEnum, DNParam, Bool, Int
 from ipalib.cli import to_cli
 from ipalib.plugable import Registry
+from ipalib.request import context, destroy_context
 from ipaserver.plugins.user import NO_UPG_MAGIC
 from ipalib import _
 from ipapython.dn import DN
@@ -120,6 +127,15 @@ EXAMPLES:
        --user-ignore-attribute=radiusgroupname \\
        ldap://ds.example.com:389
 
+Objects are retrieved from the remote LDAP server in pages of --page-size
+entries. Use --workers to add the migrated objects to IPA over several
+LDAP connections at once.
+
+The progress of the migration is recorded on the IPA server. When a
+migration from the same server is interrupted, re-run it with --resume
+to skip the objects which were already migrated:
+    ipa migrate-ds --workers=4 --resume ldap://ds.example.com:389
+
 LOGGING
 
 Migration will log warnings and errors to the Apache error log. This
@@ -325,7 +341,11 @@ def _update_default_group(ldap, ctx, force):
 
     # Purposely let this fire when migrate_cnt == 0 so on re-running migration
     # it can catch any users migrated but not added to the default group.
-    if force or migrate_cnt % 100 == 0:
+    if not force and migrate_cnt % 100 != 0:
+        return
+
+    # workers must not add the same users concurrently
+    with ctx['def_group_lock']:
         s = datetime.datetime.now()
         searchfilter = "(&(objectclass=posixAccount)(!(memberof=%s)))" % group_dn
         try:
@@ -337,10 +357,19 @@ def _update_default_group(ldap, ctx, force):
             return
 
         member_dns = [m.dn for m in result]
-        modlist = [(MOD_ADD, 'member', ldap.encode(member_dns))]
         try:
-            with ldap.error_handler():
-                ldap.conn.modify_s(str(group_dn), modlist)
+            _add_default_group_members(ldap, group_dn, member_dns)
+        except errors.DuplicateEntry:
+            # some users were added meanwhile, add the others one by one
+            for member_dn in member_dns:
+                try:
+                    _add_default_group_members(ldap, group_dn, [member_dn])
+                except errors.DuplicateEntry:
+                    pass
+                except errors.DatabaseError as e:
+                    logger.error(
+                        'Adding new member to default group failed: %s \n'
+                        'member: %s', e, member_dn)
         except errors.DatabaseError as e:
             logger.error('Adding new members to default group failed: %s \n'
                          'members: %s', e, ','.join(member_dns))
@@ -351,6 +380,12 @@ def _update_default_group(ldap, ctx, force):
         logger.info('Adding %d users to group%s duration %s',
                     len(member_dns), mode, d)
 
+
+def _add_default_group_members(ldap, group_dn, member_dns):
+    modlist = [(MOD_ADD, 'member', ldap.encode(member_dns))]
+    with ldap.error_handler():
+        ldap.conn.modify_s(str(group_dn), modlist)
+
 # GROUP MIGRATION CALLBACKS AND VARS
 
 def _pre_migrate_group(ldap, pkey, dn, entry_attrs, failed, config, ctx, **kwargs):
@@ -466,6 +501,96 @@ def _group_exc_callback(ldap, dn, entry_attrs, exc, options):
 
 # DS MIGRATION PLUGIN
 
+class MigrationCheckpoint:
+    """
+    Progress of a migration, stored in a file so that an interrupted
+    migration can be resumed.
+
+    The checkpoint records primary keys of migrated objects and types of
+    objects which were migrated completely. It is stored as a journal of
+    JSON records, one per line, and every update appends only the objects
+    migrated since the previous one. A checkpoint without path is kept in
+    memory only.
+    """
+    def __init__(self, path=None, resume=False):
+        self.path = path
+        self.completed = []
+        self.migrated = {}
+        if path is not None and resume:
+            self._load()
+
+    @staticmethod
+    def get_path(ldapuri, binddn, search_bases, scope):
+        """
+        Get path of the checkpoint file of a migration from the specified
+        source
+        """
+        source = json.dumps([
+            ldapuri,
+            str(binddn),
+            sorted((name, str(dn)) for name, dn in search_bases.items()),
+            scope,
+        ])
+        digest = hashlib.sha256(source.encode('utf-8')).hexdigest()
+        return os.path.join(paths.IPA_MIGRATION_CHECKPOINT_DIR,
+                            '%s.jsonl' % digest)
+
+    def _load(self):
+        try:
+            with open(self.path, 'r') as f:
+                lines = f.readlines()
+        except (IOError, OSError):
+            return
+        for line in lines:
+            try:
+                record = json.loads(line)
+                ldap_obj_name = record['type']
+            except (ValueError, KeyError, TypeError):
+                # the last record may be incomplete after a crash
+                continue
+            self._add(ldap_obj_name, record.get('migrated', []),
+                      record.get('completed', False))
+        logger.info('Resuming migration from checkpoint %s', self.path)
+
+    def _add(self, ldap_obj_name, migrated, completed):
+        self.migrated.setdefault(ldap_obj_name, []).extend(migrated)
+        if completed and ldap_obj_name not in self.completed:
+            self.completed.append(ldap_obj_name)
+
+    def is_completed(self, ldap_obj_name):
+        return ldap_obj_name in self.completed
+
+    def get_migrated(self, ldap_obj_name):
+        return list(self.migrated.get(ldap_obj_name, []))
+
+    def update(self, ldap_obj_name, migrated, completed=False):
+        """
+        Record objects of the specified type migrated since the previous
+        update and append them to the stored checkpoint
+        """
+        migrated = list(migrated)
+        self._add(ldap_obj_name, migrated, completed)
+        if self.path is None:
+            return
+        record = dict(type=ldap_obj_name, migrated=migrated)
+        if completed:
+            record['completed'] = True
+        try:
+            with open(self.path, 'a') as f:
+                f.write(json.dumps(record) + '\n')
+        except (IOError, OSError) as e:
+            logger.debug('failed to store migration checkpoint %s: %s',
+                         self.path, e)
+
+    def remove(self):
+        if self.path is None:
+            return
+        try:
+            os.unlink(self.path)
+        except OSError:
+            pass
+
+
 def construct_filter(template, oc_list):
     oc_subfilter = ''.join([ '(objectclass=%s)' % oc for oc in oc_list])
     return template % oc_subfilter
@@ -523,6 +648,10 @@ class migrate_ds(Command):
     }
     migrate_order = ('user', 'group')
 
+    # request context attributes copied to worker threads
+    worker_context_attributes = (
+        'principal', 'ccache_name', 'client_ip', 'languages')
+
     takes_args = (
         Str('ldapuri', validate_ldapuri,
             cli_name='ldap_uri',
@@ -654,6 +783,30 @@ class migrate_ds(Command):
                 default=_default_scope,
                 autofill=True,
                 ),
+        Int('pagesize?',
+            cli_name='page_size',
+            label=_('Page size'),
+            doc=_('Number of entries retrieved from the LDAP server at once '
+                  '(default: 1000)'),
+            minvalue=1,
+            default=1000,
+            autofill=True,
+        ),
+        Int('workers?',
+            label=_('Workers'),
+            doc=_('Number of connections used to add migrated objects to '
+                  'IPA (default: 1)'),
+            minvalue=1,
+            maxvalue=16,
+            default=1,
+            autofill=True,
+        ),
+        Flag('resume?',
+            label=_('Resume'),
+            doc=_('Resume an interrupted migration from the same server and '
+                  'skip objects which were already migrated'),
+            default=False,
+        ),
     )
 
     has_output = (
@@ -732,15 +885,148 @@ migration process might be incomplete\n''')
             search_bases[ldap_obj_name] = search_base
         return search_bases
 
-    def migrate(self, ldap, config, ds_ldap, ds_base_dn, options):
+    def _task_worker(self, tasks, leftover, failures, caller_context):
+        for name, value in caller_context.items():
+            setattr(context, name, value)
+        try:
+            self.api.Backend.ldap2.connect(
+                ccache=caller_context.get('ccache_name'),
+                size_limit=None,
+                time_limit=None)
+        except Exception as e:
+            # leave the tasks to the caller
+            logger.error('migrate-ds: failed to connect worker: %s', e)
+            connected = False
+        else:
+            connected = True
+
+        try:
+            while True:
+                task = tasks.get()
+                if task is None:
+                    break
+                if not connected:
+                    leftover.append(task)
+                elif not failures:
+                    func, args = task
+                    try:
+                        func(*args)
+                    except Exception as e:
+                        logger.error('migrate-ds: worker failed: %s', e)
+                        failures.append(e)
+        finally:
+            destroy_context()
+
+    @contextlib.contextmanager
+    def _run_tasks(self, workers):
+        """
+        Provide a function which runs a task, either directly or over a pool
+        of worker threads with their own LDAP connections.
+
+        All the tasks are finished when the context is left.
+        """
+        if workers <= 1:
+            yield lambda func, *args: func(*args)
+            return
+
+        tasks = queue.Queue(maxsize=workers * 2)
+        leftover = []
+        failures = []
+        caller_context = {
+            name: getattr(context, name)
+            for name in self.worker_context_attributes
+            if hasattr(context, name)
+        }
+        caller_context.setdefault(
+            'ccache_name', os.environ.get('KRB5CCNAME'))
+
+        def submit(func, *args):
+            if failures:
+                raise failures[0]
+            tasks.put((func, args))
+
+        threads = []
+        try:
+            for _i in range(workers):
+                thread = threading.Thread(
+                    target=self._task_worker,
+                    args=(tasks, leftover, failures, caller_context))
+                thread.start()
+                threads.append(thread)
+            yield submit
+        finally:
+            for _thread in threads:
+                tasks.put(None)
+            for thread in threads:
+                thread.join()
+
+        if failures:
+            raise failures[0]
+        # tasks left over by workers which failed to connect
+        for func, args in leftover:
+            func(*args)
+
+    def _add_entry(self, ldap, ldap_obj_name, pkey, entry_attrs, config,
+                   ctx, options, progress):
+        """
+        Add a migrated entry to IPA and record the result in progress.
+        """
+        s = datetime.datetime.now()
+        failed = progress['failed']
+        try:
+            ldap.add_entry(entry_attrs)
+        except errors.ExecutionError as e:
+            callback = self.migrate_objects[ldap_obj_name]['exc_callback']
+            if callable(callback):
+                try:
+                    callback(
+                        ldap, entry_attrs.dn, entry_attrs, e, options)
+                except errors.ExecutionError as e:
+                    failed[pkey] = unicode(e)
+                    return
+            else:
+                failed[pkey] = unicode(e)
+                return
+
+        with progress['lock']:
+            migrate_cnt = progress['migrate_cnt']
+            progress['migrate_cnt'] += 1
+            progress['new'].append(pkey)
+            if progress['migrate_cnt'] % options['pagesize'] == 0:
+                progress['checkpoint'].update(ldap_obj_name, progress['new'])
+                del progress['new'][:]
+
+        callback = self.migrate_objects[ldap_obj_name]['post_callback']
+        if callable(callback):
+            callback(
+                ldap, pkey, entry_attrs.dn, entry_attrs, failed, config,
+                dict(ctx, migrate_cnt=migrate_cnt))
+        e = datetime.datetime.now()
+        d = e - s
+        total_dur = e - progress['start']
+        migrate_cnt += 1
+        if migrate_cnt > 0 and migrate_cnt % 100 == 0:
+            logger.info("%d %ss migrated. %s elapsed.",
+                        migrate_cnt, ldap_obj_name, total_dur)
+        logger.debug("%d %ss migrated, duration: %s (total %s)",
+                     migrate_cnt, ldap_obj_name, d, total_dur)
+
+    def migrate(self, ldap, config, ds_ldap, ds_base_dn, options,
+                checkpoint=None):
         """
         Migrate objects from DS to LDAP.
+
+        Objects are retrieved from DS page by page and added to LDAP over
+        options['workers'] connections. Objects recorded in checkpoint as
+        migrated are skipped.
         """
         assert isinstance(ds_base_dn, DN)
         migrated = {} # {'OBJ': ['PKEY1', 'PKEY2', ...], ...}
         failed = {} # {'OBJ': {'PKEY1': 'Failed 'cos blabla', ...}, ...}
         search_bases = self._get_search_bases(options, ds_base_dn, self.migrate_order)
         migration_start = datetime.datetime.now()
+        if checkpoint is None:
+            checkpoint = MigrationCheckpoint()
 
         scope = _supported_scopes[options.get('scope')]
 
@@ -752,36 +1038,13 @@ migration process might be incomplete\n''')
             search_filter = construct_filter(template, oc_list)
 
             exclude = options['exclude_%ss' % to_cli(ldap_obj_name)]
-            context = dict(ds_ldap = ds_ldap)
+            ctx = dict(ds_ldap = ds_ldap)
 
-            migrated[ldap_obj_name] = []
+            migrated[ldap_obj_name] = checkpoint.get_migrated(ldap_obj_name)
+            # migrated objects not stored in the checkpoint yet
+            new = []
             failed[ldap_obj_name] = {}
 
-            try:
-                entries, truncated = ds_ldap.find_entries(
-                    search_filter, ['*'], search_bases[ldap_obj_name],
-                    scope,
-                    time_limit=0, size_limit=-1
-                )
-            except errors.NotFound:
-                if not options.get('continue',False):
-                    raise errors.NotFound(
-                        reason=_('%(container)s LDAP search did not return any result '
-                                 '(search base: %(search_base)s, '
-                                 'objectclass: %(objectclass)s)')
-                                 % {'container': ldap_obj_name,
-                                    'search_base': search_bases[ldap_obj_name],
-                                    'objectclass': ', '.join(oc_list)}
-                    )
-                else:
-                    truncated = False
-                    entries = []
-            if truncated:
-                logger.error(
-                    '%s: %s',
-                    ldap_obj.name, self.truncated_err_msg
-                )
-
             blacklists = {}
             for blacklist in ('oc_blacklist', 'attr_blacklist'):
                 blacklist_option = self.migrate_objects[ldap_obj_name][blacklist+'_option']
@@ -791,99 +1054,115 @@ migration process might be incomplete\n''')
                     blacklists[blacklist] = tuple()
 
             # get default primary group for new users
-            if 'def_group_dn' not in context and options.get('use_def_group'):
+            if 'def_group_dn' not in ctx and options.get('use_def_group'):
                 def_group = config.get('ipadefaultprimarygroup')
-                context['def_group_dn'] = api.Object.group.get_dn(def_group)
+                ctx['def_group_dn'] = api.Object.group.get_dn(def_group)
+                ctx['def_group_lock'] = threading.Lock()
                 try:
-                    ldap.get_entry(context['def_group_dn'], ['gidnumber', 'cn'])
+                    ldap.get_entry(ctx['def_group_dn'], ['gidnumber', 'cn'])
                 except errors.NotFound:
                     error_msg = _('Default group for new users not found')
                     raise errors.NotFound(reason=error_msg)
 
-            context['has_upg'] = ldap.has_upg()
+            ctx['has_upg'] = ldap.has_upg()
 
-            valid_gids = set()
-            invalid_gids = set()
-            migrate_cnt = 0
-            context['migrate_cnt'] = 0
-            for entry_attrs in entries:
-                context['migrate_cnt'] = migrate_cnt
-                s = datetime.datetime.now()
-
-                ava = entry_attrs.dn[0][0]
-                if ava.attr == ldap_obj.primary_key.name:
-                    # In case if pkey attribute is in the migrated object DN
-                    # and the original LDAP is multivalued, make sure that
-                    # we pick the correct value (the unique one stored in DN)
-                    pkey = ava.value.lower()
-                else:
-                    pkey = entry_attrs[ldap_obj.primary_key.name][0].lower()
-
-                if pkey in exclude:
-                    continue
-
-                entry_attrs.dn = ldap_obj.get_dn(pkey)
-                entry_attrs['objectclass'] = list(
-                    set(
-                        config.get(
-                            ldap_obj.object_class_config, ldap_obj.object_class
-                        ) + [o.lower() for o in entry_attrs['objectclass']]
-                    )
-                )
-                entry_attrs[ldap_obj.primary_key.name][0] = entry_attrs[ldap_obj.primary_key.name][0].lower()
+            if checkpoint.is_completed(ldap_obj_name):
+                logger.info('%ss were already migrated, skipping',
+                            ldap_obj_name)
+                continue
 
-                callback = self.migrate_objects[ldap_obj_name]['pre_callback']
-                if callable(callback):
-                    try:
-                        entry_attrs.dn = callback(
-                            ldap, pkey, entry_attrs.dn, entry_attrs,
-                            failed[ldap_obj_name], config, context,
-                            schema=options['schema'],
-                            search_bases=search_bases,
-                            valid_gids=valid_gids,
-                            invalid_gids=invalid_gids,
-                            **blacklists
-                        )
-                        if not entry_attrs.dn:
-                            continue
-                    except errors.NotFound as e:
-                        failed[ldap_obj_name][pkey] = unicode(e.reason)
-                        continue
+            done = set(migrated[ldap_obj_name])
+            progress = dict(
+                lock=threading.Lock(),
+                migrate_cnt=0,
+                new=new,
+                failed=failed[ldap_obj_name],
+                checkpoint=checkpoint,
+                start=migration_start,
+            )
+            entries = ds_ldap.iter_entries(
+                search_filter, ['*'], search_bases[ldap_obj_name],
+                scope, time_limit=0, page_size=options['pagesize'],
+            )
 
+            valid_gids = set()
+            invalid_gids = set()
+            found = False
+            with self._run_tasks(options['workers']) as run_task:
                 try:
-                    ldap.add_entry(entry_attrs)
-                except errors.ExecutionError as e:
-                    callback = self.migrate_objects[ldap_obj_name]['exc_callback']
-                    if callable(callback):
-                        try:
-                            callback(
-                                ldap, entry_attrs.dn, entry_attrs, e, options)
-                        except errors.ExecutionError as e:
-                            failed[ldap_obj_name][pkey] = unicode(e)
+                    for entry_attrs in entries:
+                        found = True
+
+                        ava = entry_attrs.dn[0][0]
+                        if ava.attr == ldap_obj.primary_key.name:
+                            # In case if pkey attribute is in the migrated
+                            # object DN and the original LDAP is multivalued,
+                            # make sure that we pick the correct value (the
+                            # unique one stored in DN)
+                            pkey = ava.value.lower()
+                        else:
+                            pkey = entry_attrs[ldap_obj.primary_key.name][0].lower()
+
+                        if pkey in exclude or pkey in done:
                             continue
-                    else:
-                        failed[ldap_obj_name][pkey] = unicode(e)
-                        continue
 
-                migrated[ldap_obj_name].append(pkey)
+                        entry_attrs.dn = ldap_obj.get_dn(pkey)
+                        entry_attrs['objectclass'] = list(
+                            set(
+                                config.get(
+                                    ldap_obj.object_class_config,
+                                    ldap_obj.object_class
+                                ) + [o.lower() for o in entry_attrs['objectclass']]
+                            )
+                        )
+                        entry_attrs[ldap_obj.primary_key.name][0] = entry_attrs[ldap_obj.primary_key.name][0].lower()
+
+                        callback = self.migrate_objects[ldap_obj_name]['pre_callback']
+                        if callable(callback):
+                            try:
+                                entry_attrs.dn = callback(
+                                    ldap, pkey, entry_attrs.dn, entry_attrs,
+                                    failed[ldap_obj_name], config, ctx,
+                                    schema=options['schema'],
+                                    search_bases=search_bases,
+                                    valid_gids=valid_gids,
+                                    invalid_gids=invalid_gids,
+                                    **blacklists
+                                )
+                                if not entry_attrs.dn:
+                                    continue
+                            except errors.NotFound as e:
+                                failed[ldap_obj_name][pkey] = unicode(e.reason)
+                                continue
+
+                        run_task(
+                            self._add_entry, ldap, ldap_obj_name, pkey,
+                            entry_attrs, config, ctx, options, progress)
+                except errors.NotFound:
+                    # the search base does not exist
+                    if found:
+                        raise
+                except errors.LimitsExceeded:
+                    logger.error(
+                        '%s: %s',
+                        ldap_obj.name, self.truncated_err_msg
+                    )
 
-                callback = self.migrate_objects[ldap_obj_name]['post_callback']
-                if callable(callback):
-                    callback(
-                        ldap, pkey, entry_attrs.dn, entry_attrs,
-                        failed[ldap_obj_name], config, context)
-                e = datetime.datetime.now()
-                d = e - s
-                total_dur = e - migration_start
-                migrate_cnt += 1
-                if migrate_cnt > 0 and migrate_cnt % 100 == 0:
-                    logger.info("%d %ss migrated. %s elapsed.",
-                                migrate_cnt, ldap_obj_name, total_dur)
-                logger.debug("%d %ss migrated, duration: %s (total %s)",
-                             migrate_cnt, ldap_obj_name, d, total_dur)
-
-        if 'def_group_dn' in context:
-            _update_default_group(ldap, context, True)
+            if not found and not options.get('continue', False):
+                raise errors.NotFound(
+                    reason=_('%(container)s LDAP search did not return any result '
+                             '(search base: %(search_base)s, '
+                             'objectclass: %(objectclass)s)')
+                             % {'container': ldap_obj_name,
+                                'search_base': search_bases[ldap_obj_name],
+                                'objectclass': ', '.join(oc_list)}
+                )
+            checkpoint.update(ldap_obj_name, new, completed=True)
+            migrated[ldap_obj_name] = checkpoint.get_migrated(ldap_obj_name)
+
+        if 'def_group_dn' in ctx:
+            _update_default_group(
+                ldap, dict(ctx, migrate_cnt=0), True)
 
         return (migrated, failed)
 
@@ -939,9 +1218,18 @@ migration process might be incomplete\n''')
                 except (IndexError, KeyError) as e:
                     raise Exception(str(e))
 
+        search_bases = self._get_search_bases(
+            options, ds_base_dn, self.migrate_order)
+        checkpoint = MigrationCheckpoint(
+            MigrationCheckpoint.get_path(
+                ldapuri, options['binddn'], search_bases, options['scope']),
+            resume=options.get('resume', False)
+        )
+
         # migrate!
         (migrated, failed) = self.migrate(
-            ldap, config, ds_ldap, ds_base_dn, options
+            ldap, config, ds_ldap, ds_base_dn, options, checkpoint
         )
+        checkpoint.remove()
 
         return dict(result=migrated, failed=failed, enabled=True, compat=True)
@@ -124,6 +124,15 @@ class rabase(Backend):
         """
         raise errors.NotImplementedError(name='%s.find' % self.name)
 
+    def iter_find(self, options, ca_host=None):
+        """
+        Search for certificates, return an iterator over the results
+
+        :param options: dictionary of search options
+        :param ca_host: CA host to search, if the backend selects one
+        """
+        return iter(self.find(options))
+
     def updateCRL(self, wait='false'):
         """
         Force update of the CRL
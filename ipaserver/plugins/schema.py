@@ -4,7 +4,12 @@
 
 import importlib
 import itertools
+import json
+import logging
+import os
+import re
 import sys
+import tempfile
 
 import six
 import hashlib
@@ -18,6 +23,7 @@ from ipalib.parameters import Bool, Dict, Flag, Str
 from ipalib.plugable import Registry
 from ipalib.request import context
 from ipalib.text import _
+from ipaplatform.paths import paths
 from ipapython.version import API_VERSION
 
 # Schema TTL sent to clients in response to schema call.
@@ -44,6 +50,8 @@ EXAMPLES:
 if six.PY3:
     unicode = str
 
+logger = logging.getLogger(__name__)
+
 register = Registry()
 
 
@@ -781,8 +789,16 @@ class schema(Command):
             'known_fingerprints*',
             label=_("Fingerprint of schema cached by client")
         ),
+        Str(
+            'base_fingerprint?',
+            label=_("Fingerprint of schema cached by client to return "
+                    "only the changes from"),
+        ),
     )
 
+    namespaces = ('commands', 'classes', 'topics')
+    fingerprint_re = re.compile(r'^[0-9a-f]{8}$')
+
     @staticmethod
     def _calculate_fingerprint(data):
         """
@@ -832,9 +848,74 @@ class schema(Command):
         schema['classes'] = classes
         schema['topics'] = topics
         schema['fingerprint'] = self._calculate_fingerprint(schema)
+        schema['item_fingerprints'] = {
+            ns: {
+                member['full_name']: self._calculate_fingerprint(member)
+                for member in schema[ns]
+            }
+            for ns in self.namespaces
+        }
 
         return schema
 
+    def _store_item_fingerprints(self, schema):
+        """
+        Store fingerprints of schema items, so that the changes from the
+        schema can be computed by any server process, also after an update
+        """
+        if not os.path.isdir(paths.IPA_API_SCHEMA_DIR):
+            return
+
+        with tempfile.NamedTemporaryFile(
+                'w', dir=paths.IPA_API_SCHEMA_DIR, delete=False) as f:
+            try:
+                json.dump(schema['item_fingerprints'], f)
+                f.close()
+                os.rename(f.name, os.path.join(paths.IPA_API_SCHEMA_DIR,
+                                               schema['fingerprint']))
+            except Exception:
+                os.unlink(f.name)
+                raise
+
+    def _load_item_fingerprints(self, fingerprint):
+        """
+        Returns fingerprints of items of schema identified by fingerprint or
+        None if they are not known
+        """
+        if not self.fingerprint_re.match(fingerprint):
+            return None
+        try:
+            with open(os.path.join(paths.IPA_API_SCHEMA_DIR,
+                                   fingerprint)) as f:
+                return json.load(f)
+        except (EnvironmentError, ValueError):
+            return None
+
+    def _get_delta(self, schema, base_items):
+        """
+        Returns items of schema whose fingerprint differs from base_items
+        and names of items in base_items which are not in schema
+        """
+        delta = dict(
+            version=schema['version'],
+            fingerprint=schema['fingerprint'],
+            ttl=schema['ttl'],
+            delta=True,
+            removed={},
+        )
+
+        for ns in self.namespaces:
+            item_fps = schema['item_fingerprints'][ns]
+            base = base_items.get(ns) or {}
+
+            delta[ns] = [member for member in schema[ns]
+                         if base.get(member['full_name']) !=
+                         item_fps[member['full_name']]]
+            delta['removed'][ns] = [
+                name for name in base if name not in item_fps]
+
+        return delta
+
     def execute(self, *args, **kwargs):
         langs = "".join(getattr(context, "languages", []))
 
@@ -845,6 +926,10 @@ class schema(Command):
         if schema is None:
             schema = self._generate_schema(**kwargs)
             self.api._schema[langs] = schema
+            try:
+                self._store_item_fingerprints(schema)
+            except Exception as e:
+                logger.warning("Failed to store schema fingerprints: %s", e)
 
         schema['ttl'] = SCHEMA_TTL
 
@@ -854,4 +939,13 @@ class schema(Command):
                 ttl=schema['ttl'],
             )
 
-        return dict(result=schema)
+        base_items = None
+        if kwargs.get('base_fingerprint'):
+            base_items = self._load_item_fingerprints(
+                kwargs['base_fingerprint'])
+        if base_items is not None:
+            return dict(result=self._get_delta(schema, base_items))
+
+        result = dict(schema)
+        del result['item_fingerprints']
+        return dict(result=result)
@@ -25,10 +25,12 @@ Also see the `ipalib.rpc` module.
 
 from __future__ import absolute_import
 
+import itertools
 import logging
 from xml.sax.saxutils import escape
 import os
 import traceback
+import zlib
 from io import BytesIO
 from urllib.parse import parse_qs
 from xmlrpc.client import Fault
@@ -51,7 +53,7 @@ from ipalib.errors import (PublicError, InternalError, JSONError,
     ExecutionError, PasswordExpired, KrbPrincipalExpired, UserLocked)
 from ipalib.request import context, destroy_context
 from ipalib.rpc import (xml_dumps, xml_loads,
-    json_encode_binary, json_decode_binary)
+    json_iterencode_binary, json_decode_binary)
 from ipapython.dn import DN
 from ipaserver.plugins.ldap2 import ldap2
 from ipalib.backend import Backend
@@ -74,6 +76,11 @@ logger = logging.getLogger(__name__)
 HTTP_STATUS_SUCCESS = '200 Success'
 HTTP_STATUS_SERVER_ERROR = '500 Internal Server Error'
 
+# maximal size of a decompressed request body
+MAX_DECOMPRESSED_REQUEST_SIZE = 64 * 1024 * 1024
+# wbits of zlib for the gzip format
+GZIP_WBITS = 16 + zlib.MAX_WBITS
+
 _not_found_template = """<html>
 <head>
 <title>404 Not Found</title>
@@ -191,12 +198,105 @@ class HTTP_Status(plugable.Plugin):
 def read_input(environ):
     """
     Read the request body from environ['wsgi.input'].
+
+    A gzip encoded body is decompressed.
     """
     try:
         length = int(environ.get('CONTENT_LENGTH'))
     except (ValueError, TypeError):
         return None
-    return environ['wsgi.input'].read(length).decode('utf-8')
+    data = environ['wsgi.input'].read(length)
+    coding = environ.get('HTTP_CONTENT_ENCODING', 'identity').strip().lower()
+    if coding in ('gzip', 'x-gzip'):
+        decompressor = zlib.decompressobj(GZIP_WBITS)
+        data = decompressor.decompress(data, MAX_DECOMPRESSED_REQUEST_SIZE)
+        if decompressor.unconsumed_tail:
+            raise ValueError('Decompressed request body is too large')
+    elif coding != 'identity':
+        raise ValueError('Unsupported Content-Encoding: %s' % coding)
+    return data.decode('utf-8')
+
+
+def accepts_gzip(environ):
+    """
+    Return True if the client accepts gzip encoded responses.
+    """
+    for coding in environ.get('HTTP_ACCEPT_ENCODING', '').split(','):
+        name, _sep, params = coding.partition(';')
+        if name.strip().lower() not in ('gzip', 'x-gzip'):
+            continue
+        # gzip;q=0 means "not acceptable"
+        for param in params.split(';'):
+            key, _sep, value = param.partition('=')
+            if key.strip().lower() == 'q':
+                try:
+                    return float(value) > 0
+                except ValueError:
+                    return False
+        return True
+    return False
+
+
+def gzip_response(response, threshold):
+    """
+    Compress a response with gzip if it is at least ``threshold`` bytes long.
+
+    The response is read only as far as needed to decide.
+
+    :param response: iterable of bytes
+    :param threshold: minimal size of the response to compress
+    :return: tuple (compressed, iterable of bytes)
+    """
+    chunks = iter(response)
+    head = []
+    size = 0
+    for chunk in chunks:
+        head.append(chunk)
+        size += len(chunk)
+        if size >= threshold:
+            break
+    else:
+        return False, head
+    return True, _gzip_iter(itertools.chain(head, chunks))
+
+
+def prefetch_response(response):
+    """
+    Produce the first chunk of a response before it is started.
+
+    Errors of producing the first chunk are raised at once so that they
+    can be reported with an error status. Errors of producing later chunks
+    are logged and raised to the WSGI server, which aborts the response.
+
+    :param response: iterable of bytes
+    :return: iterable of bytes
+    """
+    chunks = iter(response)
+    try:
+        head = next(chunks)
+    except StopIteration:
+        return []
+    return _logged_iter(head, chunks)
+
+
+def _logged_iter(head, chunks):
+    yield head
+    try:
+        for chunk in chunks:
+            yield chunk
+    except Exception:
+        logger.exception('WSGI response failed after it was started')
+        raise
+
+
+def _gzip_iter(chunks):
+    compressor = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED,
+                                  GZIP_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
 
 
 def params_2_args_options(params):
@@ -270,6 +370,10 @@ class wsgi_dispatch(Executioner, HTTP_Status):
     def _on_finalize(self):
         self.url = self.env['mount_ipa']
         super(wsgi_dispatch, self)._on_finalize()
+        if self.env.plugins_on_demand:
+            # WSGI applications are mounted when they are finalized
+            for backend in self.api.Backend():
+                backend.ensure_finalized()
 
     def route(self, environ, start_response):
         key = environ.get('PATH_INFO')
@@ -426,11 +530,27 @@ class WSGIExecutioner(Executioner):
         try:
             status = HTTP_STATUS_SUCCESS
             response = self.wsgi_execute(environ)
+            if not isinstance(response, bytes):
+                # marshal() may return an iterable which produces the body
+                # while it is being sent, fail early if it cannot start
+                response = prefetch_response(response)
             if self.headers:
-                headers = self.headers
+                headers = list(self.headers)
             else:
                 headers = [('Content-Type',
                             self.content_type + '; charset=utf-8')]
+            threshold = self.api.env.rpc_compress_threshold
+            if threshold >= 0:
+                # announce that gzip encoded requests are accepted
+                # (RFC 7694) and compress large responses
+                headers.append(('Accept-Encoding', 'gzip'))
+                headers.append(('Vary', 'Accept-Encoding'))
+                if accepts_gzip(environ):
+                    if isinstance(response, bytes):
+                        response = [response]
+                    compressed, response = gzip_response(response, threshold)
+                    if compressed:
+                        headers.append(('Content-Encoding', 'gzip'))
         except Exception:
             logger.exception('WSGI %s.__call__():', self.name)
             status = HTTP_STATUS_SERVER_ERROR
@@ -442,7 +562,9 @@ class WSGIExecutioner(Executioner):
             headers.append(('IPASESSION', logout_cookie))
 
         start_response(status, headers)
-        return [response]
+        if isinstance(response, bytes):
+            return [response]
+        return response
 
     def unmarshal(self, data):
         raise NotImplementedError('%s.unmarshal()' % type(self).__name__)
@@ -490,10 +612,9 @@ class jsonserver(WSGIExecutioner, HTTP_Status):
             principal=unicode(principal),
             version=unicode(VERSION),
         )
-        dump = json_encode_binary(
+        return json_iterencode_binary(
             response, version, pretty_print=self.api.env.debug
         )
-        return dump.encode('utf-8')
 
     def unmarshal(self, data):
         try:
@@ -6,8 +6,6 @@
 set of functions and classes useful for management of domain level 1 topology
 """
 
-from copy import deepcopy
-
 from ipalib import _
 from ipapython.graph import Graph
 
@@ -51,25 +49,49 @@ def create_topology_graph(masters, segments):
     return graph
 
 
-def get_topology_connection_errors(graph):
+def get_topology_connection_errors(graph, exclude=None):
     """
-    Traverse graph from each master and find out which masters are not
-    reachable.
+    Find out which masters are not reachable from each master.
 
     :param graph: topology graph where vertices are masters
+    :param exclude: master to leave out of the graph
     :returns: list of errors, error is: (master, visited, not_visited)
     """
     connect_errors = []
-    master_cns = list(graph.vertices)
-    master_cns.sort()
-    for m in master_cns:
-        visited = graph.bfs(m)
-        not_visited = graph.vertices - visited
+    reachable = graph.get_reachable(exclude=exclude)
+    masters = graph.vertices - {exclude}
+    for m in sorted(masters):
+        visited = reachable[m]
+        not_visited = masters - visited
         if not_visited:
             connect_errors.append((m, list(visited), list(not_visited)))
     return connect_errors
 
 
+def get_topology_removal_errors(graph):
+    """
+    Find connection errors caused by the removal of each master.
+
+    Removal of a master which is not an articulation point of a connected
+    topology with bidirectional segments leaves the topology connected, so
+    connection errors are computed only for the articulation points.
+
+    :param graph: topology graph where vertices are masters
+    :returns: dict of lists of errors (as returned by
+              get_topology_connection_errors) by removed master
+    """
+    if graph.is_symmetric() and not get_topology_connection_errors(graph):
+        candidates = graph.get_articulation_points()
+    else:
+        candidates = graph.vertices
+
+    return {
+        m: (get_topology_connection_errors(graph, exclude=m)
+            if m in candidates else [])
+        for m in graph.vertices
+    }
+
+
 def map_masters_to_suffixes(masters):
     masters_to_suffix = {}
     managed_suffix_attr = 'iparepltopomanagedsuffix_topologysuffix'
@@ -137,29 +159,30 @@ class TopologyConnectivity:
         self.api = api_instance
 
         self.graphs = _create_topology_graphs(self.api)
+        self._errors = None
+        self._removal_errors = {}
 
     @property
     def errors(self):
-        errors_by_suffix = {}
-        for suffix in self.graphs:
-            errors_by_suffix[suffix] = get_topology_connection_errors(
-                self.graphs[suffix]
-            )
-
-        return errors_by_suffix
+        if self._errors is None:
+            self._errors = {
+                suffix: get_topology_connection_errors(graph)
+                for suffix, graph in self.graphs.items()
+            }
+        return self._errors
 
     def errors_after_master_removal(self, master_cn):
-        graphs_before = deepcopy(self.graphs)
-
-        for s in self.graphs:
-            try:
-                self.graphs[s].remove_vertex(master_cn)
-            except ValueError:
-                pass
-
-        errors_after_removal = self.errors
-
-        self.graphs = graphs_before
+        errors_after_removal = {}
+        for suffix, graph in self.graphs.items():
+            if master_cn not in graph.vertices:
+                errors_after_removal[suffix] = self.errors[suffix]
+                continue
+            if suffix not in self._removal_errors:
+                # errors for removal of every master are found in one pass
+                self._removal_errors[suffix] = get_topology_removal_errors(
+                    graph)
+            errors_after_removal[suffix] = (
+                self._removal_errors[suffix][master_cn])
 
         return errors_after_removal
 
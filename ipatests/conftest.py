@@ -41,6 +41,7 @@ MARKERS = [
     'ds_acceptance: Acceptance test suite for 389 Directory Server',
     'skip_ipaclient_unittest: Skip in ipaclient unittest mode',
     'needs_ipaapi: Test needs IPA API',
+    'benchmark: Performance measurement, run only with --run-benchmarks',
 ]
 
 
@@ -105,6 +106,11 @@ def pytest_addoption(parser):
         help='Do not run tests that depends on IPA API',
         action='store_true',
     )
+    group.addoption(
+        '--run-benchmarks',
+        help='Run performance benchmarks, they are skipped by default',
+        action='store_true',
+    )
 
 
 def pytest_cmdline_main(config):
@@ -149,6 +155,10 @@ def pytest_runtest_setup(item):
             # pylint: disable=no-member
             if item.config.option.skip_ipaapi:
                 pytest.skip("Skip tests that needs an IPA API")
+        if get_marker('benchmark'):
+            # pylint: disable=no-member
+            if not item.config.option.run_benchmarks:
+                pytest.skip("Benchmarks run only with --run-benchmarks")
 
 
 @pytest.fixture
@@ -29,7 +29,8 @@ import pytest
 
 from ipalib import api
 from ipalib import errors
-from ipaserver.install.ldapupdate import LDAPUpdate, BadSyntax
+from ipaserver.install.ldapupdate import (
+    LDAPUpdate, BadSyntax, schedule_update_files)
 from ipaserver.install import installutils
 from ipapython import ipaldap
 from ipaplatform.constants import constants as platformconstants
@@ -257,3 +258,60 @@ class test_update(unittest.TestCase):
         with self.assertRaises(BadSyntax):
             self.updater.update(
                 [os.path.join(self.testdir, "9_badsyntax.update")])
+
+
+@pytest.mark.tier0
+class TestScheduleUpdateFiles:
+    basedn = DN('dc=example,dc=test')
+
+    def make_file(self, name, *dns, **kwargs):
+        all_updates = [
+            {
+                'dn': DN(dn, self.basedn),
+                'updates': [
+                    dict(action='add', attr='member', value=value)
+                    for value in kwargs.get('members', [])
+                ],
+            }
+            for dn in dns
+        ]
+        if kwargs.get('plugin'):
+            all_updates.append({'plugin': kwargs['plugin']})
+        return (name, all_updates)
+
+    def get_batches(self, *update_files):
+        return [
+            [update_file[0] for update_file in batch]
+            for batch in schedule_update_files(update_files, self.basedn)
+        ]
+
+    def test_independent(self):
+        assert self.get_batches(
+            self.make_file('a', 'cn=a,cn=etc'),
+            self.make_file('b', 'cn=b,cn=etc'),
+            self.make_file('c', 'cn=c,cn=etc', 'cn=d,cn=etc'),
+        ) == [['a', 'b', 'c']]
+
+    def test_parent_and_child(self):
+        assert self.get_batches(
+            self.make_file('a', 'cn=a,cn=etc'),
+            self.make_file('b', 'cn=b,cn=a,cn=etc'),
+            self.make_file('c', 'cn=c,cn=etc'),
+            self.make_file('d', 'cn=c,cn=etc'),
+        ) == [['a'], ['b', 'c'], ['d']]
+
+    def test_reference(self):
+        member = b'cn=a,cn=etc,dc=example,dc=test'
+        assert self.get_batches(
+            self.make_file('a', 'cn=a,cn=etc'),
+            self.make_file('b', 'cn=b,cn=etc', members=[member]),
+        ) == [['a'], ['b']]
+
+    def test_barriers(self):
+        assert self.get_batches(
+            self.make_file('a', 'cn=a,cn=etc'),
+            ('b', [{'dn': DN('cn=b,cn=config'), 'updates': []}]),
+            self.make_file('c', 'cn=c,cn=etc'),
+            self.make_file('d', 'cn=d,cn=etc', plugin='update_d'),
+            self.make_file('e', 'cn=e,cn=etc'),
+        ) == [['a'], ['b'], ['c'], ['d'], ['e']]
@@ -23,6 +23,8 @@ Test the `ipalib.frontend` module.
 
 # FIXME: Pylint errors
 # pylint: disable=no-member
+import time
+
 import pytest
 import six
 
@@ -34,6 +36,7 @@ from ipalib.base import NameSpace
 from ipalib import frontend, backend, plugable, errors, parameters, config
 from ipalib import output, messages
 from ipalib.parameters import Str
+from ipapython.ipautil import APIVersion
 from ipapython.version import API_VERSION
 
 if six.PY3:
@@ -468,6 +471,169 @@ class test_Command(ClassChecker):
         assert 'option2' in e
         assert e['option2'] == u'some value'
 
+    def test_call_plan(self):
+        """
+        Test the parameter pipeline compiled by `Command._on_finalize`.
+        """
+        class my_cmd(self.cls):
+            takes_args = (
+                Str('uid', normalizer=lambda value: value.lower()),
+            )
+            takes_options = (
+                Str('first'),
+                Str('last'),
+                Str('cn', default_from=lambda first, last: first + last),
+                Str('gecos', default_from=lambda cn: cn),
+                Str('mail*'),
+                parameters.Int('uidnumber?', minvalue=1),
+                parameters.Flag('rights', autofill=True, default=False),
+            )
+
+            def execute(self, *args, **options):
+                return dict(result=(args, options))
+
+        api, _home = create_test_api(in_server=True)
+        api.finalize()
+        o = my_cmd(api)
+        o.finalize()
+        plan = o._call_plan
+        assert set(plan.normalizers) == {'uid'}
+        assert plan.default_deps['cn'] == {'first', 'last'}
+        assert plan.default_deps['gecos'] == {'cn', 'first', 'last'}
+        assert 'rights' in plan.autofill_names
+        assert 'uidnumber' not in plan.autofill_names
+
+        out = o(u'JDoe', first=u'John', last=u'Doe', mail=u'jdoe@ipa.test',
+                uidnumber=u'1000', version=API_VERSION)
+        args, options = out['result']
+        assert args == (u'jdoe',)
+        assert options['cn'] == u'JohnDoe'
+        assert options['gecos'] == u'JohnDoe'
+        assert options['mail'] == (u'jdoe@ipa.test',)
+        assert options['uidnumber'] == 1000
+        assert options['rights'] is False
+
+        e = raises(errors.ValidationError, o, u'jdoe', first=u'John',
+                   last=u'Doe', uidnumber=0, version=API_VERSION)
+        assert e.name == 'uidnumber'
+        e = raises(errors.RequirementError, o, u'jdoe', first=u'John',
+                   version=API_VERSION)
+        assert e.name == 'last'
+
+    @pytest.mark.benchmark
+    def test_call_plan_benchmark(self):
+        """
+        Compare the compiled parameter pipeline with the generic one on
+        commands shaped like user_show and host_find.
+        """
+        executed = []
+
+        class user_show(self.cls):
+            takes_args = (
+                Str('uid', normalizer=lambda value: value.lower()),
+            )
+            takes_options = (
+                parameters.Flag('rights', autofill=True, default=False),
+                Str('out?'),
+                parameters.Flag('no_members', autofill=True, default=False),
+            )
+            has_output = output.standard_entry
+
+            def execute(self, *args, **options):
+                executed.append((args, options))
+                return dict(result={'uid': args}, value=args[0], summary=None)
+
+        class host_find(self.cls):
+            takes_args = (Str('criteria?'),)
+            takes_options = tuple(
+                Str('%s?' % name) for name in (
+                    'fqdn', 'description', 'l', 'nshostlocation',
+                    'nshardwareplatform', 'nsosversion', 'userclass',
+                    'ipaassignedidview', 'krbcanonicalname')
+            ) + tuple(
+                Str('%s*' % name) for name in (
+                    'macaddress', 'in_hostgroup', 'not_in_hostgroup',
+                    'in_netgroup', 'not_in_netgroup', 'in_role',
+                    'not_in_role', 'in_hbacrule', 'not_in_hbacrule',
+                    'in_sudorule', 'not_in_sudorule', 'enroledby_user',
+                    'not_enroledby_user', 'man_by_host', 'not_man_by_host',
+                    'man_host', 'not_man_host')
+            ) + (
+                parameters.Int('timelimit?', minvalue=0),
+                parameters.Int('sizelimit?', minvalue=0),
+                parameters.Flag('pkey_only?', autofill=True, default=False),
+            )
+            has_output = output.standard_list_of_entries
+
+            def execute(self, *args, **options):
+                executed.append((args, options))
+                return dict(result=(), count=0, truncated=False, summary=None)
+
+        def generic_call(cmd, *args, **options):
+            # the request path of Command.__call__ without the call plan,
+            # for commands whose parameters have no default_from
+            APIVersion(options['version'])
+            APIVersion(cmd.api_version)
+            params = dict((name, options.pop(name)) for name in cmd.params
+                          if name in options)
+            params.update(zip(cmd.args, args))
+            ', '.join(cmd._repr_iter(**params))
+            missing = [p.name for p in cmd.params()
+                       if p.name not in params and (p.required or p.autofill)]
+            dep = set()
+            for param in reversed(cmd.params_by_default):
+                if param.name in missing or param.name in dep:
+                    if param.default_from is not None:
+                        dep.update(param.default_from.keys)
+            for param in cmd.params_by_default():
+                if param.name in missing:
+                    params[param.name] = param.get_default(**params)
+            params = dict((k, cmd.params[k].normalize(v))
+                          for (k, v) in params.items())
+            params = dict((k, cmd.params[k].convert(v))
+                          for (k, v) in params.items())
+            ', '.join(cmd._repr_iter(**params))
+            for param in cmd.params():
+                param.validate(params.get(param.name),
+                               supplied=param.name in params)
+            args, options = cmd.params_2_args_options(**params)
+            ret = cmd.run(*args, **options)
+            if set(ret) != set(cmd.output):
+                raise ValueError(ret)
+            for o in cmd.output():
+                if callable(o.validate):
+                    o.validate(cmd, ret[o.name], API_VERSION)
+            return ret
+
+        api, _home = create_test_api(in_server=True)
+        api.finalize()
+        calls = (
+            (user_show, (u'Admin',), dict(all=True)),
+            (host_find, (u'ipa',), dict(sizelimit=u'100', in_hostgroup=u'hg',
+                                        pkey_only=True)),
+        )
+        count = 2000
+        for cls, args, options in calls:
+            o = cls(api)
+            o.finalize()
+            options = dict(options, version=API_VERSION)
+
+            del executed[:]
+            generic_call(o, *args, **options)
+            o(*args, **options)
+            assert executed[0] == executed[1]
+
+            start = time.time()
+            for _i in range(count):
+                generic_call(o, *args, **options)
+            generic = time.time() - start
+            start = time.time()
+            for _i in range(count):
+                o(*args, **options)
+            compiled = time.time() - start
+            print('%s: generic %.1f us/call, compiled %.1f us/call' % (
+                o.name, generic / count * 1e6, compiled / count * 1e6))
+
     def test_validate(self):
         """
         Test the `ipalib.frontend.Command.validate` method.
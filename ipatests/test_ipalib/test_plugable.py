@@ -26,8 +26,10 @@ Test the `ipalib.plugable` module.
 
 import os
 import textwrap
+import threading
+import time
 
-from ipalib import plugable, errors, create_api
+from ipalib import plugable, errors, create_api, frontend, parameters
 from ipatests.util import raises, read_only
 from ipatests.util import ClassChecker, create_test_api, TempHome
 
@@ -241,6 +243,83 @@ class test_API(ClassChecker):
         e = raises(Exception, api.finalize)
         assert str(e) == 'API.finalize() already called', str(e)
 
+    def test_plugins_on_demand(self):
+        """
+        Test on-demand instantiation and finalization of server plugins.
+        """
+        instances = []
+
+        class base0(plugable.Plugin):
+            def __init__(self, api):
+                super(base0, self).__init__(api)
+                # give concurrent lookups a chance to race
+                time.sleep(0.01)
+                instances.append(self)
+
+        class API(plugable.API):
+            bases = (base0,)
+            modules = ()
+
+        api = API()
+        api.env.mode = 'unit_test'
+        api.env.in_tree = True
+        api.env.in_server = True
+        api.env.plugins_on_demand = True
+
+        class base0_plugin0(base0):
+            finalized = plugable.Plugin.finalize_attr('finalized')
+
+            def _on_finalize(self):
+                self.finalized = True
+                super(base0_plugin0, self)._on_finalize()
+        api.add_plugin(base0_plugin0)
+
+        api.finalize()
+        assert instances == []
+
+        results = []
+        threads = [
+            threading.Thread(
+                target=lambda: results.append(api.base0.base0_plugin0))
+            for _i in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert len(instances) == 1
+        assert all(result is instances[0] for result in results)
+        assert instances[0].__dict__['finalized'] is True
+
+    def test_plugins_on_demand_methods(self):
+        """
+        Test on-demand finalization of an object and its methods.
+        """
+        class API(plugable.API):
+            bases = (frontend.Object, frontend.Method)
+            modules = ()
+
+        api = API()
+        api.env.mode = 'unit_test'
+        api.env.in_tree = True
+        api.env.in_server = True
+        api.env.plugins_on_demand = True
+
+        class thing(frontend.Object):
+            takes_params = (parameters.Str('name', primary_key=True),)
+        api.add_plugin(thing)
+
+        class thing_show(frontend.Method):
+            def get_args(self):
+                yield self.obj.primary_key
+        api.add_plugin(thing_show)
+
+        api.finalize()
+        # the object does not finalize its methods, which refer back to it
+        assert list(api.Object.thing.methods) == ['show']
+        assert list(api.Method.thing_show.args) == ['name']
+
     def test_bootstrap(self):
         """
         Test the `ipalib.plugable.API.bootstrap` method.
@@ -22,7 +22,15 @@ Test the `ipalib.rpc` module.
 """
 from __future__ import print_function
 
+import datetime
+import gc
+import gzip
+import socket
+import threading
+import time
+import tracemalloc
 import unittest
+from io import BytesIO
 from xmlrpc.client import Binary, Fault, dumps, loads
 import urllib
 
@@ -35,6 +43,7 @@ from ipatests.data import binary_bytes, utf8_bytes, unicode_str
 from ipalib.frontend import Command
 from ipalib.request import context, Connection
 from ipalib import rpc, errors, api, request
+from ipapython.dn import DN
 from ipapython.version import API_VERSION
 
 if six.PY3:
@@ -199,6 +208,239 @@ def test_xml_loads():
         assert type(e.faultString) is unicode
 
 
+def make_host_find_response(count):
+    """
+    Return a JSON-RPC response like the one of host_find --all.
+    """
+    entries = []
+    for i in range(count):
+        fqdn = u'host%d.ipa.test' % i
+        entries.append({
+            'dn': DN(('fqdn', fqdn), ('cn', 'computers'), ('cn', 'accounts'),
+                     ('dc', 'ipa'), ('dc', 'test')),
+            'fqdn': (fqdn,),
+            'description': (u'Host n\xb0%d' % i,),
+            'krbprincipalname': (u'host/%s@IPA.TEST' % fqdn,),
+            'krbcanonicalname': (u'host/%s@IPA.TEST' % fqdn,),
+            'has_keytab': True,
+            'has_password': False,
+            'managedby_host': (fqdn,),
+            'krblastpwdchange': (datetime.datetime(2026, 1, 1, 12, 0, i % 60),),
+            'ipauniqueid': (u'%08d-0000-0000-0000-000000000000' % i,),
+            'ipakrbokasdelegate': False,
+            'objectclass': (u'ipaobject', u'nshost', u'ipahost', u'pkiuser',
+                            u'ipaservice', u'krbprincipalaux', u'top'),
+            'usercertificate': (b'\x30\x82' + bytes(bytearray(range(256))),),
+        })
+    return dict(
+        result=dict(result=tuple(entries), count=count, truncated=False,
+                    summary=u'%d hosts matched' % count),
+        error=None,
+        id=0,
+        principal=u'admin@IPA.TEST',
+        version=u'4.12.0',
+    )
+
+
+def test_json_iterencode_binary():
+    """
+    Test the `ipalib.rpc.json_iterencode_binary` function.
+    """
+    values = [
+        None, True, 1, 1.5, u'', unicode_str, binary_bytes, [], {},
+        [unicode_str] * 200, {1: u'one', u'two': [None, 2.0]},
+        make_host_find_response(rpc.JSON_STREAM_MIN_ITEMS + 1),
+    ]
+    for value in values:
+        expected = rpc.json_encode_binary(value, API_VERSION)
+        chunks = list(rpc.json_iterencode_binary(value, API_VERSION,
+                                                 chunk_size=1024))
+        assert all(type(chunk) is bytes for chunk in chunks)
+        assert all(len(chunk) >= 1024 for chunk in chunks[:-1])
+        assert b''.join(chunks).decode('utf-8') == expected
+
+    # old clients get datetime values as strings
+    value = make_host_find_response(1)
+    assert (b''.join(rpc.json_iterencode_binary(value, u'2.50')) ==
+            rpc.json_encode_binary(value, u'2.50').encode('utf-8'))
+
+
+@pytest.mark.benchmark
+def test_json_iterencode_benchmark():
+    """
+    Compare memory used to encode a large response at once and incrementally
+    """
+    value = make_host_find_response(10000)
+
+    def measure(encode):
+        gc.collect()
+        tracemalloc.start()
+        try:
+            start = time.time()
+            size = 0
+            for chunk in encode():
+                size += len(chunk)
+            duration = time.time() - start
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        return size, peak, duration
+
+    size, peak, duration = measure(lambda: [
+        rpc.json_encode_binary(value, API_VERSION).encode('utf-8')])
+    iter_size, iter_peak, iter_duration = measure(
+        lambda: rpc.json_iterencode_binary(value, API_VERSION))
+    print('%d bytes at once: peak %d KiB in %.2fs, incrementally: peak %d '
+          'KiB in %.2fs' % (size, peak // 1024, duration, iter_peak // 1024,
+                            iter_duration))
+    assert iter_size == size
+    assert iter_peak < peak / 4
+
+
+class FakeConnection:
+    def __init__(self):
+        self.headers = {}
+        self.body = None
+
+    def putheader(self, name, value):
+        self.headers[name] = value
+
+    def endheaders(self, body):
+        self.body = body
+
+
+class FakeResponse(BytesIO):
+    def __init__(self, body, headers):
+        super(FakeResponse, self).__init__(body)
+        self.headers = headers
+
+    def getheader(self, name, default=None):
+        return self.headers.get(name, default)
+
+
+def test_transport_compression():
+    """
+    Test request compression of `ipalib.rpc.MultiProtocolTransport`.
+    """
+    transport = rpc.MultiProtocolTransport(protocol='json')
+    transport.verbose = 0
+    body = b'{"method": "ping", "params": [[], {}]}' * 200
+
+    # requests are not compressed until the server accepts it
+    conn = FakeConnection()
+    transport.send_content(conn, body)
+    assert 'Content-Encoding' not in conn.headers
+    assert conn.body == body
+
+    assert transport.parse_response(FakeResponse(b'{}', {})) == b'{}'
+    transport.send_content(FakeConnection(), body)
+    assert transport.encode_threshold is None
+
+    response = FakeResponse(gzip.compress(b'{}'), {
+        'Accept-Encoding': 'gzip', 'Content-Encoding': 'gzip'})
+    assert transport.parse_response(response) == b'{}'
+    assert transport.encode_threshold == api.env.rpc_compress_threshold
+
+    conn = FakeConnection()
+    transport.send_content(conn, body)
+    assert conn.headers['Content-Encoding'] == 'gzip'
+    assert conn.headers['Content-Length'] == str(len(conn.body))
+    assert gzip.decompress(conn.body) == body
+
+    # small requests are sent as they are
+    conn = FakeConnection()
+    transport.send_content(conn, b'{}')
+    assert 'Content-Encoding' not in conn.headers
+
+
+class FakeHTTPSConnection:
+    def __init__(self, host=None):
+        self.host = host
+        self.sock, self.peer = socket.socketpair()
+
+    def connect(self):
+        pass
+
+    def close(self):
+        if self.sock is not None:
+            self.sock.close()
+            self.peer.close()
+            self.sock = None
+
+
+class TestHTTPSConnectionPool:
+    def test_reuse(self):
+        pool = rpc.HTTPSConnectionPool(2, 20)
+        conn = FakeHTTPSConnection()
+        pool.add(conn)
+        assert pool.get('key') is None
+        pool.put('key', conn)
+        assert pool.get('other') is None
+        assert pool.get('key') is conn
+        assert pool.get('key') is None
+        assert pool.stats() == dict(created=1, reused=1, evictions=0, idle=0)
+
+    def test_evictions(self):
+        pool = rpc.HTTPSConnectionPool(2, 20)
+        conns = [FakeHTTPSConnection() for _i in range(3)]
+        for conn in conns:
+            pool.put('key', conn)
+        # the pool is full
+        assert conns[2].sock is None
+
+        # connection closed by the server
+        conns[1].peer.close()
+        assert pool.get('key') is conns[0]
+        assert conns[1].sock is None
+        assert pool.stats() == dict(created=0, reused=1, evictions=2, idle=0)
+
+        # closed connections are not pooled
+        pool.put('key', conns[1])
+        assert pool.stats()['idle'] == 0
+
+    def test_idle_timeout(self):
+        pool = rpc.HTTPSConnectionPool(2, 0)
+        conn = FakeHTTPSConnection()
+        pool.put('key', conn)
+        assert pool.get('key') is None
+        assert conn.sock is None
+        assert pool.stats()['evictions'] == 1
+
+    def test_transport(self, monkeypatch):
+        pool = rpc.HTTPSConnectionPool(2, 20)
+        monkeypatch.setattr(rpc, '_connection_pool', pool)
+        monkeypatch.setattr(rpc, 'create_https_connection',
+                            lambda host, *args, **kwargs:
+                            FakeHTTPSConnection(host))
+
+        transports = []
+        for _i in range(3):
+            transport = rpc.SSLTransport(protocol='json')
+            conn = transport.make_connection('ipa.example.test')
+            assert transport.make_connection('ipa.example.test') is conn
+            transport.release()
+            transports.append(conn)
+        assert transports[0] is transports[1] is transports[2]
+        assert pool.stats() == dict(created=1, reused=2, evictions=0, idle=1)
+
+        # a connection which failed is not returned to the pool
+        transport = rpc.SSLTransport(protocol='json')
+        conn = transport.make_connection('ipa.example.test')
+        transport.close()
+        transport.release()
+        assert conn.sock is None
+        assert pool.stats()['idle'] == 0
+
+        # the server closed the idle connection, a new one is created
+        transport = rpc.SSLTransport(protocol='json')
+        first = transport.make_connection('ipa.example.test')
+        transport.release()
+        first.peer.close()
+        transport = rpc.SSLTransport(protocol='json')
+        assert transport.make_connection('ipa.example.test') is not first
+        assert pool.stats() == dict(created=3, reused=3, evictions=1, idle=0)
+
+
 class test_xmlclient(PluginTester):
     """
     Test the `ipalib.rpc.xmlclient` plugin.
@@ -258,6 +500,142 @@ class test_xmlclient(PluginTester):
         assert context.xmlclient.conn._calledall() is True
 
 
+class FakeServerProxy:
+    active = 0
+    max_active = 0
+    lock = threading.Lock()
+
+    def __init__(self, calls):
+        self.calls = calls
+        # the thread which created the connection
+        self.owner = threading.current_thread().name
+
+    def __getattr__(self, name):
+        def command(args, options):
+            self.calls.append((threading.current_thread().name, args[0],
+                               self.owner))
+            cls = type(self)
+            with cls.lock:
+                cls.active += 1
+                cls.max_active = max(cls.max_active, cls.active)
+            time.sleep(0.01)
+            with cls.lock:
+                cls.active -= 1
+            if args[0] == u'missing.example.test':
+                raise Fault(4001, u'missing.example.test: host not found')
+            return {'result': {'fqdn': args[0]}, 'value': args[0]}
+        return command
+
+
+class fake_jsonclient(rpc.jsonclient):
+    calls = []
+    connections = []
+    disconnects = []
+
+    def create_connection(self, *args, **kw):
+        self.connections.append(kw)
+        return FakeServerProxy(self.calls)
+
+    def destroy_connection(self):
+        self.disconnects.append(threading.current_thread().name)
+
+
+class test_forward_many(PluginTester):
+    """
+    Test the `ipalib.rpc.RPCClient.forward_many` method.
+    """
+    _plugin = fake_jsonclient
+
+    @pytest.fixture(autouse=True)
+    def reset(self):
+        del fake_jsonclient.calls[:]
+        del fake_jsonclient.connections[:]
+        del fake_jsonclient.disconnects[:]
+        FakeServerProxy.max_active = 0
+
+    def test_results(self):
+        o, _api, _home = self.instance('Backend', in_server=False)
+        names = [u'host%d.example.test' % i for i in range(50)]
+        calls = [('host_show', (name,), {}) for name in names]
+
+        results = o.forward_many(calls, max_workers=5)
+        assert results == [
+            {'result': {'fqdn': name}, 'value': name} for name in names]
+        assert sorted(c[1] for c in fake_jsonclient.calls) == sorted(names)
+        # every worker forwards its calls over a single connection, which
+        # is closed when all calls are done
+        workers = set(c[0] for c in fake_jsonclient.calls)
+        assert len(workers) <= 5
+        assert len(fake_jsonclient.connections) == len(workers)
+        assert sorted(fake_jsonclient.disconnects) == sorted(workers)
+        assert not o.isconnected()
+
+    def test_thread_connections(self):
+        o, _api, _home = self.instance('Backend', in_server=False)
+        conn = rpc.JSONServerProxy('https://ipa.example.test/ipa/json',
+                                   None, 'UTF-8', 0, True)
+        setattr(context, o.id, Connection(conn, lambda: None))
+        calls = [('host_show', (u'host%d.example.test' % i,), {})
+                 for i in range(20)]
+
+        o.forward_many(calls, max_workers=4)
+        # the workers ran concurrently on the shared plugin, each of them
+        # connected in its own thread and used only its own connection
+        assert FakeServerProxy.max_active > 1
+        assert all(thread == owner
+                   for thread, _name, owner in fake_jsonclient.calls)
+        assert len(fake_jsonclient.connections) > 1
+        # the connection of the calling thread is kept
+        assert o.conn is conn
+
+    @pytest.mark.benchmark
+    def test_benchmark(self):
+        o, _api, _home = self.instance('Backend', in_server=False)
+        names = [u'host%d.example.test' % i for i in range(50)]
+        calls = [('host_show', (name,), {}) for name in names]
+
+        start = time.time()
+        o.forward_many(calls, max_workers=5)
+        duration = time.time() - start
+        print('50 calls over 5 connections in %.2fs' % duration)
+        # each call takes 10 ms, forwarding them one after another would
+        # take 0.5 s
+        assert duration < 0.25
+
+    def test_errors(self):
+        o, _api, _home = self.instance('Backend', in_server=False)
+        calls = [('host_show', (u'host%d.example.test' % i,), {})
+                 for i in range(10)]
+        calls[3] = ('host_show', (u'missing.example.test',), {})
+
+        results = o.forward_many(calls, max_workers=2,
+                                 return_exceptions=True)
+        assert isinstance(results[3], errors.NotFound)
+        assert results[4]['value'] == u'host4.example.test'
+        assert len(fake_jsonclient.calls) == 10
+
+        with pytest.raises(errors.NotFound):
+            o.forward_many(calls, max_workers=2)
+        assert (len(fake_jsonclient.disconnects) ==
+                len(fake_jsonclient.connections))
+
+    def test_connect_kw(self):
+        o, _api, _home = self.instance('Backend', in_server=False)
+        transport = rpc.DelegatedKerbTransport(protocol='json',
+                                               ccache='FILE:/tmp/ccache')
+        conn = rpc.JSONServerProxy('https://ipa.example.test/ipa/json',
+                                   transport, 'UTF-8', 0, True)
+        setattr(context, o.id, Connection(conn, lambda: None))
+        context.ca_certfile = '/etc/ipa/ca.crt'
+
+        o.forward_many([('host_show', (u'host.example.test',), {})])
+        # workers authenticate the same way as the calling thread
+        assert fake_jsonclient.connections == [dict(
+            ca_certfile='/etc/ipa/ca.crt', ccache='FILE:/tmp/ccache',
+            delegate=True)]
+        assert o.conn is conn
+
+
 @pytest.mark.skip_ipaclient_unittest
 @pytest.mark.needs_ipaapi
 class test_xml_introspection:
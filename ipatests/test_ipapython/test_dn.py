@@ -1,5 +1,6 @@
 
 import contextlib
+import timeit
 import unittest
 import pytest
 
@@ -7,6 +8,7 @@ from cryptography import x509
 import six
 
 from ipapython.dn import DN, RDN, AVA, str2dn, dn2str, DECODING_ERROR
+from ipapython.dn import _str2dn_sorted
 from ipapython import dn_ctypes
 
 
@@ -1437,5 +1439,80 @@ def test_dn2str_special():
     assert dn_ctypes.dn2str(dn) == dnstring2
 
 
+def test_parse_cache():
+    dnstring = 'uid=Cached+cn=User,cn=users,cn=accounts,dc=example,dc=test'
+    _str2dn_sorted.cache_clear()
+    dn1 = DN(dnstring)
+    dn2 = DN(dnstring)
+    assert _str2dn_sorted.cache_info().hits == 1
+    assert dn1 == dn2
+    assert dn1.rdns == dn2.rdns
+    # parsed RDN's are not shared between DN objects
+    assert dn1.rdns[0] is not dn2.rdns[0]
+    assert dn1.rdns[0][0] is not dn2.rdns[0][0]
+    assert dn1[0] == RDN(('cn', 'User'), ('uid', 'Cached'))
+
+
+def test_normalized_key():
+    dn1 = DN('cn=Foo+uid=Bar,cn=users,DC=Example,dc=test')
+    dn2 = DN(RDN(('UID', 'bar'), ('cn', 'foo')), 'cn=USERS',
+             'dc=example,dc=Test')
+    assert dn1._get_key() == dn2._get_key()
+    assert dn1._get_key() is dn1._get_key()
+    assert hash(dn1) == hash(dn2)
+    assert dn1[1:]._get_key() == DN('cn=users,dc=example,dc=test')._get_key()
+    assert dn1.endswith(DN('dc=example,dc=test'))
+    assert not dn1.endswith(DN('cn=groups,dc=example,dc=test'))
+
+
+@pytest.mark.benchmark
+class TestDNBenchmark:
+    """
+    Micro-benchmarks of the DN operations used on every LDAP entry
+
+    The results are printed; run with -s to see them.
+    """
+    number = 10000
+
+    entry_dn = 'uid=admin,cn=users,cn=accounts,dc=example,dc=test'
+    container_dn = 'cn=users,cn=accounts,dc=example,dc=test'
+
+    def bench(self, name, stmt):
+        elapsed = timeit.timeit(stmt, number=self.number)
+        print('%-30s %8.2f us' % (name, elapsed / self.number * 1e6))
+
+    def test_parse(self):
+        self.bench('parse (cached)', lambda: DN(self.entry_dn))
+
+        def parse_uncached():
+            _str2dn_sorted.cache_clear()
+            DN(self.entry_dn)
+
+        self.bench('parse (uncached)', parse_uncached)
+        self.bench('construct from tuples', lambda: DN(
+            ('uid', 'admin'), ('cn', 'users'), ('cn', 'accounts'),
+            ('dc', 'example'), ('dc', 'test')))
+
+    def test_compare(self):
+        dn1 = DN(self.entry_dn)
+        dn2 = DN(self.entry_dn.upper())
+        container = DN(self.container_dn)
+        other = DN('cn=groups,cn=accounts,dc=example,dc=test')
+
+        self.bench('__eq__', lambda: dn1 == dn2)
+        self.bench('__eq__ (str)', lambda: dn1 == self.entry_dn)
+        self.bench('__hash__', lambda: hash(dn1))
+        self.bench('endswith (match)', lambda: dn1.endswith(container))
+        self.bench('endswith (mismatch)', lambda: dn1.endswith(other))
+        self.bench('__contains__', lambda: container in dn1)
+        self.bench('set lookup', lambda: dn2 in {dn1, container})
+
+    def test_slice(self):
+        dn = DN(self.entry_dn)
+        self.bench('__getitem__ (slice)', lambda: dn[1:])
+        self.bench('__getitem__ (attr)', lambda: dn['uid'])
+        self.bench('__str__', lambda: str(dn))
+
+
 if __name__ == '__main__':
     unittest.main()
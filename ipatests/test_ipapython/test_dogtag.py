@@ -0,0 +1,146 @@
+#
+# Copyright (C) 2026  FreeIPA Contributors see COPYING for license
+#
+
+"""
+Tests for keep-alive connections of the ipapython.dogtag module
+"""
+
+import http.client
+import socket
+
+import pytest
+
+from ipalib.errors import NetworkError
+from ipalib.util import HTTPSConnectionPool
+from ipapython import dogtag
+
+pytestmark = pytest.mark.tier0
+
+
+class FakeResponse:
+    def __init__(self, will_close):
+        self.status = 200
+        self.msg = {}
+        self.will_close = will_close
+
+    def read(self):
+        return b'{}'
+
+    def getheader(self, name, default=None):
+        return default
+
+
+class FakeHTTPSConnection:
+    def __init__(self, host, port, will_close=False):
+        self.sock, self.peer = socket.socketpair()
+        self.will_close = will_close
+        self.requests = []
+        self.reset = False
+        self.disconnected = False
+
+    def request(self, method, path, body=None, headers=None):
+        if self.reset:
+            raise ConnectionResetError(104, 'Connection reset by peer')
+        self.requests.append((method, path))
+
+    def getresponse(self):
+        if self.disconnected:
+            raise http.client.RemoteDisconnected(
+                'Remote end closed connection without response')
+        return FakeResponse(self.will_close)
+
+    def close(self):
+        if self.sock is not None:
+            self.sock.close()
+            self.peer.close()
+            self.sock = None
+
+
+class TestPooledRequest:
+    @pytest.fixture(autouse=True)
+    def setup_pool(self, monkeypatch):
+        self.pool = HTTPSConnectionPool(2, 15)
+        self.connections = []
+        monkeypatch.setattr(dogtag, 'request_stats', dogtag.RequestStats())
+
+    def factory(self, host, port, **kw):
+        conn = FakeHTTPSConnection(host, port, **kw)
+        self.connections.append(conn)
+        return conn
+
+    def request(self, path='/ca/rest/certs/1', method='GET', **kw):
+        return dogtag._httplib_request(
+            'https', 'ca.example.test', 8443, path, self.factory, '',
+            method=method, connection_pool=self.pool, pool_key='key', **kw)
+
+    def test_reuse(self):
+        for _i in range(3):
+            status, _headers, body = self.request()
+            assert status == 200
+            assert body == b'{}'
+        conn, = self.connections
+        assert len(conn.requests) == 3
+        assert self.pool.stats() == dict(
+            created=1, reused=2, evictions=0, idle=1)
+
+        stats = dogtag.request_stats.stats()['GET /ca/rest/certs/1']
+        assert stats['count'] == 3
+        assert stats['reused'] == 2
+        assert stats['max'] <= stats['total']
+
+    def test_reconnect(self):
+        self.request()
+        # the server closed the connection while it was idle
+        self.connections[0].reset = True
+        self.request()
+        assert len(self.connections) == 2
+        assert self.connections[0].sock is None
+        assert self.connections[1].requests == [('GET', '/ca/rest/certs/1')]
+        assert self.pool.stats()['idle'] == 1
+
+    def test_reconnect_sent(self):
+        self.request()
+        # the server closed the connection after receiving the request
+        self.connections[0].disconnected = True
+        self.request()
+        assert len(self.connections) == 2
+        assert self.connections[1].requests == [('GET', '/ca/rest/certs/1')]
+
+        # a request which is not idempotent is not sent again
+        self.connections[1].disconnected = True
+        with pytest.raises(NetworkError):
+            self.request('/ca/rest/certrequests', method='POST')
+        assert len(self.connections) == 2
+        assert self.connections[1].sock is None
+
+        # unless it was not sent at all
+        self.request()
+        self.connections[2].reset = True
+        self.request('/ca/rest/certrequests', method='POST')
+        assert len(self.connections) == 4
+        assert self.connections[3].requests == [
+            ('POST', '/ca/rest/certrequests')]
+
+    def test_error(self):
+        def factory(host, port):
+            conn = self.factory(host, port)
+            conn.reset = True
+            return conn
+
+        with pytest.raises(NetworkError):
+            dogtag._httplib_request(
+                'https', 'ca.example.test', 8443, '/ca/rest/certs/1',
+                factory, '', method='GET', connection_pool=self.pool,
+                pool_key='key')
+        # new connections are not retried
+        conn, = self.connections
+        assert conn.sock is None
+        assert self.pool.stats()['idle'] == 0
+
+    def test_connection_close(self):
+        self.request(connection_options=dict(will_close=True))
+        self.request(connection_options=dict(will_close=True))
+        assert len(self.connections) == 2
+        assert all(conn.sock is None for conn in self.connections)
+        assert self.pool.stats()['idle'] == 0
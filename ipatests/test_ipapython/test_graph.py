@@ -0,0 +1,58 @@
+#
+# Copyright (C) 2026  FreeIPA Contributors see COPYING for license
+#
+
+"""
+Tests for the ipapython.graph module
+"""
+
+import pytest
+
+from ipatests.util import make_graph
+
+pytestmark = pytest.mark.tier0
+
+
+def test_heads_and_tails():
+    graph = make_graph('abc', [('a', 'b'), ('a', 'c'), ('c', 'b')],
+                       both=False)
+    assert sorted(graph.get_heads('a')) == ['b', 'c']
+    assert sorted(graph.get_tails('b')) == ['a', 'c']
+    assert graph.get_tails('a') == []
+    assert sorted(graph.edges) == [('a', 'b'), ('a', 'c'), ('c', 'b')]
+    assert not graph.is_symmetric()
+
+
+def test_remove():
+    graph = make_graph('abc', [('a', 'b'), ('b', 'c')])
+    assert graph.is_symmetric()
+    graph.remove_edge('a', 'b')
+    assert graph.get_tails('b') == ['c']
+    with pytest.raises(ValueError):
+        graph.remove_edge('a', 'b')
+
+    graph.remove_vertex('c')
+    assert graph.vertices == {'a', 'b'}
+    assert graph.get_heads('b') == ['a']
+    assert graph.get_tails('b') == []
+    assert graph.edges == [('b', 'a')]
+    with pytest.raises(ValueError):
+        graph.remove_vertex('c')
+
+
+def test_reachable():
+    graph = make_graph('abcd', [('a', 'b'), ('b', 'a'), ('b', 'c')],
+                       both=False)
+    reachable = graph.get_reachable()
+    assert reachable['a'] == {'a', 'b', 'c'}
+    assert reachable['c'] == {'c'}
+    assert reachable['d'] == {'d'}
+    assert graph.get_reachable(exclude='b')['a'] == {'a'}
+    for vertex in graph.vertices:
+        assert reachable[vertex] == graph.bfs(vertex)
+
+
+def test_articulation_points():
+    graph = make_graph('abcde', [('a', 'b'), ('b', 'c'), ('c', 'a'),
+                                 ('c', 'd'), ('d', 'e')])
+    assert graph.get_articulation_points() == {'c', 'd'}
@@ -0,0 +1,286 @@
+#
+# Copyright (C) 2026  FreeIPA Contributors see COPYING for license
+#
+
+"""
+Tests for the ipapython.ipaldap module
+"""
+
+from __future__ import absolute_import
+
+import gc
+import tracemalloc
+
+import ldap
+import pytest
+from ldap.controls import SimplePagedResultsControl
+from ldap.schema import AttributeType
+
+from ipapython.dn import DN
+from ipapython.ipaldap import (
+    LDAPClient, LDAPEntry, ReadOnlyLDAPEntry, SchemaCache)
+
+pytestmark = pytest.mark.tier0
+
+URL = 'ldap://ipa.example.test'
+
+SCHEMA = {
+    'attributeTypes': [
+        b"( 2.5.4.3 NAME 'cn' SUP name )",
+        b"( 2.5.4.41 NAME 'name' "
+        b"SYNTAX 1.3.6.1.4.1.1466.115.121.1.15 )",
+        b"( 1.3.6.1.1.1.1.0 NAME 'uidNumber' EQUALITY integerMatch "
+        b"ORDERING integerOrderingMatch "
+        b"SYNTAX 1.3.6.1.4.1.1466.115.121.1.27 )",
+        b"( 2.16.840.1.113730.3.8.99.1 NAME 'ipaTestNumber' "
+        b"SUP uidNumber )",
+    ],
+    'objectClasses': [
+        b"( 2.5.6.0 NAME 'top' ABSTRACT MUST objectClass )",
+    ],
+}
+
+
+class FakeConnection:
+    def __init__(self, csn=b'5f0000000000'):
+        self.csn = csn
+        self.searches = 0
+        self.schema_searches = 0
+
+    def search_s(self, base, scope, attrlist=None):
+        self.searches += 1
+        version = {
+            'modifyTimestamp': [b'20260101000000Z'],
+            'nsSchemaCSN': [self.csn],
+        }
+        if attrlist == SchemaCache.version_attrs:
+            return [(base, version)]
+        self.schema_searches += 1
+        return [(base, dict(SCHEMA, **version))]
+
+
+def make_cache(tmpdir):
+    cache = SchemaCache()
+    cache.snapshot_dir = str(tmpdir)
+    return cache
+
+
+def test_schema_snapshot_shared(tmpdir):
+    conn = FakeConnection()
+    schema = make_cache(tmpdir).get_schema(URL, conn)
+    # the version is retrieved along with the schema
+    assert conn.searches == conn.schema_searches == 1
+    assert len(tmpdir.listdir()) == 1
+
+    # a second process loads the parsed schema from the snapshot
+    other = make_cache(tmpdir).get_schema(URL, conn)
+    assert conn.schema_searches == 1
+    assert conn.searches == 2
+    assert other.get_obj(AttributeType, 'cn') is not None
+    assert (sorted(other.listall(AttributeType)) ==
+            sorted(schema.listall(AttributeType)))
+
+
+def test_schema_snapshot_version_change(tmpdir):
+    make_cache(tmpdir).get_schema(URL, FakeConnection())
+
+    conn = FakeConnection(csn=b'5f0000000001')
+    make_cache(tmpdir).get_schema(URL, conn)
+    assert conn.schema_searches == 1
+
+    # the refreshed snapshot is used again
+    make_cache(tmpdir).get_schema(URL, conn)
+    assert conn.schema_searches == 1
+
+
+def test_schema_snapshot_corrupted(tmpdir):
+    make_cache(tmpdir).get_schema(URL, FakeConnection())
+    tmpdir.listdir()[0].write(b'garbage', mode='wb')
+
+    conn = FakeConnection()
+    schema = make_cache(tmpdir).get_schema(URL, conn)
+    assert conn.schema_searches == 1
+    assert schema.get_obj(AttributeType, 'cn') is not None
+
+
+def test_schema_snapshot_ldap_version(tmpdir, monkeypatch):
+    make_cache(tmpdir).get_schema(URL, FakeConnection())
+    snapshot, = tmpdir.listdir()
+
+    # a snapshot pickled with another python-ldap is not loaded
+    monkeypatch.setattr(ldap, '__version__', '0.0.0')
+    conn = FakeConnection()
+    make_cache(tmpdir).get_schema(URL, conn)
+    assert conn.schema_searches == 1
+    other, = [path for path in tmpdir.listdir() if path != snapshot]
+
+    # neither when it is found under the name of the current version
+    monkeypatch.undo()
+    other.copy(snapshot)
+    conn = FakeConnection()
+    make_cache(tmpdir).get_schema(URL, conn)
+    assert conn.schema_searches == 1
+
+
+def test_schema_snapshot_force_update(tmpdir):
+    conn = FakeConnection()
+    make_cache(tmpdir).get_schema(URL, conn)
+    make_cache(tmpdir).get_schema(URL, conn, force_update=True)
+    assert conn.schema_searches == 2
+
+
+def test_attribute_ordering(tmpdir):
+    schema = make_cache(tmpdir).get_schema(URL, FakeConnection())
+    conn = LDAPClient(None, no_schema=True)
+    conn._get_schema = lambda: schema
+    assert conn.get_attribute_ordering('uidNumber') == 'integerOrderingMatch'
+    # the ordering rule is inherited from the superior attribute type
+    assert conn.get_attribute_ordering('ipaTestNumber') == (
+        'integerOrderingMatch')
+    assert conn.get_attribute_ordering('cn') is None
+    assert conn.get_attribute_ordering('unknown') is None
+
+
+def make_user_results(count):
+    results = []
+    for i in range(count):
+        uid = 'user%d' % i
+        dn = 'uid=%s,cn=users,cn=accounts,dc=example,dc=test' % uid
+        results.append((dn, {
+            'objectClass': [b'top', b'person', b'organizationalperson',
+                            b'inetorgperson', b'inetuser', b'posixaccount',
+                            b'krbprincipalaux', b'krbticketpolicyaux',
+                            b'ipaobject', b'ipasshuser',
+                            b'ipaSshGroupOfPubKeys', b'mepOriginEntry'],
+            'uid': [uid.encode('utf-8')],
+            'givenName': [b'Test'],
+            'sn': [('User %d' % i).encode('utf-8')],
+            'cn': [('Test User %d' % i).encode('utf-8')],
+            'displayName': [('Test User %d' % i).encode('utf-8')],
+            'initials': [b'TU'],
+            'homeDirectory': [('/home/%s' % uid).encode('utf-8')],
+            'loginShell': [b'/bin/sh'],
+            'uidNumber': [str(10000 + i).encode('utf-8')],
+            'gidNumber': [str(10000 + i).encode('utf-8')],
+            'mail': [('%s@example.test' % uid).encode('utf-8')],
+            'krbPrincipalName': [
+                ('%s@EXAMPLE.TEST' % uid).encode('utf-8')],
+            'memberOf': [b'cn=ipausers,cn=groups,cn=accounts,'
+                         b'dc=example,dc=test'],
+            'ipaUniqueID': [('%08d-0000-0000-0000-000000000000' % i
+                             ).encode('utf-8')],
+        }))
+    return results
+
+
+class TestReadOnlyLDAPEntry:
+    @pytest.fixture
+    def conn(self):
+        return LDAPClient(None, no_schema=True)
+
+    def test_entry(self, conn):
+        entry, = conn._convert_result(make_user_results(1), read_only=True)
+        assert isinstance(entry, ReadOnlyLDAPEntry)
+        assert entry.dn == DN('uid=user0,cn=users,cn=accounts,'
+                              'dc=example,dc=test')
+        assert entry['uid'] == ['user0']
+        assert entry['UID'] is entry['uid']
+        assert entry.raw['givenname'] == [b'Test']
+        assert entry.single_value['sn'] == 'User 0'
+        assert 'loginshell' in entry
+        assert 'telephoneNumber' not in entry
+        assert entry.get('telephoneNumber') is None
+        assert len(entry) == 15
+        with pytest.raises(TypeError):
+            # pylint: disable=unsupported-assignment-operation
+            entry['uid'] = ['other']
+
+    def test_copy(self, conn):
+        entry, = conn._convert_result(make_user_results(1), read_only=True)
+        copy = entry.copy()
+        assert isinstance(copy, LDAPEntry)
+        assert copy.generate_modlist() == []
+        copy['loginShell'] = ['/bin/bash']
+        assert copy.generate_modlist() == [
+            (1, 'loginShell', [b'/bin/sh']), (0, 'loginShell', [b'/bin/bash'])]
+        assert entry['loginShell'] == ['/bin/sh']
+
+    @pytest.mark.benchmark
+    def test_memory_benchmark(self, conn):
+        """
+        Compare memory used by 10k user entries of both entry types
+        """
+        count = 10000
+
+        def measure(read_only):
+            results = make_user_results(count)
+            gc.collect()
+            tracemalloc.start()
+            try:
+                entries = conn._convert_result(results, read_only=read_only)
+                del results
+                gc.collect()
+                size = tracemalloc.get_traced_memory()[0]
+            finally:
+                tracemalloc.stop()
+            assert len(entries) == count
+            return size
+
+        ldap_entry_size = measure(read_only=False)
+        read_only_size = measure(read_only=True)
+        print('LDAPEntry: %d bytes/entry, ReadOnlyLDAPEntry: %d bytes/entry'
+              % (ldap_entry_size // count, read_only_size // count))
+        assert read_only_size < ldap_entry_size / 2
+
+
+class FakePagedConnection:
+    def __init__(self, results):
+        self.results = results
+        self.searches = []
+
+    def search_ext(self, base, scope, filterstr, attrlist, serverctrls,
+                   timeout):
+        ctrl, = serverctrls
+        self.searches.append((ctrl.size, ctrl.cookie))
+        return int(ctrl.cookie or 0)
+
+    def search_ext_s(self, base, scope, filterstr, attrlist, serverctrls,
+                     timeout):
+        ctrl, = serverctrls
+        self.searches.append((ctrl.size, ctrl.cookie))
+        return []
+
+    def result3(self, msgid, all=1):
+        # the message id is the offset of the page, entries are returned
+        # one by one followed by the search result with the next cookie
+        page_size = self.searches[-1][0]
+        pos = getattr(self, 'pos', msgid)
+        if pos < min(msgid + page_size, len(self.results)):
+            self.pos = pos + 1
+            return ldap.RES_SEARCH_ENTRY, [self.results[pos]], msgid, []
+        del self.pos
+        cookie = str(pos) if pos < len(self.results) else ''
+        ctrl = SimplePagedResultsControl(0, 0, cookie)
+        return ldap.RES_SEARCH_RESULT, [], msgid, [ctrl]
+
+
+class TestIterEntries:
+    @pytest.fixture
+    def conn(self):
+        conn = LDAPClient(None, no_schema=True)
+        conn._conn = FakePagedConnection(make_user_results(25))
+        return conn
+
+    def test_pages(self, conn):
+        entries = list(conn.iter_entries(page_size=10))
+        assert [e.single_value['uid'] for e in entries] == [
+            'user%d' % i for i in range(25)]
+        assert conn.conn.searches == [(10, ''), (10, '10'), (10, '20')]
+
+    def test_cancel(self, conn):
+        for entry in conn.iter_entries(page_size=10, read_only=True):
+            assert isinstance(entry, ReadOnlyLDAPEntry)
+            if entry.single_value['uid'] == 'user12':
+                break
+        # the rest of the paged search is abandoned
+        assert conn.conn.searches == [(10, ''), (10, '10'), (0, '20')]
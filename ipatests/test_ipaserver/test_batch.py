@@ -0,0 +1,168 @@
+#
+# Copyright (C) 2026  FreeIPA Contributors see COPYING for license
+#
+
+"""
+Tests for the parallel execution mode of the batch command
+"""
+
+from __future__ import absolute_import
+
+import threading
+import time
+
+import pytest
+
+from ipalib import Command, create_api, errors, output
+from ipalib.parameters import Str
+from ipalib.request import context, destroy_context
+from ipapython.version import API_VERSION
+from ipaserver.plugins import batch, ldap2
+
+pytestmark = pytest.mark.tier0
+
+LDAP_URI = 'ldapi://%2Frun%2Ftest'
+
+
+class Directory:
+    """
+    Users the test commands work on
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.users = {u'x', u'y'}
+        self.executed = []
+
+
+class DirectoryCommand(Command):
+    NO_CLI = True
+    # set by the batch_api fixture
+    directory = None
+
+
+class user_show(DirectoryCommand):
+    takes_args = (Str('uid'),)
+    has_output = output.standard_entry
+
+    def execute(self, uid, **options):
+        directory = self.directory
+        with directory.lock:
+            directory.executed.append(('show', uid))
+            if uid not in directory.users:
+                raise errors.NotFound(reason=u'%s: user not found' % uid)
+        return dict(result={'uid': [uid]}, value=uid, summary=None)
+
+
+class user_del(DirectoryCommand):
+    takes_args = (Str('uid'),)
+    has_output = output.standard_delete
+
+    def execute(self, uid, **options):
+        directory = self.directory
+        with directory.lock:
+            directory.executed.append(('del', uid))
+            if uid not in directory.users:
+                raise errors.NotFound(reason=u'%s: user not found' % uid)
+            directory.users.remove(uid)
+        return dict(result=dict(failed=[]), value=uid, summary=None)
+
+
+class FakeConnection:
+    def whoami_s(self):
+        pass
+
+    def unbind_s(self):
+        pass
+
+
+@pytest.fixture
+def batch_api(monkeypatch):
+    """
+    Server API with the batch command, ldap2 connecting over pooled
+    connections without a server, and commands working on a Directory
+    """
+    api = create_api(mode='unit_test')
+    api.bootstrap(context='server', in_server=True, in_tree=True,
+                  ldap_uri=LDAP_URI)
+    for plugin in (batch.batch, ldap2.ldap2, user_show, user_del):
+        api.add_plugin(plugin)
+    api.finalize()
+    monkeypatch.setattr(DirectoryCommand, 'directory', Directory())
+    # requests are executed through the global API
+    monkeypatch.setattr(batch, 'api', api)
+
+    pool = ldap2.LDAPConnectionPool(max_size=10, ttl=60)
+    key = (LDAP_URI, 'EXTERNAL', 0)
+    for _i in range(batch.batch.parallel_max_workers):
+        pool.put(key, FakeConnection(), time.time() + 60)
+    monkeypatch.setattr(ldap2.ldap2, 'connection_pool', pool)
+    monkeypatch.setattr(ldap2.ldap2, '_get_pool_key',
+                        lambda self, *args: (key, time.time() + 60))
+
+    context.principal = u'admin@EXAMPLE.TEST'
+    try:
+        yield api
+    finally:
+        destroy_context()
+
+
+def call_batch(api, methods):
+    methods = [
+        dict(method=method, params=[[uid], {}]) for method, uid in methods
+    ]
+    result = api.Command.batch(methods, parallel=True, version=API_VERSION)
+    assert result['count'] == len(methods)
+    return [r['error'] for r in result['results']]
+
+
+@pytest.mark.parametrize('fail_connect', [False, True])
+def test_execute_parallel(batch_api, monkeypatch, fail_connect):
+    if fail_connect:
+        def connect(*args, **kwargs):
+            raise RuntimeError('cannot connect')
+        monkeypatch.setattr(ldap2.ldap2, 'connect', connect)
+
+    errors = call_batch(batch_api, [
+        ('user_show', u'x'),
+        ('user_show', u'y'),
+        ('user_del', u'x'),
+        ('user_show', u'x'),
+        ('user_show', u'y'),
+    ])
+    assert errors == [None, None, None, u'x: user not found', None]
+    # the write waits for all previous reads and no read is repeated
+    executed = DirectoryCommand.directory.executed
+    assert sorted(executed[:2]) == [('show', u'x'), ('show', u'y')]
+    assert executed[2] == ('del', u'x')
+    assert len(executed) == 5
+
+
+def test_is_read_only(batch_api):
+    plugin = batch_api.Command.batch
+
+    def is_read_only(method):
+        return plugin._is_read_only(dict(method=method))
+
+    assert is_read_only('user_show')
+    assert is_read_only('hostgroup_find')
+    # commands with side effects are executed serially
+    assert not is_read_only('user_add')
+    assert not is_read_only('user_del')
+    assert not is_read_only('cert_find')
+    assert not is_read_only('cert_show')
+    assert not is_read_only(['user_show'])
+    assert not plugin._is_read_only({})
+
+
+def test_execute_parallel_limits(batch_api):
+    """
+    Workers connecting and disconnecting do not change the search limits
+    of the caller
+    """
+    ldap = batch_api.Backend.ldap2
+    ldap.connect(size_limit=5, time_limit=10)
+    call_batch(batch_api, [('user_show', u'x')] * 4)
+    assert ldap.size_limit == 5
+    assert ldap.time_limit == 10.0
+    destroy_context()
+    assert ldap.size_limit == 0
@@ -0,0 +1,209 @@
+#
+# Copyright (C) 2026  FreeIPA Contributors see COPYING for license
+#
+
+"""
+Tests for the cache of parsed certificates of the cert plugin
+"""
+
+from __future__ import absolute_import
+
+import base64
+import collections
+import datetime
+import time
+
+import pytest
+from cryptography import x509
+from cryptography.hazmat.backends import default_backend
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+from cryptography.x509.oid import NameOID
+
+from ipalib import Str
+from ipapython.dn import DN
+from ipaserver.plugins.cert import BaseCertObject, ParsedCertCache, cert_find
+
+pytestmark = pytest.mark.tier0
+
+
+def make_certificates(count):
+    key = ec.generate_private_key(ec.SECP256R1(), default_backend())
+    issuer = x509.Name([
+        x509.NameAttribute(NameOID.ORGANIZATION_NAME, u'EXAMPLE.TEST'),
+        x509.NameAttribute(NameOID.COMMON_NAME, u'Certificate Authority'),
+    ])
+    certs = []
+    for i in range(count):
+        hostname = u'host%d.example.test' % i
+        cert = x509.CertificateBuilder().subject_name(x509.Name([
+            x509.NameAttribute(NameOID.ORGANIZATION_NAME, u'EXAMPLE.TEST'),
+            x509.NameAttribute(NameOID.COMMON_NAME, hostname),
+        ])).issuer_name(issuer).public_key(key.public_key()).serial_number(
+            i + 1
+        ).not_valid_before(datetime.datetime(2026, 1, 1)).not_valid_after(
+            datetime.datetime(2028, 1, 1)
+        ).add_extension(
+            x509.SubjectAlternativeName([x509.DNSName(hostname)]),
+            critical=False,
+        ).sign(key, hashes.SHA256(), default_backend())
+        certs.append(base64.b64encode(
+            cert.public_bytes(serialization.Encoding.DER)).decode('ascii'))
+    return certs
+
+
+class FakeCertObject:
+    """
+    The parts of a BaseCertObject plugin needed to parse certificates
+    """
+    name = 'cert'
+    params = {
+        name: Str(name)
+        for name in ('san_rfc822name', 'san_dnsname', 'san_directoryname',
+                     'san_uri', 'san_ipaddress', 'san_oid', 'san_other',
+                     'san_other_upn', 'san_other_kpn')
+    }
+    _parse = BaseCertObject._parse
+    _parse_certificate = BaseCertObject._parse_certificate
+    _add_san_attribute = BaseCertObject._add_san_attribute
+
+
+class FakeCertFind:
+    """
+    cert_find with sub-searches which record their size limit
+    """
+    execute = cert_find.execute
+
+    def __init__(self):
+        self.api = type('api', (), {})()
+        self.api.Command = type('Command', (), {})()
+        self.api.Command.ca_is_enabled = lambda: {'result': True}
+        self.obj = type('obj', (), {'_owners': staticmethod(lambda: ())})()
+        self.sizelimits = {}
+
+    def _sub_search(self, name, keys, complete, sizelimit):
+        self.sizelimits[name] = sizelimit
+        result = collections.OrderedDict(
+            ((u'CN=CA', key), {'serial_number': key}) for key in keys)
+        return result, False, complete
+
+    def _cert_search(self, sizelimit, **options):
+        keys = [500] if 'certificate' in options else []
+        return self._sub_search(
+            'cert', keys, 'certificate' in options, sizelimit)
+
+    def _ca_search(self, sizelimit, **options):
+        # the certificate is one of many certificates of the CA
+        keys = range(1, 1001)
+        if sizelimit:
+            keys = keys[:sizelimit + 1]
+        return self._sub_search('ca', keys, False, sizelimit)
+
+    def _ldap_search(self, sizelimit, **options):
+        return self._sub_search('ldap', [], False, sizelimit)
+
+    def add_message(self, message):
+        pass
+
+
+@pytest.mark.parametrize('certificate', [False, True])
+def test_cert_find_sizelimit(certificate):
+    plugin = FakeCertFind()
+    options = {}
+    if certificate:
+        options['certificate'] = object()
+    result = plugin.execute(pkey_only=True, sizelimit=100, timelimit=0,
+                            **options)
+    if certificate:
+        # the CA search must reach the given certificate
+        assert plugin.sizelimits == dict(cert=0, ca=0, ldap=0)
+        assert result['result'] == [{'serial_number': 500}]
+        assert not result['truncated']
+    else:
+        assert plugin.sizelimits == dict(cert=100, ca=100, ldap=100)
+        assert result['count'] == 100
+        assert result['truncated']
+
+
+class TestParsedCertCache:
+    def test_hit_and_miss(self):
+        cache = ParsedCertCache(max_size=2)
+        calls = []
+
+        def parse(value):
+            calls.append(value)
+            return {'serial_number': value}
+
+        assert cache.get('a', lambda: parse(1)) == {'serial_number': 1}
+        assert cache.get('a', lambda: parse(2)) == {'serial_number': 1}
+        assert cache.get('b', lambda: parse(3)) == {'serial_number': 3}
+        assert calls == [1, 3]
+        assert cache.stats() == dict(hits=1, misses=2, size=2)
+
+    def test_lru_eviction(self):
+        cache = ParsedCertCache(max_size=2)
+        cache.get('a', lambda: {'a': 1})
+        cache.get('b', lambda: {'b': 1})
+        cache.get('a', lambda: {})
+        cache.get('c', lambda: {'c': 1})
+        # 'b' was used least recently
+        assert cache.get('a', lambda: {}) == {'a': 1}
+        assert cache.get('b', lambda: {}) == {}
+        assert cache.stats()['size'] == 2
+
+    def test_parse(self, monkeypatch):
+        cache = ParsedCertCache(max_size=10)
+        monkeypatch.setattr('ipaserver.plugins.cert.parsed_cert_cache', cache)
+        plugin = FakeCertObject()
+        certificate, = make_certificates(1)
+
+        for _i in range(2):
+            obj = {'certificate': certificate}
+            plugin._parse(obj, full=True)
+            assert obj['subject'] == DN(('cn', 'host0.example.test'),
+                                        ('o', 'EXAMPLE.TEST'))
+            assert obj['serial_number'] == 1
+            assert obj['serial_number_hex'] == u'0x1'
+            assert obj['san_dnsname'] == [u'host0.example.test']
+            assert 'sha256_fingerprint' in obj
+
+        # the cached lists are not shared with results
+        obj['san_dnsname'].append(u'other.example.test')
+        obj = {'certificate': certificate}
+        plugin._parse(obj, full=True)
+        assert obj['san_dnsname'] == [u'host0.example.test']
+
+        for _i in range(2):
+            obj = {'certificate': certificate}
+            plugin._parse(obj, full=False)
+            assert 'sha256_fingerprint' not in obj
+        assert cache.stats() == dict(hits=3, misses=2, size=2)
+
+    @pytest.mark.benchmark
+    def test_parse_benchmark(self, monkeypatch):
+        """
+        Compare parsing of repeated cert_find --all results with and
+        without the cache
+        """
+        count = 500
+        certificates = make_certificates(count)
+        plugin = FakeCertObject()
+
+        def measure(cache):
+            monkeypatch.setattr(
+                'ipaserver.plugins.cert.parsed_cert_cache', cache)
+            start = time.time()
+            results = []
+            for certificate in certificates:
+                obj = {'certificate': certificate}
+                plugin._parse(obj, full=True)
+                results.append(obj)
+            return results, time.time() - start
+
+        uncached, uncached_duration = measure(ParsedCertCache(max_size=0))
+        cache = ParsedCertCache(max_size=count)
+        measure(cache)
+        cached, cached_duration = measure(cache)
+        print('parse %d certificates: %.3fs uncached, %.3fs cached' % (
+            count, uncached_duration, cached_duration))
+        assert cached == uncached
@@ -0,0 +1,208 @@
+#
+# Copyright (C) 2026  FreeIPA Contributors see COPYING for license
+#
+
+"""
+Tests for the index of certificate metadata used by cert_find
+"""
+
+from __future__ import absolute_import
+
+import sqlite3
+import time
+
+import pytest
+
+from ipapython.dn import DN
+from ipaserver.cert_index import CertIndex
+
+pytestmark = pytest.mark.tier0
+
+ISSUER = u'CN=Certificate Authority,O=EXAMPLE.TEST'
+SUBCA = u'CN=Sub CA,O=EXAMPLE.TEST'
+DAY = 86400 * 1000
+
+
+def make_record(serial_number, cn, issuer=ISSUER, status=u'VALID',
+                not_after=None):
+    now = int(time.time() * 1000)
+    return {
+        'serial_number': serial_number,
+        'serial_number_hex': u'0x%X' % serial_number,
+        'subject': u'CN=%s,O=EXAMPLE.TEST' % cn,
+        'issuer': issuer,
+        'valid_not_before': u'%d' % (now - DAY),
+        'valid_not_after': u'%d' % (not_after or now + 365 * DAY),
+        'status': status,
+    }
+
+
+class FakeRA:
+    ca_host = 'ca.example.test'
+
+    def __init__(self, records):
+        self.records = records
+        self.searches = []
+        self.status_searches = 0
+
+    def iter_find(self, options, ca_host=None):
+        if 'revokedon_from' in options:
+            # status of certificates for a search of the index
+            self.status_searches += 1
+            return iter([r for r in self.records
+                         if r['status'].startswith(u'REVOKED')])
+        assert ca_host == self.ca_host
+        self.searches.append(options)
+        return iter(list(self.records))
+
+
+class TestCertIndex:
+    @pytest.fixture(autouse=True)
+    def setup_index(self, tmpdir):
+        self.ra = FakeRA([
+            make_record(1, u'host1.example.test'),
+            make_record(2, u'host2.example.test'),
+            make_record(0x1000, u'host10.example.test', issuer=SUBCA),
+            make_record(3, u'admin', status=u'REVOKED'),
+        ])
+        self.index = CertIndex(str(tmpdir.join('certs.sqlite')), 60)
+
+    def search(self, **options):
+        return [
+            r['serial_number'] for r in self.index.search(self.ra, options)
+        ]
+
+    def test_build(self):
+        # the CA is searched until the index is built in the background
+        assert self.index.search(self.ra, {}) is None
+        self.index._refresh_thread.join()
+        assert self.search() == [1, 2, 3, 0x1000]
+        assert self.ra.searches == [{}]
+
+    def test_search(self):
+        self.index.refresh(self.ra, wait=True)
+        assert self.index.can_search({'subject': u'host1', 'exactly': True})
+        assert not self.index.can_search({'revocation_reason': 1})
+
+        assert self.search() == [1, 2, 3, 0x1000]
+        assert self.search(issuer=u'cn=sub ca,o=example.test') == [0x1000]
+        assert self.search(subject=u'HOST1') == [1, 0x1000]
+        assert self.search(subject=u'host1.example.test',
+                           exactly=True) == [1]
+        assert self.search(min_serial_number=2,
+                           max_serial_number=0x1000) == [2, 3, 0x1000]
+        assert self.search(validnotafter_to=u'2000-01-01') == []
+        results = self.index.search(self.ra, {}, sizelimit=2)
+        assert results == self.ra.records[:2]
+        # the index was filled by the first search only
+        assert self.ra.searches == [{}]
+
+    def test_refresh(self):
+        self.index.refresh(self.ra, wait=True)
+        self.ra.records.append(make_record(4, u'host4.example.test'))
+        assert self.search(subject=u'host4') == []
+
+        # the search is answered before the refresh finishes
+        self.index.refresh_interval = 0
+        self.search(subject=u'host4')
+        self.index._refresh_thread.join()
+        assert self.search(subject=u'host4') == [4]
+        assert set(self.ra.searches[1]) == {'issuedon_from'}
+
+        self.index.refresh_interval = 60
+        self.index.invalidate()
+        self.ra.records = self.ra.records[:1]
+        self.index.refresh(self.ra, wait=True)
+        assert self.search() == [1]
+        assert self.ra.searches[-1] == {}
+
+    def test_status(self):
+        self.index.refresh(self.ra, wait=True)
+        past = int(time.time() * 1000) - DAY
+        self.index.update([make_record(5, u'old', not_after=past),
+                           make_record(6, u'old', not_after=past)])
+        # certificates revoked or removed from hold anywhere since the index
+        # was refreshed
+        self.ra.records[0]['status'] = u'REVOKED'
+        self.ra.records[3]['status'] = u'VALID'
+        self.ra.records.append(
+            make_record(6, u'old', status=u'REVOKED_EXPIRED', not_after=past))
+        status = {
+            r['serial_number']: r['status']
+            for r in self.index.search(self.ra, {})
+        }
+        assert status == {
+            1: u'REVOKED', 2: u'VALID', 3: u'VALID', 5: u'EXPIRED',
+            6: u'REVOKED_EXPIRED', 0x1000: u'VALID'
+        }
+        assert len(self.ra.searches) == 1
+        assert self.ra.status_searches == 1
+
+    def test_owners(self):
+        host1 = DN('fqdn=host1.example.test,cn=computers,cn=accounts,'
+                   'dc=example,dc=test')
+        host2 = DN('fqdn=host2.example.test,cn=computers,cn=accounts,'
+                   'dc=example,dc=test')
+        owned, stale = self.index.get_owned_certificates({host1: 10})
+        assert owned == {}
+        assert stale == [host1]
+
+        self.index.update_owners({
+            host1: (10, [(DN(ISSUER), 1), (DN(SUBCA), 0x1000)]),
+            host2: (11, []),
+        })
+        owned, stale = self.index.get_owned_certificates(
+            {DN(str(host1).upper()): 10, host2: 11})
+        assert owned == {
+            DN(str(host1).upper()): [(DN(ISSUER), 1), (DN(SUBCA), 0x1000)],
+            host2: [],
+        }
+        assert stale == []
+
+        # modified entries and entries without entryUSN are stale
+        owned, stale = self.index.get_owned_certificates(
+            {host1: 12, host2: None})
+        assert owned == {}
+        assert sorted(stale) == sorted([host1, host2])
+
+        self.index.update_owners({host1: (12, [(DN(ISSUER), 2)])})
+        owned, stale = self.index.get_owned_certificates({host1: 12})
+        assert owned == {host1: [(DN(ISSUER), 2)]}
+
+    def test_shared(self):
+        self.index.refresh(self.ra, wait=True)
+        self.ra.records.append(make_record(4, u'host4.example.test'))
+        other = CertIndex(self.index.path, 60)
+        # another process uses the index filled by the first one
+        assert [r['serial_number'] for r in other.search(self.ra, {})] == [
+            1, 2, 3, 0x1000]
+        assert len(self.ra.searches) == 1
+
+    def test_concurrent_refresh(self):
+        self.index.refresh(self.ra, wait=True)
+        self.index.refresh_interval = 0
+        other = CertIndex(self.index.path, 0)
+
+        # a refresh claimed by another process is not repeated
+        assert self.index._claim_refresh() is not None
+        assert len(other.search(self.ra, {})) == 4
+        assert other._refresh_thread is None
+
+        # searches do not wait while another process writes the index
+        writer = sqlite3.connect(self.index.path, isolation_level=None)
+        writer.execute('BEGIN IMMEDIATE')
+        try:
+            other.claim_timeout = 0
+            start = time.time()
+            assert len(other.search(self.ra, {})) == 4
+            assert time.time() - start < 5
+            assert other._refresh_thread is None
+        finally:
+            writer.execute('ROLLBACK')
+            writer.close()
+        assert len(self.ra.searches) == 1
+
+    def test_error(self, tmpdir):
+        # the CA is searched when the index cannot be used
+        index = CertIndex(str(tmpdir), 60)
+        assert index.search(self.ra, {}) is None
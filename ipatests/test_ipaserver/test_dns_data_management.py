@@ -0,0 +1,193 @@
+#
+# Copyright (C) 2026  FreeIPA Contributors see COPYING for license
+#
+
+"""
+Tests for updates of IPA DNS system records
+"""
+
+from __future__ import absolute_import
+
+import time
+
+import pytest
+
+from ipalib import errors
+from ipapython.dn import DN
+from ipapython.dnsutil import DNSName
+from ipaserver.dns_data_management import IPASystemRecords
+
+pytestmark = pytest.mark.tier0
+
+DOMAIN = u'example.test'
+
+
+class FakeEntry(dict):
+    @property
+    def single_value(self):
+        return {k: v[0] for k, v in self.items()}
+
+
+class FakeLDAP:
+    SCOPE_ONELEVEL = 1
+    MATCH_ANY = '|'
+
+    def __init__(self, entries):
+        self.entries = entries
+        self.searches = 0
+
+    def make_filter_from_attr(self, attr, value, rules):
+        return set(value)
+
+    def get_entries(self, base_dn, scope, filter, attrs_list, **kwargs):
+        self.searches += 1
+        entries = [
+            FakeEntry((attr, values) for attr, values in entry.items()
+                      if attr in attrs_list)
+            for name, entry in self.entries.items() if name in filter
+        ]
+        if not entries:
+            raise errors.NotFound(reason='no entries')
+        return entries
+
+
+class FakeCommands:
+    def __init__(self, api):
+        self.api = api
+        self.calls = []
+
+    def server_find(self, **kwargs):
+        return {'result': [
+            {'cn': [name], 'ipaserviceweight': [str(weight)],
+             'ipalocation_location': [DNSName(location)],
+             'enabled_role_servrole': roles}
+            for name, weight, location, roles in self.api.servers
+        ]}
+
+    def location_find(self):
+        return {'result': [
+            {'idnsname': [DNSName(location)]}
+            for location in self.api.locations
+        ]}
+
+    def dnszone_show(self, zone):
+        pass
+
+    def dnsrecord_add(self, zone, name, **options):
+        self.calls.append(('add', name.relativize(zone).ToASCII()))
+        key = name.relativize(zone).ToASCII()
+        if key in self.api.entries:
+            raise errors.DuplicateEntry()
+        self.api.entries[key] = entry = {
+            'idnsname': [DNSName(key)],
+            'objectclass': ['top', 'idnsrecord'],
+        }
+        entry.update(options)
+
+    def dnsrecord_mod(self, zone, name, **options):
+        self.calls.append(('mod', name.relativize(zone).ToASCII()))
+        entry = self.api.entries[name.relativize(zone).ToASCII()]
+        for value in options.pop('addattr', []):
+            attr, value = value.split('=', 1)
+            entry[attr].append(value)
+        for value in options.pop('setattr', []):
+            attr, value = value.split('=', 1)
+            entry[attr] = [value]
+        entry.update(options)
+
+
+class FakeObject:
+    def get_dn(self, *keys):
+        return DN(('idnsname', DOMAIN + '.'), ('cn', 'dns'))
+
+
+class FakeAPI:
+    def __init__(self):
+        self.servers = [
+            (u'a.example.test', 100, u'prague', ['IPA master']),
+            (u'b.example.test', 100, u'brno', ['IPA master', 'NTP server']),
+        ]
+        self.locations = [u'prague', u'brno']
+        self.entries = {}
+        self.env = type('env', (), {'domain': DOMAIN,
+                                    'realm': u'EXAMPLE.TEST'})
+        self.Command = FakeCommands(self)
+        self.Backend = type('Backend', (), {'ldap2': FakeLDAP(self.entries)})
+        self.Object = type('Object', (), {'dnszone': FakeObject()})
+
+
+class TestUpdateSystemRecords:
+    @pytest.fixture(autouse=True)
+    def setup_api(self):
+        self.api = FakeAPI()
+
+    def update(self):
+        self.api.Command.calls = []
+        system_records = IPASystemRecords(self.api)
+        (base_success, base_fail), (loc_success, loc_fail) = (
+            system_records.update_dns_records())
+        assert base_fail == loc_fail == []
+        return base_success + loc_success
+
+    def test_update(self):
+        success = self.update()
+        names = {name.relativize(DNSName(DOMAIN).make_absolute()).ToASCII()
+                 for name, _node in success}
+        calls = self.api.Command.calls
+        assert {name for _op, name in calls} == names
+        assert ('add', '_ntp._udp.brno._locations') in calls
+        # base SRV records get a CNAME template
+        assert ('mod', '_ldap._tcp') in calls
+        assert ('mod', '_kerberos') not in calls
+        template = self.api.entries['_ldap._tcp'][
+            'idnsTemplateAttribute;cnamerecord']
+        assert template == [
+            r'_ldap._tcp.\{substitutionvariable_ipalocation\}._locations']
+
+        # records are up to date, nothing is modified
+        self.api.Backend.ldap2.searches = 0
+        assert len(self.update()) == len(success)
+        assert self.api.Command.calls == []
+        assert self.api.Backend.ldap2.searches == 1
+
+        # stored names and values may differ in form only
+        self.api.entries['_kerberos']['txtrecord'] = [u'EXAMPLE.TEST']
+        self.update()
+        assert self.api.Command.calls == []
+
+    def test_update_changed(self):
+        self.update()
+        self.api.servers[0] = (
+            u'a.example.test', 50, u'prague', ['IPA master'])
+        self.update()
+        calls = self.api.Command.calls
+        # only SRV records of the master role include server a
+        assert ('mod', '_ldap._tcp') in calls
+        assert ('mod', '_ldap._tcp.brno._locations') in calls
+        assert ('mod', '_ntp._udp') not in calls
+        assert all(op == 'mod' for op, _name in calls)
+        srv = self.api.entries['_ldap._tcp']['srvrecord']
+        assert sorted(srv) == [u'0 100 389 b.example.test.',
+                               u'0 50 389 a.example.test.']
+
+    @pytest.mark.benchmark
+    def test_update_benchmark(self):
+        """
+        Measure updates of system records of 40 servers in 12 locations
+        """
+        self.api.locations = [u'loc%d' % i for i in range(12)]
+        self.api.servers = [
+            (u'srv%d.example.test' % i, 100, u'loc%d' % (i % 12),
+             ['IPA master', 'NTP server', 'AD trust controller'])
+            for i in range(40)
+        ]
+        start = time.time()
+        self.update()
+        created = time.time() - start
+        start = time.time()
+        self.update()
+        unchanged = time.time() - start
+        print('%d system records: create %.3fs, up to date %.3fs, '
+              '%d commands' % (len(self.api.entries), created, unchanged,
+                               len(self.api.Command.calls)))
+        assert self.api.Command.calls == []
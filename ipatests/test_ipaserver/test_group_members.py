@@ -0,0 +1,113 @@
+#
+# Copyright (C) 2026  FreeIPA Contributors see COPYING for license
+#
+
+"""
+Tests for bulk updates of group members in the ldap2 backend
+"""
+
+from __future__ import absolute_import
+
+import contextlib
+
+import pytest
+
+from ipalib import errors
+from ipapython.dn import DN
+from ipaserver.plugins.ldap2 import ldap2
+
+pytestmark = pytest.mark.tier0
+
+GROUP_DN = DN(('cn', 'group'), ('cn', 'groups'), ('dc', 'example'))
+
+
+def user_dn(name):
+    return DN(('uid', name), ('cn', 'users'), ('dc', 'example'))
+
+
+class FakeLDAP2:
+    """
+    LDAP backend with a group whose modifications are refused for some
+    members
+    """
+    group_member_chunk_size = 2
+    add_entries_to_group = ldap2.add_entries_to_group
+    remove_entries_from_group = ldap2.remove_entries_from_group
+    _modify_group_members = ldap2._modify_group_members
+
+    def __init__(self, members, existing, refused):
+        self.members = list(members)
+        self.existing = set(existing) | {GROUP_DN}
+        self.refused = set(refused)
+        self.conn = self
+        self.modifies = []
+
+    def get_entry(self, dn, attrs_list):
+        assert dn == GROUP_DN
+        return {'member': list(self.members)}
+
+    def _get_existing_entries(self, dns):
+        return {dn: dn for dn in dns if dn in self.existing}
+
+    def encode(self, values):
+        return values
+
+    @contextlib.contextmanager
+    def error_handler(self):
+        yield
+
+    def modify_s(self, dn, modlist):
+        (_op, _attr, values), = modlist
+        self.modifies.append(values)
+        if self.refused & set(values):
+            raise errors.ACIError(info=u'refused')
+        for value in values:
+            if value in self.members:
+                self.members.remove(value)
+            else:
+                self.members.append(value)
+
+    def add_entry_to_group(self, dn, group_dn, member_attr, allow_same):
+        if dn in self.refused:
+            raise errors.ACIError(info=u'refused')
+        self.members.append(dn)
+
+    def remove_entry_from_group(self, dn, group_dn, member_attr):
+        if dn in self.refused:
+            raise errors.ACIError(info=u'refused')
+        self.members.remove(dn)
+
+
+def test_add_entries_to_group():
+    users = [user_dn('user%d' % i) for i in range(4)]
+    ldap = FakeLDAP2([users[0]], users, [users[2]])
+    dns = [users[1], user_dn('missing'), users[2], GROUP_DN, users[0],
+           users[3]]
+    completed, failed = ldap.add_entries_to_group(dns, GROUP_DN)
+
+    # the first chunk is refused and retried member by member
+    assert ldap.modifies == [[users[1], users[2]], [users[3]]]
+    assert completed == [users[1], users[3]]
+    assert ldap.members == [users[0], users[3], users[1]]
+    # failures are reported in the order of the requested members
+    assert [(dn, type(e)) for dn, e in failed] == [
+        (user_dn('missing'), errors.NotFound),
+        (users[2], errors.ACIError),
+        (GROUP_DN, errors.SameGroupError),
+        (users[0], errors.AlreadyGroupMember),
+    ]
+
+
+def test_remove_entries_from_group():
+    users = [user_dn('user%d' % i) for i in range(3)]
+    ldap = FakeLDAP2(users, users, [users[2]])
+    dns = [users[0], user_dn('missing'), users[2], users[1]]
+    completed, failed = ldap.remove_entries_from_group(dns, GROUP_DN)
+
+    assert ldap.modifies == [[users[0], users[2]], [users[1]]]
+    assert completed == [users[0], users[1]]
+    assert ldap.members == [users[2]]
+    assert [(dn, type(e)) for dn, e in failed] == [
+        (user_dn('missing'), errors.NotGroupMember),
+        (users[2], errors.ACIError),
+    ]
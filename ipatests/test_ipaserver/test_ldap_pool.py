@@ -0,0 +1,72 @@
+#
+# Copyright (C) 2026  FreeIPA Contributors see COPYING for license
+#
+
+"""
+Tests for the per-process LDAP connection pool of the ldap2 backend
+"""
+
+from __future__ import absolute_import
+
+import time
+
+import pytest
+
+from ipaserver.plugins.ldap2 import LDAPConnectionPool
+
+
+class FakeConnection:
+    def __init__(self):
+        self.unbound = False
+
+    def unbind_s(self):
+        self.unbound = True
+
+
+@pytest.mark.tier0
+class TestLDAPConnectionPool:
+    key = ('ldapi://test', 'GSSAPI', 'admin@EXAMPLE.COM')
+
+    def test_miss_and_hit(self):
+        pool = LDAPConnectionPool(max_size=2, ttl=60)
+        assert pool.get(self.key) is None
+
+        conn = FakeConnection()
+        expires = time.time() + 60
+        pool.put(self.key, conn, expires)
+        assert pool.get(self.key) == (conn, expires)
+        assert pool.get(self.key) is None
+        assert pool.stats() == dict(hits=1, misses=2, evictions=0, idle=0)
+        assert not conn.unbound
+
+    def test_keyed_by_identity(self):
+        pool = LDAPConnectionPool(max_size=2, ttl=60)
+        pool.put(self.key, FakeConnection(), time.time() + 60)
+        other = ('ldapi://test', 'GSSAPI', 'user@EXAMPLE.COM')
+        assert pool.get(other) is None
+
+    def test_expired(self):
+        pool = LDAPConnectionPool(max_size=2, ttl=60)
+        conn = FakeConnection()
+        pool.put(self.key, conn, time.time() - 1)
+        assert conn.unbound
+        assert pool.get(self.key) is None
+
+        conn = FakeConnection()
+        pool._idle[self.key] = [(conn, time.time() - 1)]
+        assert pool.get(self.key) is None
+        assert conn.unbound
+        assert pool.stats()['evictions'] == 1
+
+    def test_full(self):
+        pool = LDAPConnectionPool(max_size=1, ttl=60)
+        conns = [FakeConnection(), FakeConnection()]
+        for conn in conns:
+            pool.put(self.key, conn, time.time() + 60)
+        assert not conns[0].unbound
+        assert conns[1].unbound
+        assert pool.stats()['idle'] == 1
+
+        pool.clear()
+        assert conns[0].unbound
+        assert pool.stats()['idle'] == 0
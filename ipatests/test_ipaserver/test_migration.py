@@ -0,0 +1,103 @@
+#
+# Copyright (C) 2026  FreeIPA Contributors see COPYING for license
+#
+
+"""
+Tests for updates of the default group of migrated users
+"""
+
+from __future__ import absolute_import
+
+import contextlib
+import json
+import threading
+
+import pytest
+
+from ipalib import errors
+from ipapython.dn import DN
+from ipaserver.plugins import migration
+
+pytestmark = pytest.mark.tier0
+
+GROUP_DN = DN(('cn', 'ipausers'), ('cn', 'groups'), ('cn', 'accounts'),
+              ('dc', 'example'), ('dc', 'test'))
+
+
+class FakeEntry:
+    def __init__(self, dn):
+        self.dn = dn
+
+
+class FakeLDAP:
+    """
+    LDAP connection of a worker with users which are not members of the
+    default group, some of them added by another worker meanwhile
+    """
+    SCOPE_SUBTREE = 2
+
+    def __init__(self, users, members):
+        self.users = users
+        self.members = members
+        self.conn = self
+        self.modifies = []
+
+    def find_entries(self, searchfilter, attrs, base_dn, **kwargs):
+        return [FakeEntry(dn) for dn in self.users], False
+
+    def encode(self, values):
+        return values
+
+    @contextlib.contextmanager
+    def error_handler(self):
+        yield
+
+    def modify_s(self, dn, modlist):
+        (_op, _attr, values), = modlist
+        self.modifies.append(values)
+        if self.members & set(values):
+            raise errors.DuplicateEntry()
+        self.members.update(values)
+
+
+def test_update_default_group_duplicate():
+    users = [DN(('uid', 'user%d' % i), ('dc', 'example')) for i in range(3)]
+    ldap = FakeLDAP(users, {users[1]})
+    ctx = dict(def_group_dn=GROUP_DN, def_group_lock=threading.Lock(),
+               migrate_cnt=100)
+    migration._update_default_group(ldap, ctx, False)
+    assert ldap.members == set(users)
+    assert ldap.modifies[0] == users
+
+    # nothing is done between multiples of 100
+    ldap.modifies = []
+    migration._update_default_group(ldap, dict(ctx, migrate_cnt=101), False)
+    assert ldap.modifies == []
+
+
+def test_checkpoint(tmpdir):
+    path = str(tmpdir.join('checkpoint.jsonl'))
+    checkpoint = migration.MigrationCheckpoint(path)
+    checkpoint.update('user', [u'a', u'b'])
+    checkpoint.update('user', [u'c'], completed=True)
+    checkpoint.update('group', [u'g'])
+    assert checkpoint.get_migrated('user') == [u'a', u'b', u'c']
+
+    # every update appends only the new objects
+    with open(path) as f:
+        lines = f.readlines()
+    assert len(lines) == 3
+    assert json.loads(lines[1]) == dict(
+        type='user', migrated=[u'c'], completed=True)
+
+    # a record interrupted by a crash is ignored on resume
+    with open(path, 'a') as f:
+        f.write('{"type": "group", "migr')
+    resumed = migration.MigrationCheckpoint(path, resume=True)
+    assert resumed.is_completed('user')
+    assert not resumed.is_completed('group')
+    assert resumed.get_migrated('user') == [u'a', u'b', u'c']
+    assert resumed.get_migrated('group') == [u'g']
+
+    checkpoint.remove()
+    assert not tmpdir.join('checkpoint.jsonl').exists()
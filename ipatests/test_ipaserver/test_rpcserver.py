@@ -21,13 +21,20 @@
 Test the `ipaserver.rpc` module.
 """
 
+import gzip
 import json
+import time
+import zlib
+from io import BytesIO
+
 import pytest
 
 import six
 
 from ipatests.util import assert_equal, raises, PluginTester
 from ipalib import errors
+from ipalib.rpc import json_iterencode_binary
+from ipapython.version import API_VERSION
 from ipaserver import rpcserver
 
 if six.PY3:
@@ -136,6 +143,173 @@ def test_params_2_args_options():
     assert f([args, options]) == (args, options)
 
 
+def test_read_input(monkeypatch):
+    """
+    Test the `ipaserver.rpcserver.read_input` function.
+    """
+    def environ(body, **kw):
+        return dict(kw, CONTENT_LENGTH=str(len(body)),
+                    **{'wsgi.input': BytesIO(body)})
+
+    body = json.dumps(dict(method='ping', params=[[], {}])).encode('utf-8')
+    assert rpcserver.read_input(environ(body)) == body.decode('utf-8')
+    assert rpcserver.read_input(environ(
+        gzip.compress(body), HTTP_CONTENT_ENCODING='gzip')
+    ) == body.decode('utf-8')
+    raises(ValueError, rpcserver.read_input,
+           environ(body, HTTP_CONTENT_ENCODING='br'))
+
+    monkeypatch.setattr(rpcserver, 'MAX_DECOMPRESSED_REQUEST_SIZE', 10)
+    raises(ValueError, rpcserver.read_input,
+           environ(gzip.compress(body), HTTP_CONTENT_ENCODING='gzip'))
+
+
+def test_accepts_gzip():
+    """
+    Test the `ipaserver.rpcserver.accepts_gzip` function.
+    """
+    f = rpcserver.accepts_gzip
+    assert not f({})
+    assert not f(dict(HTTP_ACCEPT_ENCODING='identity'))
+    assert f(dict(HTTP_ACCEPT_ENCODING='gzip'))
+    assert f(dict(HTTP_ACCEPT_ENCODING='deflate, GZIP;q=0.5'))
+    assert not f(dict(HTTP_ACCEPT_ENCODING='gzip;q=0, identity'))
+    assert not f(dict(HTTP_ACCEPT_ENCODING='gzip;q=zero'))
+
+
+def test_gzip_response():
+    """
+    Test the `ipaserver.rpcserver.gzip_response` function.
+    """
+    chunks = [b'a' * 100, b'b' * 100, b'c' * 100]
+    compressed, response = rpcserver.gzip_response(iter(chunks), 301)
+    assert not compressed
+    assert response == chunks
+
+    compressed, response = rpcserver.gzip_response(iter(chunks), 150)
+    assert compressed
+    assert gzip.decompress(b''.join(response)) == b''.join(chunks)
+
+
+def failing_response(count):
+    for i in range(count):
+        yield b'chunk%d' % i
+    raise TypeError('cannot encode')
+
+
+def test_prefetch_response():
+    """
+    Test the `ipaserver.rpcserver.prefetch_response` function.
+    """
+    assert list(rpcserver.prefetch_response(iter([]))) == []
+    response = rpcserver.prefetch_response(iter([b'a', b'b']))
+    assert list(response) == [b'a', b'b']
+
+    raises(TypeError, rpcserver.prefetch_response, failing_response(0))
+    response = rpcserver.prefetch_response(failing_response(2))
+    assert next(response) == b'chunk0'
+    assert next(response) == b'chunk1'
+    raises(TypeError, next, response)
+
+
+class FakeExecutioner:
+    """
+    Executioner whose response cannot be encoded
+    """
+    name = 'json'
+    headers = None
+    content_type = 'application/json'
+    __call__ = rpcserver.WSGIExecutioner.__call__
+
+    def __init__(self, count):
+        self.count = count
+        self.api = type('api', (), {})()
+        self.api.env = type('env', (), {'rpc_compress_threshold': -1})
+
+    def wsgi_execute(self, environ):
+        return failing_response(self.count)
+
+
+def test_executioner_encoding_error():
+    s = StartResponse()
+    response = FakeExecutioner(0)({}, s)
+    assert s.status == '500 Internal Server Error'
+    assert response == [b'500 Internal Server Error']
+
+    s.reset()
+    response = FakeExecutioner(1)({}, s)
+    assert s.status == '200 Success'
+    assert next(iter(response)) == b'chunk0'
+
+
+def make_find_response(count):
+    entries = []
+    for i in range(count):
+        fqdn = u'host%d.ipa.test' % i
+        entries.append({
+            'dn': u'fqdn=%s,cn=computers,cn=accounts,dc=ipa,dc=test' % fqdn,
+            'fqdn': (fqdn,),
+            'krbprincipalname': (u'host/%s@IPA.TEST' % fqdn,),
+            'has_keytab': True,
+            'has_password': False,
+            'managedby_host': (fqdn,),
+            'ipauniqueid': (u'%08d-0000-0000-0000-000000000000' % i,),
+            'objectclass': (u'ipaobject', u'nshost', u'ipahost', u'pkiuser',
+                            u'ipaservice', u'krbprincipalaux', u'top'),
+            'usercertificate': (bytes(bytearray(range(256))) * 4,),
+        })
+    return dict(result=dict(result=tuple(entries), count=count,
+                            truncated=False, summary=None),
+                error=None, id=0, principal=u'admin@IPA.TEST',
+                version=u'4.12.0')
+
+
+def make_schema_response(count):
+    commands = []
+    for i in range(count):
+        commands.append({
+            'name': u'command%d/1' % i,
+            'doc': u'Search for entries of type %d.' % i,
+            'topic_topic': u'topic%d/1' % (i // 10),
+            'params': [
+                {'name': u'option%d' % j, 'cli_name': u'option_%d' % j,
+                 'type': u'unicode', 'required': bool(j % 2),
+                 'doc': u'Description of option %d' % j}
+                for j in range(10)
+            ],
+        })
+    return dict(result=dict(result=dict(commands=commands,
+                                        fingerprint=u'0' * 32, ttl=3600)),
+                error=None, id=0, principal=u'admin@IPA.TEST',
+                version=u'4.12.0')
+
+
+@pytest.mark.benchmark
+def test_gzip_benchmark():
+    """
+    Compare sizes and compression times of representative responses
+    """
+    responses = (
+        ('user_show', dict(result=dict(result={'uid': (u'admin',)},
+                                       value=u'admin', summary=None))),
+        ('host_find', make_find_response(5000)),
+        ('schema', make_schema_response(500)),
+    )
+    threshold = 4096
+    for name, value in responses:
+        body = b''.join(json_iterencode_binary(value, API_VERSION))
+        start = time.time()
+        compressed, response = rpcserver.gzip_response(
+            json_iterencode_binary(value, API_VERSION), threshold)
+        response = b''.join(response)
+        duration = time.time() - start
+        assert compressed == (len(body) >= threshold)
+        if compressed:
+            assert zlib.decompress(response, rpcserver.GZIP_WBITS) == body
+        print('%s: %d bytes, sent %d bytes (%.2fs)' % (
+            name, len(body), len(response), duration))
+
+
 class test_session:
     klass = rpcserver.wsgi_dispatch
 
@@ -262,3 +436,34 @@ class test_jsonserver(PluginTester):
         options = dict(givenname=u'John', sn='Doe')
         d = dict(method=u'user_add', params=(args, options), id=18)
         assert o.unmarshal(json.dumps(d)) == (u'user_add', args, options, 18)
+
+    def test_compression(self):
+        """
+        Test compression of `ipaserver.rpcserver.jsonserver` responses.
+        """
+        o, api, _home = self.instance('Backend', in_server=True,
+                                      rpc_compress_threshold=0)
+        body = json.dumps(dict(method=u'no_such_command', params=([], {}),
+                               id=18)).encode('utf-8')
+
+        def call(**kw):
+            environ = dict(
+                kw,
+                REQUEST_METHOD='POST',
+                CONTENT_TYPE='application/json',
+                CONTENT_LENGTH=str(len(body)),
+                HTTP_REFERER='https://%s/ipa/ui' % api.env.host,
+                **{'wsgi.input': BytesIO(body)}
+            )
+            s = StartResponse()
+            response = b''.join(o(environ, s))
+            return dict(s.headers), response
+
+        headers, response = call()
+        assert headers['Accept-Encoding'] == 'gzip'
+        assert 'Content-Encoding' not in headers
+        assert json.loads(response.decode('utf-8'))['id'] == 18
+
+        headers, response = call(HTTP_ACCEPT_ENCODING='gzip')
+        assert headers['Content-Encoding'] == 'gzip'
+        assert json.loads(gzip.decompress(response).decode('utf-8'))['id'] == 18
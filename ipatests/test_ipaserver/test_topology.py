@@ -0,0 +1,79 @@
+#
+# Copyright (C) 2026  FreeIPA Contributors see COPYING for license
+#
+
+"""
+Tests for the ipaserver.topology module
+"""
+
+import timeit
+from copy import deepcopy
+
+import pytest
+
+from ipaserver.topology import (
+    get_topology_connection_errors, get_topology_removal_errors)
+from ipatests.util import make_graph
+
+pytestmark = pytest.mark.tier0
+
+
+def make_mesh(count):
+    """
+    Replicas in a ring, every fourth replica also connected to the opposite
+    replica and a leaf replica attached to replica 0
+    """
+    masters = ['master%02d' % i for i in range(count)]
+    edges = [(masters[i], masters[(i + 1) % count]) for i in range(count)]
+    edges.extend(
+        (masters[i], masters[(i + count // 2) % count])
+        for i in range(0, count, 4))
+    edges.append((masters[0], 'leaf'))
+    return make_graph(masters + ['leaf'], edges)
+
+
+def removal_errors_by_bfs(graph):
+    errors = {}
+    for vertex in graph.vertices:
+        copy = deepcopy(graph)
+        copy.remove_vertex(vertex)
+        errors[vertex] = get_topology_connection_errors(copy)
+    return errors
+
+
+def normalize(errors):
+    return sorted(
+        (m, sorted(visited), sorted(not_visited))
+        for m, visited, not_visited in errors
+    )
+
+
+@pytest.mark.parametrize('both', [True, False])
+def test_removal_errors(both):
+    graph = make_graph('abcde', [('a', 'b'), ('b', 'c'), ('c', 'a'),
+                                 ('c', 'd'), ('d', 'e')], both=both)
+    errors = get_topology_removal_errors(graph)
+    expected = removal_errors_by_bfs(graph)
+    assert sorted(errors) == sorted(expected)
+    for vertex in graph.vertices:
+        assert normalize(errors[vertex]) == normalize(expected[vertex])
+
+
+@pytest.mark.benchmark
+class TestRemovalErrorsBenchmark:
+    number = 5
+
+    def test_mesh(self):
+        graph = make_mesh(60)
+        errors = get_topology_removal_errors(graph)
+        expected = removal_errors_by_bfs(graph)
+        assert [m for m in errors if errors[m]] == ['master00']
+        assert normalize(errors['master00']) == normalize(
+            expected['master00'])
+
+        one_pass = timeit.timeit(
+            lambda: get_topology_removal_errors(graph), number=self.number)
+        by_bfs = timeit.timeit(
+            lambda: removal_errors_by_bfs(graph), number=self.number)
+        print('all removals of 60 masters: one pass %.4fs, BFS per removal '
+              '%.4fs' % (one_pass / self.number, by_bfs / self.number))
@@ -0,0 +1,51 @@
+#
+# Copyright (C) 2026  FreeIPA Contributors see COPYING for license
+#
+
+"""
+Test the startup of the IPA server WSGI application
+"""
+
+import pytest
+
+from ipalib import create_api
+from ipaplatform.paths import paths
+from ipaserver.install.installutils import is_ipa_configured
+
+pytestmark = [
+    pytest.mark.tier0,
+    pytest.mark.needs_ipaapi,
+    pytest.mark.skipif(not is_ipa_configured(),
+                       reason="IPA server is not configured"),
+]
+
+
+def start_server_api(plugins_on_demand):
+    """
+    Initialize the server API the way install/share/wsgi.py does and look up
+    the plugins needed to serve a user_show request.
+
+    The WSGI plugins are registered only if the global API is a server one,
+    so they are not looked up here.
+    """
+    api = create_api(mode=None)
+    api.bootstrap(context='server', confdir=paths.ETC_IPA, log=None,
+                  mode='production', plugins_on_demand=plugins_on_demand)
+    api.finalize()
+    assert api.Command.user_show.obj is api.Object.user
+    return api
+
+
+def test_startup_plugins_on_demand():
+    api = start_server_api(plugins_on_demand=True)
+    # pylint: disable=protected-access
+    instances = api._API__instances
+    assert api.Object.get_plugin('user') in instances
+    # objects not needed for the request are not instantiated
+    assert api.Object.get_plugin('host') not in instances
+    assert len(instances) < len(api._API__plugins)
+
+    api = start_server_api(plugins_on_demand=False)
+    instances = api._API__instances
+    assert api.Object.get_plugin('host') in instances
+    assert len(instances) == len(api._API__plugins)
@@ -21,6 +21,8 @@
 Test the `ipalib.plugins.baseldap` module.
 """
 
+import time
+
 import ldap
 
 from ipapython.dn import DN
@@ -223,3 +225,179 @@ def test_entry_to_dict():
     assert_deepequal(
         baseldap.entry_to_dict(entry, all=True, raw=True),
         the_dict)
+
+
+@pytest.mark.tier0
+def test_check_paged_search():
+    """Test the LDAPSearch.check_paged_search helper method"""
+    class FakeLDAP:
+        orderings = {'uidnumber': 'integerOrderingMatch'}
+
+        def get_attribute_ordering(self, name):
+            return self.orderings.get(name)
+
+    class FakeObject:
+        object_name_plural = 'objects'
+
+        def __init__(self, pkey):
+            self.primary_key = pkey and type('pkey', (), {'name': pkey})
+
+    class FakeSearch:
+        check_paged_search = baseldap.LDAPSearch.check_paged_search
+
+        def __init__(self, pkey):
+            self.obj = FakeObject(pkey)
+
+    FakeSearch('uidnumber').check_paged_search(FakeLDAP(), pagesize=10)
+
+    for pkey in ('cn', None):
+        with pytest.raises(errors.ValidationError) as e:
+            FakeSearch(pkey).check_paged_search(FakeLDAP(), pagesize=10)
+        assert e.value.kw['name'] == 'pagesize'
+        with pytest.raises(errors.ValidationError) as e:
+            FakeSearch(pkey).check_paged_search(FakeLDAP(), cursor=u'x')
+        assert e.value.kw['name'] == 'cursor'
+
+
+class TestConvertAttributeMembers:
+    basedn = DN('dc=example,dc=com')
+
+    @pytest.fixture
+    def testgroup(self):
+        class FakeNameSpace(dict):
+            def __init__(self, *args):
+                super(FakeNameSpace, self).__init__(*args)
+                self.loaded = set()
+
+            def __getitem__(self, name):
+                self.loaded.add(name)
+                return super(FakeNameSpace, self).__getitem__(name)
+
+            def __call__(self):
+                raise AssertionError('all objects are loaded')
+
+        class FakeAPI:
+            pass
+
+        class MemberObject(baseldap.LDAPObject):
+            def get_primary_key_from_dn(self, dn):
+                return dn[0].value
+
+        class user(MemberObject):
+            container_dn = DN(('cn', 'users'), ('cn', 'accounts'))
+
+        class group(MemberObject):
+            container_dn = DN(('cn', 'groups'), ('cn', 'accounts'))
+
+        class host(MemberObject):
+            container_dn = DN(('cn', 'computers'), ('cn', 'accounts'))
+
+        class testgroup(baseldap.LDAPObject):
+            container_dn = DN(('cn', 'groups'), ('cn', 'accounts'))
+            attribute_members = {
+                'member': ['user', 'group'],
+                'memberof': ['group', 'testgroup'],
+            }
+
+        api = FakeAPI()
+        api.env = FakeAPI()
+        api.env.basedn = self.basedn
+        api.Object = FakeNameSpace(
+            (cls.name, cls(api))
+            for cls in (user, group, host, testgroup))
+        return api.Object['testgroup']
+
+    def make_entry(self, **attrs):
+        entry = ipaldap.LDAPEntry(
+            ipaldap.LDAPClient(None, no_schema=True), DN('cn=test'))
+        for attr, values in attrs.items():
+            entry.raw[attr] = [str(v).encode('utf-8') for v in values]
+        return entry
+
+    def user_dn(self, name):
+        return DN(('uid', name), ('cn', 'users'), ('cn', 'accounts'),
+                  self.basedn)
+
+    def group_dn(self, name):
+        return DN(('cn', name), ('cn', 'groups'), ('cn', 'accounts'),
+                  self.basedn)
+
+    @pytest.mark.tier0
+    def test_convert(self, testgroup):
+        entry = self.make_entry(
+            member=[
+                self.user_dn('alice'),
+                self.group_dn('editors'),
+                self.user_dn('bob'),
+                DN(('fqdn', 'host.example.com'), ('cn', 'computers'),
+                   ('cn', 'accounts'), self.basedn),
+                DN(('cn', 'other'), self.basedn),
+            ],
+            memberof=[self.group_dn('admins')],
+        )
+        testgroup.convert_attribute_members(entry)
+        assert_deepequal(dict(entry), {
+            'member_user': ['alice', 'bob'],
+            'member_group': ['editors'],
+            'memberof_group': ['admins'],
+        })
+
+    @pytest.mark.tier0
+    def test_convert_loads_members(self, testgroup):
+        entry = self.make_entry(member=[self.user_dn('alice')])
+        testgroup.convert_attribute_members(entry)
+        # objects which cannot be members are not loaded
+        assert testgroup.api.Object.loaded == {'user', 'group', 'testgroup'}
+
+    @pytest.mark.tier0
+    def test_convert_raw(self, testgroup):
+        entry = self.make_entry(member=[self.user_dn('alice')])
+        testgroup.convert_attribute_members(entry, raw=True)
+        assert list(entry) == ['member']
+
+    @pytest.mark.tier0
+    @pytest.mark.benchmark
+    def test_large_group_benchmark(self, testgroup):
+        """
+        Convert members of a group with 50k members
+
+        The result is compared to the previous implementation, which
+        tested every member against the container of every object. The
+        timings are printed; run with -s to see them.
+        """
+        count = 50000
+        members = [self.user_dn('user%d' % i) for i in range(count // 2)]
+        members.extend(self.group_dn('group%d' % i)
+                       for i in range(count // 2))
+
+        def convert_by_endswith(entry_attrs):
+            for attr, ldap_obj_names in testgroup.attribute_members.items():
+                value = entry_attrs.raw[attr]
+                del entry_attrs[attr]
+                for member in value:
+                    memberdn = DN(member.decode('utf-8'))
+                    for ldap_obj_name in ldap_obj_names:
+                        ldap_obj = testgroup.api.Object[ldap_obj_name]
+                        container_dn = DN(ldap_obj.container_dn, self.basedn)
+                        if memberdn.endswith(container_dn):
+                            entry_attrs.setdefault(
+                                '%s_%s' % (attr, ldap_obj.name), []
+                            ).append(ldap_obj.get_primary_key_from_dn(
+                                memberdn))
+                            break
+
+        expected = self.make_entry(member=members, memberof=[])
+        start = time.time()
+        convert_by_endswith(expected)
+        endswith_time = time.time() - start
+
+        entry = self.make_entry(member=members, memberof=[])
+        start = time.time()
+        testgroup.convert_attribute_members(entry)
+        index_time = time.time() - start
+
+        print('%d members: endswith %.3fs, container index %.3fs' % (
+            count, endswith_time, index_time))
+        assert len(entry['member_user']) == count // 2
+        assert len(entry['member_group']) == count // 2
+        assert_deepequal(dict(expected), dict(entry))
@@ -264,4 +264,60 @@ class test_batch(Declarative):
             ),
         ),
 
+        dict(
+            desc='Show and delete a group in a parallel batch',
+            command=('batch', [
+                dict(method=u'group_show', params=([group1], dict())),
+                dict(method=u'ping', params=([], {})),
+                dict(method=u'group_show', params=([group1], dict())),
+                dict(method=u'group_del', params=([group1], dict())),
+                dict(method=u'group_show', params=([group1], dict())),
+            ], dict(parallel=True)),
+            expected=dict(
+                count=5,
+                results=deepequal_list(
+                    dict(
+                        value=group1,
+                        summary=None,
+                        result=dict(
+                            cn=[group1],
+                            description=[u'Test desc 1'],
+                            gidnumber=[fuzzy_digits],
+                            dn=DN(('cn', 'testgroup1'),
+                                  ('cn', 'groups'),
+                                  ('cn', 'accounts'),
+                                  api.env.basedn),
+                            ),
+                        error=None),
+                    dict(summary=Fuzzy('IPA server version .*'), error=None),
+                    dict(
+                        value=group1,
+                        summary=None,
+                        result=dict(
+                            cn=[group1],
+                            description=[u'Test desc 1'],
+                            gidnumber=[fuzzy_digits],
+                            dn=DN(('cn', 'testgroup1'),
+                                  ('cn', 'groups'),
+                                  ('cn', 'accounts'),
+                                  api.env.basedn),
+                            ),
+                        error=None),
+                    dict(
+                        summary=u'Deleted group "%s"' % group1,
+                        result=dict(failed=[]),
+                        value=[group1],
+                        error=None),
+                    dict(
+                        error=u'%s: group not found' % group1,
+                        error_name=u'NotFound',
+                        error_code=4001,
+                        error_kw=dict(
+                            reason=u'%s: group not found' % group1,
+                        ),
+                    ),
+                ),
+            ),
+        ),
+
     ]
@@ -43,6 +43,7 @@ if six.PY3:
 cert = None
 newcert = None
 sn = None
+newsn = None
 
 _DOMAIN = api.env.domain
 _EXP_CRL_URI = ''.join(['http://ipa-ca.', _DOMAIN, '/ipa/crl/MasterCRL.bin'])
@@ -185,13 +186,14 @@ class test_cert(BaseCert):
         """
         Issue a new certificate for a service
         """
-        global newcert
+        global newcert, newsn
 
         csr = self.generateCSR(str(self.subject))
         res = api.Command['cert_request'](csr, principal=self.service_princ)['result']
         assert DN(res['subject']) == self.subject
         # save the cert for the service_show/find tests
         newcert = res['certificate'].encode('ascii')
+        newsn = res['serial_number']
 
     def test_0007_service_show(self):
         """
@@ -256,6 +258,28 @@ class test_cert(BaseCert):
         result = _emails_are_valid(email_addrs, [])
         assert False == result, result
 
+    def test_00012_cert_find_owner(self):
+        """
+        Verify that cert-find by owner follows changes of the owner entry
+        """
+        def find(**options):
+            res = api.Command['cert_find'](
+                service=self.service_princ, **options)['result']
+            return set(r['serial_number'] for r in res)
+
+        serials = find()
+        assert set([sn, newsn]) <= serials
+        assert find(pkey_only=True) == serials
+
+        api.Command['service_remove_cert'](
+            self.service_princ, usercertificate=[cert.decode('ascii')])
+        assert find() == serials - set([sn])
+        assert find(pkey_only=True) == serials - set([sn])
+
+        api.Command['service_add_cert'](
+            self.service_princ, usercertificate=[cert.decode('ascii')])
+        assert find() == serials
+
     def test_99999_cleanup(self):
         """
         Clean up cert test data
@@ -348,6 +348,40 @@ class TestFindGroup(XMLRPC_test):
                 },
             ]), result)
 
+    def test_paged_search_for_all_posix(self, group, group2):
+        """ Search for all posix groups page by page """
+        command = group.make_command(
+            'group_find', **dict(posix=True, pkey_only=True)
+        )
+        expected = sorted(
+            entry['cn'][0] for entry in command()['result'])
+
+        found = []
+        cursor = None
+        while True:
+            command = group.make_command(
+                'group_find',
+                **dict(posix=True, pkey_only=True, pagesize=3, cursor=cursor)
+            )
+            try:
+                result = command()
+            except errors.ValidationError:
+                if cursor is None:
+                    pytest.skip('cn has no ordering matching rule')
+                raise
+            assert result['count'] <= 3
+            assert result['truncated'] is False
+            found.extend(entry['cn'][0] for entry in result['result'])
+            cursors = [
+                m['data']['cursor'] for m in result.get('messages', ())
+                if m['name'] == u'SearchResultPage'
+            ]
+            if not cursors:
+                break
+            cursor = cursors[0]
+
+        assert found == expected
+
 
 @pytest.mark.tier1
 class TestNonexistentGroup(XMLRPC_test):
@@ -570,6 +604,39 @@ class TestGroupMember(XMLRPC_test):
         admins.remove_member(dict(group=group.cn))
 
 
+@pytest.mark.tier1
+class TestIndirectMember(XMLRPC_test):
+    def test_add_nested_members(self, group, group2, user):
+        """ Add a user to a group nested in another group """
+        group.ensure_exists()
+        group2.ensure_exists()
+        user.ensure_exists()
+        group.add_member(dict(group=group2.cn))
+        group2.add_member(dict(user=user.uid))
+
+    def test_find_indirect_members(self, group, group2, user):
+        """ Search for groups with their indirect members """
+        command = group.make_command(
+            'group_find', u'testgroup', no_members=False)
+        result = {r['cn'][0]: r for r in command()['result']}
+        assert result[group.cn]['member_group'] == [group2.cn]
+        assert result[group.cn]['memberindirect_user'] == [user.uid]
+        assert result[group2.cn]['member_user'] == [user.uid]
+        assert result[group2.cn]['memberof_group'] == [group.cn]
+        assert 'memberindirect_user' not in result[group2.cn]
+        assert 'memberofindirect_group' not in result[group2.cn]
+
+    def test_find_indirect_memberof(self, group, group2, user):
+        """ Search for a user with its indirect groups """
+        command = user.make_command(
+            'user_find', user.uid, no_members=False)
+        result = command()['result']
+        assert len(result) == 1
+        assert group2.cn in result[0]['memberof_group']
+        assert group.cn not in result[0]['memberof_group']
+        assert result[0]['memberofindirect_group'] == [group.cn]
+
+
 @pytest.mark.tier1
 class TestValidation(XMLRPC_test):
     # The assumption for this class of tests is that if we don't
@@ -200,6 +200,82 @@ class test_hbactest(XMLRPC_test):
                 nodetail=True
             )
 
+    def test_f_hbactest_rule_snapshot_invalidated(self):
+        """
+        Test that 'ipa hbactest' sees changes of rules made after a test
+        """
+        def matched():
+            return api.Command['hbactest'](
+                user=self.test_user,
+                targethost=self.test_host,
+                service=self.test_service,
+            )['matched'] or []
+
+        assert self.rule_names[0] in matched()
+        api.Command['hbacrule_disable'](self.rule_names[0])
+        try:
+            assert self.rule_names[0] not in matched()
+        finally:
+            api.Command['hbacrule_enable'](self.rule_names[0])
+        assert self.rule_names[0] in matched()
+
+    def test_f_hbactest_rule_snapshot_search_limit(self):
+        """
+        Test that 'ipa hbactest' sees changes of rules beyond the search
+        records limit
+        """
+        def matched():
+            return api.Command['hbactest'](
+                user=self.test_user,
+                targethost=self.test_host,
+                service=self.test_service,
+                sizelimit=0,
+            )['matched'] or []
+
+        config = api.Command['config_show']()['result']
+        limit = config['ipasearchrecordslimit'][0]
+        api.Command['config_mod'](ipasearchrecordslimit=1)
+        try:
+            assert self.rule_names[2] in matched()
+            api.Command['hbacrule_disable'](self.rule_names[2])
+            try:
+                assert self.rule_names[2] not in matched()
+            finally:
+                api.Command['hbacrule_enable'](self.rule_names[2])
+            assert self.rule_names[2] in matched()
+        finally:
+            api.Command['config_mod'](ipasearchrecordslimit=int(limit))
+
+    def test_f_hbactest_bulk(self):
+        """
+        Test 'ipa hbactest-bulk' with several requests
+        """
+        ret = api.Command['hbactest_bulk'](
+            request=[
+                u'%s:%s:%s' % (self.test_user, self.test_host,
+                               self.test_service),
+                u'%s:%s:%s' % (self.test_user, self.test_sourcehost,
+                               self.test_service),
+            ],
+            rules=self.rule_names,
+        )
+        assert ret['count'] == 2
+        assert ret['error'] is None
+        assert ret['result'][0]['value'] is True
+        assert ret['result'][0]['user'] == self.test_user
+        for i in [0, 1, 2, 3]:
+            assert self.rule_names[i] in ret['result'][0]['matched']
+        assert ret['result'][1]['value'] is False
+        assert ret['result'][1]['matched'] is None
+
+    def test_f_hbactest_bulk_invalid_request(self):
+        """
+        Test 'ipa hbactest-bulk' with a malformed request
+        """
+        with pytest.raises(errors.ValidationError):
+            api.Command['hbactest_bulk'](
+                request=[u'%s:%s' % (self.test_user, self.test_host)])
+
     def test_g_hbactest_clear_testing_data(self):
         """
         Clear data for HBAC test plugin testing.
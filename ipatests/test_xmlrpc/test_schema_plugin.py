@@ -119,3 +119,32 @@ class TestOutputFindAndShowCommand(XMLRPC_test):
         # wrong command, wrong criteria
         with pytest.raises(errors.NotFound):
             self.tracker.run_command('output_show', u'fake', u'fake')
+
+
+@pytest.mark.tier1
+class TestSchemaCommand(XMLRPC_test):
+    """Test delta updates of the schema command"""
+    tracker = Tracker()
+
+    def test_schema_full(self):
+        result = self.tracker.run_command('schema')['result']
+        assert 'item_fingerprints' not in result
+        assert 'delta' not in result
+
+        # the changes from an unknown schema are not known
+        result = self.tracker.run_command(
+            'schema', base_fingerprint=u'00000000')['result']
+        assert 'item_fingerprints' not in result
+        assert 'delta' not in result
+
+    def test_schema_delta(self):
+        full = self.tracker.run_command('schema')['result']
+        result = self.tracker.run_command(
+            'schema', base_fingerprint=full['fingerprint'])['result']
+        if 'delta' not in result:
+            pytest.skip('server does not store schema fingerprints')
+        assert result['delta'] is True
+        assert result['fingerprint'] == full['fingerprint']
+        for ns in ('commands', 'classes', 'topics'):
+            assert result[ns] == []
+            assert result['removed'][ns] == []
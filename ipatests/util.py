@@ -41,6 +41,7 @@ from ipalib import api
 from ipalib.plugable import Plugin
 from ipalib.request import context
 from ipapython.dn import DN
+from ipapython.graph import Graph
 from ipapython.ipautil import run
 
 try:
@@ -887,3 +888,18 @@ def get_group_dn(cn):
 
 def get_user_dn(uid):
     return DN(('uid', uid), api.env.container_user, api.env.basedn)
+
+
+def make_graph(vertices, edges, both=True):
+    """
+    Create a Graph of vertices connected by edges in both directions, or
+    from tail to head only if both is False
+    """
+    graph = Graph()
+    for vertex in vertices:
+        graph.add_vertex(vertex)
+    for tail, head in edges:
+        graph.add_edge(tail, head)
+        if both:
+            graph.add_edge(head, tail)
+    return graph
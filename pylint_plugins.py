@@ -432,7 +432,10 @@ AstroidBuilder(MANAGER).string_build(textwrap.dedent(
     api.env.ca_ee_port = 0
     api.env.ca_host = ''
     api.env.ca_install_port = None
+    api.env.ca_pool_idle_timeout = 0
+    api.env.ca_pool_size = 0
     api.env.ca_port = 0
+    api.env.cert_index_refresh = 0
     api.env.certmonger_wait_timeout = 0
     api.env.conf = ''  # object
     api.env.conf_default = ''  # object
@@ -508,6 +511,8 @@ AstroidBuilder(MANAGER).string_build(textwrap.dedent(
     api.env.interactive = True
     api.env.ipalib = ''  # object
     api.env.kinit_lifetime = None
+    api.env.ldap_pool_size = 0
+    api.env.ldap_pool_ttl = 0
     api.env.lite_pem = ''
     api.env.lite_profiler = ''
     api.env.lite_host = ''
@@ -522,6 +527,9 @@ AstroidBuilder(MANAGER).string_build(textwrap.dedent(
     api.env.ra_plugin = ''
     api.env.recommended_max_agmts = 0
     api.env.replication_wait_timeout = 0
+    api.env.rpc_compress_threshold = 0
+    api.env.rpc_pool_idle_timeout = 0
+    api.env.rpc_pool_size = 0
     api.env.rpc_protocol = ''
     api.env.server = ''
     api.env.script = ''  # object